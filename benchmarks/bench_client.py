@@ -0,0 +1,338 @@
+"""
+Headless benchmarks of the client hot paths (results merging, parameter panels, layer events).
+
+Runs on offscreen Qt against an in-process stub algorithm, and saves the timings as JSON:
+
+    python benchmarks/bench_client.py --output bench.json
+    python benchmarks/bench_client.py --output bench.json --compare baseline.json
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from qtpy.QtWidgets import QApplication
+
+app = QApplication.instance() or QApplication([])
+
+import napari
+import imaging_server_kit as sk
+from napari.components import ViewerModel
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.algorithm_widget import AlgorithmWidget
+from napari_serverkit.widgets.napari_results import NapariResults
+
+SIZES = {"small": 256, "medium": 1024, "large": 4096}
+QUICK_SIZES = {"small": 128, "medium": 512}
+N_LAYERS = 300
+
+
+@sk.algorithm(
+    name="threshold",
+    parameters={
+        "image": sk.Image(),
+        "threshold": sk.Float(default=0.5, min=0, max=1, auto_call=True),
+    },
+)
+def threshold(image: np.ndarray, threshold: float = 0.5):
+    return sk.Mask((image > threshold).astype(np.uint8), name="Mask")
+
+
+@sk.algorithm(name="invert", parameters={"image": sk.Image()})
+def invert(image: np.ndarray):
+    return sk.Image(1 - image, name="Inverted")
+
+
+@sk.algorithm(
+    name="count_boxes",
+    parameters={"image": sk.Image(), "boxes": sk.Boxes()},
+)
+def count_boxes(image: np.ndarray, boxes: np.ndarray):
+    return sk.Notification(f"{len(boxes)} boxes")
+
+
+STUB_ALGORITHM = sk.combine([threshold, invert, count_boxes])
+
+
+def _layer_data(kind: str, size: int, rng: np.random.Generator):
+    """Data of a given layer kind; `size` is the image side, or the number of geometric elements."""
+    if kind == "image":
+        return rng.random((size, size), dtype=np.float32)
+    if kind == "mask":
+        return rng.integers(0, 8, (size, size), dtype=np.uint16)
+    if kind == "points":
+        return rng.random((size, 2)) * size
+    if kind == "boxes":
+        corners = rng.random((size, 1, 2)) * size
+        return corners + np.array([[0, 0], [0, 10], [10, 10], [10, 0]])
+    if kind == "paths":
+        # Points along an arc, so that the paths never self-intersect
+        angles = np.linspace(0, np.pi / 2, 5)
+        arc = 10 * np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+        return rng.random((size, 1, 2)) * size + arc
+    if kind == "vectors":
+        return rng.random((size, 2, 2)) * size
+    if kind == "tracks":
+        return np.column_stack([np.arange(size) // 10, np.arange(size) % 10, rng.random((size, 2)) * size])
+    raise ValueError(kind)
+
+
+def _timeit(func: Callable, repeat: int, setup: Optional[Callable] = None) -> Dict:
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        t_start = time.perf_counter()
+        func(arg) if setup is not None else func()
+        timings.append(time.perf_counter() - t_start)
+        app.processEvents()
+    return {
+        "min_sec": min(timings),
+        "median_sec": statistics.median(timings),
+        "mean_sec": statistics.mean(timings),
+        "repeat": repeat,
+    }
+
+
+def bench_merge(sizes: Dict[str, int], repeat: int) -> Dict:
+    """First merge (layer creation) and subsequent merges (update) of every layer kind."""
+    rng = np.random.default_rng(0)
+    benchmarks = {}
+    for kind in ["image", "mask", "points", "boxes", "paths", "vectors", "tracks"]:
+        for size_name, size in sizes.items():
+            if kind in ["image", "mask"] or size_name != "large":
+                data = _layer_data(kind, size, rng)
+            else:
+                data = _layer_data(kind, size // 4, rng)  # Thousands of shapes are slow enough already
+            results = Results()
+            results.create(kind=kind, data=data, name=kind)
+
+            def _fresh_napari_results():
+                return NapariResults(ViewerModel())
+
+            benchmarks[f"merge_create/{kind}/{size_name}"] = _timeit(
+                lambda napari_results: napari_results.merge(results), repeat, _fresh_napari_results
+            )
+
+            napari_results = NapariResults(ViewerModel())
+            napari_results.merge(results)
+            benchmarks[f"merge_update/{kind}/{size_name}"] = _timeit(
+                lambda: napari_results.merge(results), repeat
+            )
+            benchmarks[f"update/{kind}/{size_name}"] = _timeit(
+                lambda: napari_results.update(kind, data, {}), repeat
+            )
+    return benchmarks
+
+
+def bench_tiled_merge(sizes: Dict[str, int], repeat: int, tile_size_px: int = 128) -> Dict:
+    """Merging all the tiles of a tiled run (the tiles are computed beforehand), into a mask or an image output.
+
+    Mask outputs are refreshed over the region of the merged tiles, image outputs are refreshed whole.
+    """
+    rng = np.random.default_rng(0)
+    benchmarks = {}
+    for (size_name, size), (output_kind, algorithm) in itertools.product(
+        sizes.items(), [("mask", "threshold"), ("image", "invert")]
+    ):
+        param_results = Results()
+        param_results.create(kind="image", data=rng.random((size, size), dtype=np.float32), name="image")
+        if algorithm == "threshold":
+            param_results.create(kind="float", data=0.5, name="threshold")
+        tiles: List[Results] = list(
+            STUB_ALGORITHM._tile(
+                algorithm=algorithm,
+                tile_size_px=tile_size_px,
+                overlap_percent=0,
+                delay_sec=0,
+                randomize=False,
+                param_results=param_results,
+            )
+        )
+
+        def _merge_tiles(napari_results):
+            for tile in tiles:
+                napari_results.merge(tile)
+
+        stats = _timeit(_merge_tiles, repeat, lambda: NapariResults(ViewerModel()))
+        stats["n_tiles"] = len(tiles)
+        stats["tiles_per_sec"] = len(tiles) / stats["median_sec"]
+        benchmarks[f"tiled_merge/{output_kind}/{size_name}"] = stats
+    return benchmarks
+
+
+def _algorithm_widget(viewer) -> AlgorithmWidget:
+    widget = AlgorithmWidget(viewer, STUB_ALGORITHM)
+    app.processEvents()
+    return widget
+
+
+def bench_get_algo_params(repeat: int) -> Dict:
+    """Reading the parameter values when a large Shapes layer is selected as boxes."""
+    rng = np.random.default_rng(0)
+    benchmarks = {}
+    for n_boxes in [100, 1_000, 10_000]:
+        viewer = ViewerModel()
+        viewer.add_image(rng.random((512, 512), dtype=np.float32), name="image")
+        widget = _algorithm_widget(viewer)
+        widget.runner_widget.cb_algorithms.setCurrentText("count_boxes")
+        widget.napari_results.create("boxes", _layer_data("boxes", n_boxes, rng), "boxes")
+        widget.params_panel.ui_state["boxes"][1].setCurrentText("boxes")
+        benchmarks[f"get_algo_params/boxes/{n_boxes}"] = _timeit(widget.params_panel.get_algo_params, repeat)
+        shapes_layer = viewer.layers["boxes"]
+        benchmarks[f"get_algo_params/boxes_edited/{n_boxes}"] = _timeit(
+            lambda _: widget.params_panel.get_algo_params(),
+            repeat,
+            setup=lambda: shapes_layer.add_rectangles(np.array([[0, 0], [10, 10]])),
+        )
+    return benchmarks
+
+
+def _big_schema(n_params: int) -> Dict:
+    properties = {}
+    for k in range(n_params):
+        param_type = ["int", "float", "bool", "str", "choice", "image"][k % 6]
+        param = {"title": f"Parameter {k}", "param_type": param_type}
+        if param_type in ["int", "float"]:
+            param.update({"minimum": 0, "maximum": 100, "default": 1})
+        elif param_type == "bool":
+            param["default"] = True
+        elif param_type == "str":
+            param["default"] = "text"
+        elif param_type == "choice":
+            param.update({"enum": [f"choice_{i}" for i in range(20)], "default": "choice_0"})
+        properties[f"param_{k}"] = param
+    return {"properties": properties}
+
+
+def bench_panel_update(repeat: int) -> Dict:
+    """Building (cold) and switching back to (warm) the parameter panel of big schemas."""
+    benchmarks = {}
+    viewer = ViewerModel()
+    for k in range(20):
+        viewer.add_image(np.zeros((8, 8)), name=f"image_{k}")
+    widget = _algorithm_widget(viewer)
+    panel = widget.params_panel
+    for n_params in [10, 100, 500]:
+        schema = _big_schema(n_params)
+        counter = iter(range(10**6))
+        benchmarks[f"panel_update/cold/{n_params}"] = _timeit(
+            lambda: panel.update(schema, panel_key=("bench", n_params, next(counter))), repeat
+        )
+        panel.update(schema, panel_key=("bench", n_params))
+        benchmarks[f"panel_update/warm/{n_params}"] = _timeit(
+            lambda _: panel.update(schema, panel_key=("bench", n_params)),
+            repeat,
+            setup=lambda: panel.update(_big_schema(1), panel_key="other"),
+        )
+    return benchmarks
+
+
+def bench_layer_events(repeat: int, n_layers: int = N_LAYERS) -> Dict:
+    """Adding, renaming and removing layers while the widget tracks hundreds of layers."""
+    rng = np.random.default_rng(0)
+    viewer = ViewerModel()
+    for k in range(n_layers):
+        viewer.add_image(np.zeros((8, 8)), name=f"image_{k}")
+    widget = _algorithm_widget(viewer)
+    widget.runner_widget.cb_algorithms.setCurrentText("threshold")
+
+    counter = iter(range(10**6))
+    benchmarks = {
+        f"layer_events/add/{n_layers}": _timeit(
+            lambda: viewer.add_image(rng.random((8, 8)), name=f"added_{next(counter)}"), repeat
+        ),
+        f"layer_events/rename/{n_layers}": _timeit(
+            lambda: setattr(viewer.layers[-1], "name", f"renamed_{next(counter)}"), repeat
+        ),
+        f"layer_events/remove/{n_layers}": _timeit(lambda: viewer.layers.pop(-1), repeat),
+    }
+    widget.deleteLater()
+    return benchmarks
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata() -> Dict:
+    import qtpy
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "napari": napari.__version__,
+        "imaging_server_kit": getattr(sk, "__version__", None),
+        "qt_api": qtpy.API_NAME,
+        "qt": qtpy.QT_VERSION,
+    }
+
+
+def _compare(benchmarks: Dict, baseline_file: str):
+    with open(baseline_file) as f:
+        baseline = json.load(f)["benchmarks"]
+    print(f"\n{'benchmark':<45} {'baseline [ms]':>14} {'current [ms]':>14} {'ratio':>7}")
+    for name, stats in benchmarks.items():
+        if name in baseline:
+            before, after = baseline[name]["median_sec"], stats["median_sec"]
+            print(f"{name:<45} {before * 1000:>14.3f} {after * 1000:>14.3f} {after / before:>7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON file to write the results to.")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run to compare against.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed repetitions of each benchmark.")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest sizes.")
+    parser.add_argument("--filter", default=None, help="Only run the benchmark groups containing this string.")
+    args = parser.parse_args(argv)
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    groups = {
+        "merge": lambda: bench_merge(sizes, args.repeat),
+        "tiled_merge": lambda: bench_tiled_merge(sizes, args.repeat),
+        "get_algo_params": lambda: bench_get_algo_params(args.repeat),
+        "panel_update": lambda: bench_panel_update(args.repeat),
+        "layer_events": lambda: bench_layer_events(args.repeat),
+    }
+
+    benchmarks = {}
+    for group_name, bench_func in groups.items():
+        if args.filter is not None and args.filter not in group_name:
+            continue
+        t_start = time.perf_counter()
+        benchmarks.update(bench_func())
+        print(f"{group_name}: {time.perf_counter() - t_start:.1f} sec", file=sys.stderr)
+
+    with open(args.output, "w") as f:
+        json.dump({"metadata": _metadata(), "benchmarks": benchmarks}, f, indent=2)
+    print(f"Saved {len(benchmarks)} benchmarks to {args.output}", file=sys.stderr)
+
+    if args.compare is not None:
+        _compare(benchmarks, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Payload size and end-to-end latency of /process requests, for each request encoding.
+
+Runs against a local stand-in server: an Imaging Server Kit app that accepts compressed requests
+(and advertises it in its `Accept-Encoding` response header) and gzips its responses.
+
+    python benchmarks/bench_transfer.py --output transfer.json
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import platform
+import socket
+import statistics
+import sys
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List
+
+import numpy as np
+import uvicorn
+from starlette.middleware.gzip import GZipMiddleware
+
+import imaging_server_kit as sk
+from imaging_server_kit.core.app import AlgorithmApp
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.http_transfer import CODECS, IDENTITY, negotiate_encodings, parse_accept_encoding, post_process
+from napari_serverkit.widgets.run_trace import RunTrace
+
+DECODERS: Dict[str, Callable[[bytes], bytes]] = {
+    "gzip": gzip.decompress,
+    "deflate": zlib.decompress,
+}
+try:
+    import zstandard
+
+    DECODERS["zstd"] = lambda content: zstandard.ZstdDecompressor().decompressobj().decompress(content)
+except ImportError:
+    pass
+try:
+    import brotli
+
+    DECODERS["br"] = brotli.decompress
+except ImportError:
+    pass
+
+
+class RequestDecodingMiddleware:
+    """Decompresses request bodies, and lists the accepted request encodings in the responses (RFC 7694)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.accept_encoding = ", ".join(DECODERS).encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        encoding = headers.get(b"content-encoding", b"identity").decode()
+        if encoding != IDENTITY:
+            body = b""
+            more_body = True
+            while more_body:
+                message = await receive()
+                body += message.get("body", b"")
+                more_body = message.get("more_body", False)
+            body = DECODERS[encoding](body)
+            scope = dict(scope)
+            scope["headers"] = [
+                (key, value) for key, value in scope["headers"] if key not in [b"content-encoding", b"content-length"]
+            ] + [(b"content-length", str(len(body)).encode())]
+
+            async def receive():
+                return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_with_accept_encoding(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"accept-encoding", self.accept_encoding)]
+            await send(message)
+
+        await self.app(scope, receive, send_with_accept_encoding)
+
+
+@sk.algorithm(name="echo_image", parameters={"image": sk.Image()})
+def echo_image(image: np.ndarray):
+    return sk.Image(image, name="Image")
+
+
+@sk.algorithm(name="echo_mask", parameters={"mask": sk.Mask()})
+def echo_mask(mask: np.ndarray):
+    return sk.Mask(mask, name="Mask")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stand_in_server() -> str:
+    app = AlgorithmApp([echo_image, echo_mask], name="stand-in").app
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(
+            GZipMiddleware(RequestDecodingMiddleware(app), minimum_size=1024),
+            host="127.0.0.1",
+            port=port,
+            log_level="warning",
+        )
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def _payloads(size: int) -> Dict[str, Results]:
+    rng = np.random.default_rng(0)
+    mask = np.zeros((size, size), dtype=np.uint16)
+    for label in range(1, 200):
+        y, x = rng.integers(0, size - 20, 2)
+        mask[y : y + 20, x : x + 20] = label
+    sparse_image = np.zeros((size, size), dtype=np.float32)
+    sparse_image[rng.random((size, size)) > 0.99] = 1.0
+    noise_image = rng.random((size, size), dtype=np.float32)
+
+    payloads = {}
+    for name, kind, param_name, data in [
+        ("mask", "mask", "mask", mask),
+        ("sparse_image", "image", "image", sparse_image),
+        ("noise_image", "image", "image", noise_image),
+    ]:
+        results = Results()
+        results.create(kind=kind, data=data, name=param_name)
+        payloads[name] = results
+    return payloads
+
+
+def bench_encodings(server_url: str, size: int, repeat: int, bandwidth_mbps: float) -> Dict:
+    client = sk.Client(server_url)
+    import httpx
+
+    accepted = parse_accept_encoding(httpx.get(f"{server_url}/version").headers.get("Accept-Encoding"))
+    encodings: List[str] = negotiate_encodings(accepted)
+
+    benchmarks = {}
+    for payload_name, param_results in _payloads(size).items():
+        algorithm = "echo_mask" if payload_name == "mask" else "echo_image"
+        for encoding in encodings:
+            latencies = []
+            for _ in range(repeat):
+                trace = RunTrace(0, algorithm)
+                t_start = time.perf_counter()
+                post_process(client, algorithm, param_results, trace, encoding)
+                latencies.append(time.perf_counter() - t_start)
+            phases = {phase: total for phase, (total, _) in trace.summary().items()}
+            transferred = trace.bytes_sent + trace.bytes_received
+            latency = statistics.median(latencies)
+            benchmarks[f"transfer/{payload_name}/{encoding}"] = {
+                "median_sec": latency,
+                "min_sec": min(latencies),
+                "repeat": repeat,
+                "bytes_sent": trace.bytes_sent,
+                "bytes_received": trace.bytes_received,
+                "phases_sec": phases,
+                # Latency if the payloads went through a link of the given bandwidth (instead of the loopback)
+                f"estimated_sec_at_{bandwidth_mbps:g}_mbps": latency + transferred * 8 / (bandwidth_mbps * 1e6),
+            }
+    return benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="transfer-results.json", help="JSON file to write the results to.")
+    parser.add_argument("--size", type=int, default=2048, help="Side of the (square) images and masks.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed requests per payload and encoding.")
+    parser.add_argument("--bandwidth-mbps", type=float, default=50.0, help="Link bandwidth for the latency estimates.")
+    args = parser.parse_args(argv)
+
+    server_url = start_stand_in_server()
+    benchmarks = bench_encodings(server_url, args.size, args.repeat, args.bandwidth_mbps)
+
+    estimate_key = f"estimated_sec_at_{args.bandwidth_mbps:g}_mbps"
+    print(f"{'payload/encoding':<32} {'sent [kB]':>10} {'received [kB]':>14} {'local [ms]':>11} {f'@{args.bandwidth_mbps:g} Mbps [ms]':>16}")
+    for name, stats in benchmarks.items():
+        print(
+            f"{name.split('/', 1)[1]:<32} {stats['bytes_sent'] / 1024:>10.1f} {stats['bytes_received'] / 1024:>14.1f}"
+            f" {stats['median_sec'] * 1000:>11.1f} {stats[estimate_key] * 1000:>16.1f}"
+        )
+
+    metadata = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "imaging_server_kit": getattr(sk, "__version__", None),
+        "codecs": [IDENTITY] + list(CODECS),
+        "size": args.size,
+    }
+    with open(args.output, "w") as f:
+        json.dump({"metadata": metadata, "benchmarks": benchmarks}, f, indent=2)
+    print(f"Saved {len(benchmarks)} benchmarks to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
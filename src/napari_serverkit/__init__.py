@@ -1,20 +1,43 @@
-from typing import Union
-
-from ._version import version as __version__
+import importlib
+from typing import TYPE_CHECKING, Union
 
 try:
     from ._version import version as __version__
 except ImportError:
     __version__ = "unknown"
 
-from napari_serverkit.widgets import AlgorithmWidget, ServerKitHttpWidget, NapariResults
-from imaging_server_kit import Algorithm
+if TYPE_CHECKING:
+    import napari
+    from imaging_server_kit import Algorithm
+    from napari_serverkit.widgets import AlgorithmWidget, ServerKitHttpWidget, NapariResults
+
+# The widgets (hence Qt, napari and the Imaging Server Kit) are only imported on first access (PEP 562)
+_LAZY_ATTRIBUTES = {
+    "AlgorithmWidget": "napari_serverkit.widgets.algorithm_widget",
+    "ServerKitHttpWidget": "napari_serverkit.widgets.serverkit_http_widget",
+    "NapariResults": "napari_serverkit.widgets.napari_results",
+}
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
 
 
 def add_as_widget(
     viewer: Union["napari.Viewer", "napari_serverkit.ServerkitNapariViewer"],
-    algorithm: Algorithm,
+    algorithm: "Algorithm",
 ):
+    from napari_serverkit.widgets import AlgorithmWidget, NapariResults
+
     if isinstance(viewer, NapariResults):
         viewer.viewer.window.add_dock_widget(
             widget=AlgorithmWidget(viewer.viewer, algorithm), name=algorithm.name
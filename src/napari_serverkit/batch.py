@@ -0,0 +1,377 @@
+"""
+Headless batch processing: runs an algorithm over a folder of images, without napari or Qt.
+
+    napari-serverkit-batch http://localhost:8000 "plates/**/*.tif" --output-dir results --params params.yaml --workers 8
+    python -m napari_serverkit.batch my_package.algorithms:segment plates/ --output-dir results
+
+The algorithm is either served (a server URL) or importable (`module:attribute` or `path/to/file.py:attribute`).
+Image and mask outputs are written as TIFF files, other array outputs (points, boxes...) as `.npy` files, in subfolders
+of the output directory that mirror those of the inputs.
+Each processed file is logged in `batch.jsonl` in the output directory, which is also used to resume interrupted runs.
+"""
+
+import argparse
+import glob
+import importlib
+import importlib.util
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+import imaging_server_kit as sk
+from imaging_server_kit.core.algorithm import Algorithm
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.cancellation import CancelToken, CancelledError
+from napari_serverkit.widgets.http_transfer import IDENTITY, negotiate_encodings, parse_accept_encoding, post_process
+from napari_serverkit.widgets.run_trace import RunTrace
+
+IMAGE_EXTENSIONS = [".tif", ".tiff", ".png", ".jpg", ".jpeg", ".bmp"]
+
+# Parameter kinds whose values are arrays (read from files when given as paths in the parameters file)
+ARRAY_KINDS = ["image", "mask", "instance_mask", "points", "boxes", "paths", "vectors", "tracks"]
+
+LOG_FILE_NAME = "batch.jsonl"
+
+
+def load_runner(target: str) -> Algorithm:
+    """Connect to an algorithm server (`http(s)://...`), or import an algorithm (`module:attribute` or `file.py:attribute`)."""
+    if target.startswith(("http://", "https://")):
+        return sk.Client(target)
+
+    module_name, _, attribute = target.rpartition(":")
+    if not module_name:
+        raise ValueError(f"Expected a server URL or `module:attribute`, got {target!r}.")
+    if module_name.endswith(".py"):
+        spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(module_name))[0], module_name)
+        if spec is None or spec.loader is None:
+            raise ValueError(f"Could not import {module_name}.")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(module_name)
+    runner = getattr(module, attribute)
+    if not isinstance(runner, Algorithm):
+        raise ValueError(f"{target} is not an algorithm.")
+    return runner
+
+
+def load_parameters(file_name: Optional[str]) -> Dict[str, Any]:
+    if file_name is None:
+        return {}
+    with open(file_name) as f:
+        if file_name.endswith((".yaml", ".yml")):
+            import yaml
+
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def find_inputs(pattern: str) -> List[str]:
+    """Image files in a folder, or matching a glob pattern (sorted)."""
+    if os.path.isdir(pattern):
+        file_names = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        return sorted(name for name in file_names if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+    return sorted(name for name in glob.glob(pattern, recursive=True) if os.path.isfile(name))
+
+
+def input_root(pattern: str) -> str:
+    """Folder of the inputs (for a glob pattern, its components before the first wildcard)."""
+    if os.path.isdir(pattern):
+        return pattern
+    components = []
+    for component in os.path.normpath(pattern).split(os.sep):
+        if glob.has_magic(component):
+            break
+        components.append(component)
+    else:
+        components = components[:-1]  # A file name
+    return os.sep.join(components) or (os.sep if os.path.isabs(pattern) else ".")
+
+
+def read_image(file_name: str) -> np.ndarray:
+    if os.path.splitext(file_name)[1].lower() in [".tif", ".tiff"]:
+        import tifffile
+
+        return tifffile.imread(file_name)
+    if file_name.endswith(".npy"):
+        return np.load(file_name)
+    import imageio.v3 as iio
+
+    return iio.imread(file_name)
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name)
+
+
+class BatchRunner:
+    """Runs an algorithm over image files, with `n_workers` concurrent runs (requests, for algorithm servers)."""
+
+    def __init__(
+        self,
+        runner: Algorithm,
+        algorithm: str,
+        parameters: Dict[str, Any],
+        output_dir: str,
+        image_param: Optional[str] = None,
+        n_workers: int = 4,
+        encoding: Optional[str] = None,
+        input_root: Optional[str] = None,
+    ):
+        self.runner = runner
+        self.algorithm = algorithm
+        self.parameters = parameters
+        self.output_dir = output_dir
+        self.input_root = input_root  # Outputs mirror the subfolders of the inputs relative to it
+        self.n_workers = max(1, n_workers)
+        self.schema = runner.get_parameters(algorithm)  # type: ignore
+        self.image_param = image_param or self._default_image_param()
+        self.server_url: Optional[str] = getattr(runner, "server_url", None)
+        self.encoding = self._negotiate_encoding(encoding) if self.server_url else IDENTITY
+        self.cancel_token = CancelToken()
+        self._run_ids = itertools.count()
+
+    def _default_image_param(self) -> str:
+        for name, values in self.schema["properties"].items():
+            if values.get("param_type") == "image":
+                return name
+        raise ValueError(f"{self.algorithm} has no image parameter.")
+
+    def _negotiate_encoding(self, encoding: Optional[str]) -> str:
+        """The requested encoding, or the first compression accepted by the server (if `None`)."""
+        import httpx
+
+        try:
+            header = httpx.get(f"{self.server_url}/version").headers.get("Accept-Encoding")
+        except httpx.RequestError:
+            header = None
+        encodings = negotiate_encodings(parse_accept_encoding(header))
+        if encoding is None:
+            return encodings[1] if len(encodings) > 1 else IDENTITY
+        if encoding not in encodings:
+            raise ValueError(f"The server does not accept {encoding!r} requests (accepted: {', '.join(encodings)}).")
+        return encoding
+
+    def param_results(self, image: np.ndarray) -> Results:
+        """Parameters of a run, from the parameters file and the schema defaults."""
+        param_results = Results()
+        for name, values in self.schema["properties"].items():
+            kind = values.get("param_type")
+            if name == self.image_param:
+                data = image
+            elif name in self.parameters:
+                data = self.parameters[name]
+                if (kind in ARRAY_KINDS) and isinstance(data, str):
+                    data = read_image(data)
+            else:
+                data = values.get("default")
+            layer = param_results.create(kind=kind, data=data, name=name)
+            if kind == "image":
+                layer.rgb = values.get("rgb")  # type: ignore
+        return param_results
+
+    def process(self, file_name: str) -> Dict[str, Any]:
+        """Run the algorithm on an image file and write its outputs. Returns the log record of the run."""
+        trace = RunTrace(next(self._run_ids), self.algorithm)
+        record: Dict[str, Any] = {"input": file_name, "status": "ok", "outputs": [], "values": {}}
+        try:
+            with trace.span("read"):
+                param_results = self.param_results(read_image(file_name))
+            if self.server_url:
+                results = post_process(
+                    self.runner,  # type: ignore
+                    self.algorithm,
+                    param_results,
+                    trace,
+                    self.encoding,
+                    self.cancel_token,
+                )
+            else:
+                self.cancel_token.raise_if_cancelled()
+                results = trace.wrap(self.runner._run, "compute")(self.algorithm, param_results)
+            with trace.span("write"):
+                self._write(results, file_name, record)
+        except CancelledError:
+            record["status"] = "cancelled"
+        except Exception as e:
+            record["status"] = "errored"
+            record["error"] = getattr(e, "message", None) or repr(e)
+        trace.finish(record["status"])
+        record["duration_sec"] = trace.duration
+        record["phases_sec"] = {phase: total for phase, (total, _) in trace.summary().items()}
+        record["bytes_sent"] = trace.bytes_sent
+        record["bytes_received"] = trace.bytes_received
+        return record
+
+    def output_stem(self, file_name: str) -> str:
+        """Path of the outputs of an input, without the layer name and extension.
+
+        Eg. `results/plate1/A01` for `plates/plate1/A01.tif`, with `plates` as input root.
+        """
+        if self.input_root is None:
+            relative_path = os.path.basename(file_name)
+        else:
+            relative_path = os.path.relpath(file_name, self.input_root)
+        components = [_safe_name(component) for component in os.path.splitext(relative_path)[0].split(os.sep)]
+        # Inputs outside of the input root are written in `_` subfolders rather than above the output directory
+        components = ["_" if component == ".." else component for component in components]
+        return os.path.join(self.output_dir, *components)
+
+    def check_outputs(self, file_names: Iterable[str]):
+        """Raise a `ValueError` if the outputs of several inputs would overwrite each other."""
+        inputs: Dict[str, str] = {}
+        for file_name in file_names:
+            stem = self.output_stem(file_name)
+            if stem in inputs:
+                raise ValueError(f"{inputs[stem]} and {file_name} would be written to the same outputs ({stem}_*).")
+            inputs[stem] = file_name
+
+    def _write(self, results: Optional[Results], file_name: str, record: Dict[str, Any]):
+        if results is None:
+            return
+        stem = self.output_stem(file_name)
+        os.makedirs(os.path.dirname(stem), exist_ok=True)
+        for layer in results:
+            if layer.data is None:
+                continue
+            if layer.kind in ["image", "mask", "instance_mask"]:
+                import tifffile
+
+                output = f"{stem}_{_safe_name(layer.name)}.tif"
+                tifffile.imwrite(output, np.asarray(layer.data))
+                record["outputs"].append(output)
+            elif layer.kind in ARRAY_KINDS:
+                output = f"{stem}_{_safe_name(layer.name)}.npy"
+                np.save(output, np.asarray(layer.data))
+                record["outputs"].append(output)
+            else:
+                # Numbers, strings and notifications
+                record["values"][layer.name] = layer.data if isinstance(layer.data, (bool, int, float, str)) else str(layer.data)
+
+    def run(self, file_names: Iterable[str], log=None) -> List[Dict[str, Any]]:
+        """Process files, with at most `2 * n_workers` images loaded at a time. Records are written to `log` as they complete."""
+        file_names = list(file_names)
+        self.check_outputs(file_names)
+        n_files = len(file_names)
+        records: List[Dict[str, Any]] = []
+        pending: Set[Future] = set()
+        remaining = iter(file_names)
+        executor = ThreadPoolExecutor(self.n_workers, thread_name_prefix="serverkit-batch")
+        try:
+            while True:
+                while len(pending) < 2 * self.n_workers:
+                    file_name = next(remaining, None)
+                    if file_name is None:
+                        break
+                    pending.add(executor.submit(self.process, file_name))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    records.append(record)
+                    if log is not None:
+                        log.write(json.dumps(record) + "\n")
+                        log.flush()
+                    _print_progress(len(records), n_files, record)
+        except KeyboardInterrupt:
+            print("Cancelling...", file=sys.stderr)
+            self.cancel_token.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return records
+
+
+def _print_progress(n_done: int, n_files: int, record: Dict[str, Any]):
+    line = f"[{n_done}/{n_files}] {record['input']}: {record['status']} ({record['duration_sec']:.2f} s)"
+    if "error" in record:
+        line += f" - {record['error']}"
+    print(line, file=sys.stderr)
+
+
+def _completed_inputs(log_file: str) -> Set[str]:
+    """Inputs processed successfully according to a batch log."""
+    completed = set()
+    if os.path.isfile(log_file):
+        with open(log_file) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Truncated by an interrupted run
+                if record.get("status") == "ok":
+                    completed.add(record["input"])
+    return completed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", help="Server URL, or importable algorithm (`module:attribute` or `file.py:attribute`).")
+    parser.add_argument("inputs", help="Folder of images, or glob pattern (quoted, `**` matches subfolders).")
+    parser.add_argument("--output-dir", "-o", required=True, help="Folder to write the outputs and the batch log to.")
+    parser.add_argument("--algorithm", "-a", help="Algorithm name (required if the target provides several algorithms).")
+    parser.add_argument("--params", "-p", help="JSON or YAML file of parameter values (defaults are used for the others).")
+    parser.add_argument("--image-param", help="Parameter receiving the images (default: the first image parameter).")
+    parser.add_argument("--workers", "-w", type=int, default=4, help="Number of concurrent runs (default: 4).")
+    parser.add_argument("--encoding", help="Request compression (default: the first one accepted by the server).")
+    parser.add_argument("--overwrite", action="store_true", help="Also process the inputs already processed successfully.")
+    args = parser.parse_args(argv)
+
+    runner = load_runner(args.target)
+    algorithm = args.algorithm
+    if algorithm is None:
+        if len(runner.algorithms) != 1:
+            parser.error(f"--algorithm is required, choose among: {', '.join(runner.algorithms)}")
+        algorithm = runner.algorithms[0]
+
+    all_file_names = find_inputs(args.inputs)
+    file_names = all_file_names
+    os.makedirs(args.output_dir, exist_ok=True)
+    log_file = os.path.join(args.output_dir, LOG_FILE_NAME)
+    if not args.overwrite:
+        completed = _completed_inputs(log_file)
+        n_skipped = sum(file_name in completed for file_name in file_names)
+        if n_skipped:
+            print(f"Skipping {n_skipped} inputs already processed (see {log_file}).", file=sys.stderr)
+        file_names = [file_name for file_name in file_names if file_name not in completed]
+
+    batch_runner = BatchRunner(
+        runner,
+        algorithm,
+        load_parameters(args.params),
+        args.output_dir,
+        image_param=args.image_param,
+        n_workers=args.workers,
+        encoding=args.encoding,
+        input_root=input_root(args.inputs),
+    )
+    try:
+        # Also checked against the inputs skipped, whose outputs would be overwritten as well
+        batch_runner.check_outputs(all_file_names)
+    except ValueError as e:
+        parser.error(str(e))
+    t_start = time.perf_counter()
+    try:
+        with open(log_file, "a") as log:
+            records = batch_runner.run(file_names, log)
+    except KeyboardInterrupt:
+        return 130
+    n_failed = sum(record["status"] != "ok" for record in records)
+    print(
+        f"Processed {len(records)} inputs in {time.perf_counter() - t_start:.1f} s ({n_failed} failed).",
+        file=sys.stderr,
+    )
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,29 @@
-from .serverkit_http_widget import ServerKitHttpWidget
-from .algorithm_widget import AlgorithmWidget
-from .napari_results import NapariResults
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .serverkit_http_widget import ServerKitHttpWidget
+    from .algorithm_widget import AlgorithmWidget
+    from .napari_results import NapariResults
+
+_LAZY_ATTRIBUTES = {
+    "ServerKitHttpWidget": ".serverkit_http_widget",
+    "AlgorithmWidget": ".algorithm_widget",
+    "NapariResults": ".napari_results",
+}
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
+
+
+__all__ = ["ServerKitHttpWidget", "AlgorithmWidget", "NapariResults"]
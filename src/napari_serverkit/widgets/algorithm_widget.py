@@ -5,7 +5,7 @@ from napari_serverkit.widgets.serverkit_widget import ServerKitWidget
 
 
 class AlgorithmWidget(ServerKitWidget):
-    def __init__(self, viewer: napari.Viewer, algorithm: Algorithm):
+    def __init__(self, viewer: "napari.Viewer", algorithm: Algorithm):
         super().__init__(viewer=viewer, runner_widget=RunnerWidget(algorithm))
 
         self.runner_widget.cb_algorithms.clear()
@@ -0,0 +1,86 @@
+"""
+Cooperative cancellation of the tasks run by the TaskManager.
+"""
+
+import inspect
+import threading
+from typing import Callable, List
+
+
+class CancelledError(Exception):
+    """Raised by tasks that stop early because they were cancelled."""
+
+
+class CancelToken:
+    """Cancellation flag shared by a job and its task. Cancelling it calls the registered callbacks (eg. to abort a request)."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise CancelledError()
+
+    def on_cancel(self, callback: Callable) -> Callable:
+        """Call `callback()` (from the cancelling thread) once cancelled, or right away if already cancelled.
+
+        Returns a function that unregisters the callback.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback: Callable):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def cancellable(task: Callable, token: CancelToken) -> Callable:
+    """Stop a task as soon as `token` is cancelled.
+
+    Generator tasks are checked before and after each step, and closed once cancelled (which runs their cleanup code).
+    Tasks that raise a `CancelledError` return `None`.
+    """
+    if inspect.isgeneratorfunction(task):
+        def cancellable_generator(*args, **kwargs):
+            generator = task(*args, **kwargs)
+            try:
+                while not token.cancelled:
+                    try:
+                        value = next(generator)
+                    except StopIteration as e:
+                        return e.value
+                    if token.cancelled:
+                        return
+                    yield value
+            except CancelledError:
+                return
+            finally:
+                generator.close()
+        return cancellable_generator
+
+    def cancellable_function(*args, **kwargs):
+        try:
+            return task(*args, **kwargs)
+        except CancelledError:
+            return
+    return cancellable_function
@@ -1,5 +1,11 @@
+from functools import partial
+from typing import Callable, List, Optional
+
+import httpx
+from napari.qt.threading import create_worker
 from napari.utils.notifications import show_warning
 from qtpy.QtWidgets import (
+    QComboBox,
     QLabel,
     QPushButton,
     QLineEdit,
@@ -10,7 +16,18 @@ from imaging_server_kit.core.errors import (
     AlgorithmServerError,
     ServerRequestError,
 )
+from imaging_server_kit.core.results import Results
 import imaging_server_kit as sk
+from napari_serverkit.widgets.http_transfer import (
+    IDENTITY,
+    negotiate_encodings,
+    parse_accept_encoding,
+    post_process,
+    post_stream,
+)
+from napari_serverkit.widgets.cancellation import CancelToken
+from napari_serverkit.widgets.run_trace import RunTrace
+from napari_serverkit.widgets.tile_order import Viewport, tile_by_viewport, tiles_generator
 from napari_serverkit.widgets.runner_widget import RunnerWidget
 
 
@@ -36,20 +53,139 @@ class HttpRunnerWidget(RunnerWidget):
         self.connect_btn.clicked.connect(self._connect_from_btn)
         layout.addWidget(self.connect_btn, 0, 2)
 
+        # Request compression (negotiated with the server)
+        layout.addWidget(QLabel("Compression"), 1, 0)
+        self.cb_encoding = QComboBox()
+        layout.addWidget(self.cb_encoding, 1, 1, 1, 2)
+        self._server_encodings: List[str] = []
+        self._server_digest: Optional[str] = None
+        self._update_encodings()
+
         # Add the base runner widget
-        layout.addWidget(self._widget, 1, 0, 1, 3)
+        layout.addWidget(self._widget, 2, 0, 1, 3)
+
+        # Tiles are processed by the server
+        for ui_element in self.parallel_tiles_ui:
+            ui_element.setVisible(False)
 
     @property
     def widget(self) -> QWidget:
         return self.full_widget
 
+    @property
+    def server_id(self) -> Optional[str]:
+        return self.algorithm.server_url # type: ignore
+
     def _connect_from_btn(self):
         self.cb_algorithms.clear()
         server_url = self.server_url_field.text()
 
+        # Connect in a worker thread to keep the UI responsive
+        self.connect_btn.setEnabled(False)
+        self.connect_btn.setText("Connecting...")
+        worker = create_worker(self._connect, server_url)
+        worker.returned.connect(self._connected)
+        worker.start()
+
+    def _connect(self, server_url: str) -> Optional[Exception]:
+        self._server_encodings = []
+        self._server_digest = None
         try:
             self.algorithm.connect(server_url)
         except (ServerRequestError, AlgorithmServerError) as e:
-            show_warning(e.message)
+            return e
+        self._server_digest = self._get_server_validator()
+        self.schema_cache.validate(self.server_id, self._server_digest) # type: ignore
+
+    def _get_server_validator(self) -> str:
+        """Identifies the state of the server: its version, the ETag of the version route (if any), and the algorithms.
+
+        Also reads the request encodings accepted by the server.
+        """
+        version, etag = "", ""
+        self._server_encodings = []
+        try:
+            response = httpx.get(f"{self.server_id}/version")
+            if response.status_code == 200:
+                version = response.text
+                etag = response.headers.get("ETag", "")
+            self._server_encodings = parse_accept_encoding(response.headers.get("Accept-Encoding"))
+        except httpx.RequestError:
+            pass
+        return f"{version}|{etag}|{','.join(self.algorithm.algorithms)}"
+
+    def _connected(self, error: Optional[Exception]):
+        self.connect_btn.setEnabled(True)
+        self.connect_btn.setText("Connect")
+
+        if error is not None:
+            show_warning(error.message) # type: ignore
+
+        self._update_encodings()
 
         self.cb_algorithms.addItems(self.algorithm.algorithms)
+
+    def _update_encodings(self):
+        """List the request encodings supported by both the client and the server, keeping the selection if possible."""
+        selected = self.request_encoding
+        self.cb_encoding.clear()
+        for encoding in negotiate_encodings(self._server_encodings):
+            self.cb_encoding.addItem("none" if encoding == IDENTITY else encoding, encoding)
+        idx = self.cb_encoding.findData(selected)
+        self.cb_encoding.setCurrentIndex(max(idx, 0))
+        self.cb_encoding.setEnabled(self.cb_encoding.count() > 1)
+
+    def trace_task(self, task: Callable, trace: RunTrace, cancel_token: Optional[CancelToken] = None) -> Callable:
+        """Requests are posted by this widget, which records the timing of each phase, compresses the requests
+        and aborts the request in flight once `cancel_token` is cancelled."""
+        encoding = self.request_encoding
+        if isinstance(task, partial) and task.func == self.algorithm._run:
+            return partial(post_process, self.algorithm, trace=trace, encoding=encoding, cancel_token=cancel_token, **task.keywords)
+        if isinstance(task, partial) and (task.func == self.algorithm._tile or task.func is tile_by_viewport):
+            return partial(self._tile, trace, encoding, cancel_token, **task.keywords)
+        if isinstance(task, partial) and task.func == self.algorithm._stream:
+            return partial(post_stream, self.algorithm, trace=trace, cancel_token=cancel_token, **task.keywords)
+        return trace.wrap(task, "request")
+
+    def step_func(self, trace: RunTrace, cancel_token: Optional[CancelToken] = None) -> Callable:
+        """Run function of pipeline steps. Each step is a request: its inputs are uploaded (including the outputs of
+        previous steps) and its outputs downloaded."""
+        return partial(post_process, self.algorithm, trace=trace, encoding=self.request_encoding, cancel_token=cancel_token)
+
+    @property
+    def server_digest(self) -> Optional[str]:
+        return self._server_digest
+
+    @property
+    def request_encoding(self) -> str:
+        return self.cb_encoding.currentData() or IDENTITY
+
+    def _tile(
+        self,
+        trace: RunTrace,
+        encoding: str,
+        cancel_token: Optional[CancelToken],
+        algorithm: str,
+        tile_size_px: int,
+        overlap_percent: float,
+        delay_sec: float,
+        randomize: bool,
+        param_results: Results,
+        viewport: Optional[Viewport] = None,
+        visible_only: bool = False,
+    ):
+        """Same as `Client._tile()`, with compressed requests (and the tiles in `viewport` order, if given)."""
+        for tile_results, tile_info in tiles_generator(
+            param_results,
+            tile_size_px,
+            overlap_percent,
+            delay_sec,
+            randomize,
+            viewport,
+            visible_only,
+        ):
+            results = post_process(self.algorithm, algorithm, tile_results, trace, encoding, cancel_token) # type: ignore
+            if results is not None:
+                for layer in results:
+                    layer.meta = layer.meta | tile_info
+                yield results
@@ -0,0 +1,238 @@
+"""
+Requests to the /process route of algorithm servers, with compressed request bodies.
+
+Request compression is negotiated as in RFC 7694: servers list the content codings they accept
+in the `Accept-Encoding` header of their responses. Responses are decompressed by httpx, which
+advertises the codings it can decode in the `Accept-Encoding` header of its requests.
+
+Requests can be aborted from another thread with a `CancelToken`: the connection is shut down,
+which interrupts the upload or the wait for the response right away.
+"""
+
+import gzip
+import importlib.util
+import json
+import socket
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import msgpack
+
+from imaging_server_kit.core.client import TIMEOUT_SEC, Client
+from imaging_server_kit.core.errors import ServerRequestError
+from imaging_server_kit.core.results import Results
+from imaging_server_kit.core.serialization import deserialize_results
+
+from napari_serverkit.widgets.cancellation import CancelToken, CancelledError
+from napari_serverkit.widgets.run_trace import RunTrace
+
+IDENTITY = "identity"
+
+
+def _zstd_compress(content: bytes) -> bytes:
+    import zstandard
+
+    return zstandard.ZstdCompressor().compress(content)
+
+
+def _brotli_compress(content: bytes) -> bytes:
+    import brotli
+
+    return brotli.compress(content, quality=5)
+
+
+# Content codings (HTTP names) that can be used to compress request bodies
+CODECS: Dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda content: gzip.compress(content, compresslevel=6),
+    "deflate": lambda content: zlib.compress(content, 6),
+}
+if importlib.util.find_spec("zstandard") is not None:
+    CODECS["zstd"] = _zstd_compress
+if importlib.util.find_spec("brotli") is not None:
+    CODECS["br"] = _brotli_compress
+
+
+def parse_accept_encoding(header: Optional[str]) -> List[str]:
+    """Content codings listed in an `Accept-Encoding` header (excluding those with q=0)."""
+    if not header:
+        return []
+    encodings = []
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if any(param.replace(" ", "") in ["q=0", "q=0.0", "q=0.00", "q=0.000"] for param in params):
+            continue
+        if coding:
+            encodings.append(coding.lower())
+    return encodings
+
+
+def negotiate_encodings(accepted_by_server: List[str]) -> List[str]:
+    """Request encodings supported by both the client and the server (identity first)."""
+    if "*" in accepted_by_server:
+        return [IDENTITY] + list(CODECS)
+    return [IDENTITY] + [coding for coding in CODECS if coding in accepted_by_server]
+
+
+def _shutdown(network_stream):
+    sock = network_stream.get_extra_info("socket")
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Already closed
+
+
+def post_process(
+    client: Client,
+    algorithm: str,
+    param_results: Results,
+    trace: RunTrace,
+    encoding: str = IDENTITY,
+    cancel_token: Optional[CancelToken] = None,
+) -> Results:
+    """Same as `Client._run()`, with an optional request `encoding`.
+
+    Records the serialization, compression, upload, server compute, download and deserialization in `trace`.
+    Raises a `CancelledError` if `cancel_token` is cancelled before the response is downloaded.
+    """
+    endpoint = f"{client.server_url}/{algorithm}/process"
+    with trace.span("serialize"):
+        content = json.dumps(param_results.serialize("Python/Napari")).encode("utf-8")
+
+    headers = {
+        "Content-Type": "application/json",
+        "accept": "application/json",
+        "Authorization": f"Bearer {client.token}",
+        "User-Agent": "Python/Napari",
+    }
+    if encoding != IDENTITY:
+        with trace.span("compress"):
+            content = CODECS[encoding](content)
+        headers["Content-Encoding"] = encoding
+
+    # The end of the upload is reported by the HTTP transport
+    transport_events: Dict[str, float] = {}
+    unregister_callbacks: List[Callable] = []
+    def _transport_trace(event_name: str, info: Dict):
+        transport_events[event_name] = time.perf_counter()
+        if (event_name == "connection.connect_tcp.complete") and (cancel_token is not None):
+            network_stream = info["return_value"]
+            unregister_callbacks.append(cancel_token.on_cancel(lambda: _shutdown(network_stream)))
+
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+    with httpx.Client(base_url=client.server_url, timeout=TIMEOUT_SEC) as http_client: # type: ignore
+        t_start = time.perf_counter()
+        try:
+            with http_client.stream(
+                "POST",
+                endpoint,
+                content=content,
+                headers=headers,
+                extensions={"trace": _transport_trace},
+            ) as response:
+                t_response = time.perf_counter()
+                response.read()
+                t_downloaded = time.perf_counter()
+        except httpx.RequestError as e:
+            if (cancel_token is not None) and cancel_token.cancelled:
+                raise CancelledError() from e
+            raise ServerRequestError(endpoint, e)
+        finally:
+            for unregister in unregister_callbacks:
+                unregister()
+
+    t_uploaded = transport_events.get("http11.send_request_body.complete", t_start)
+    trace.add_span("upload", t_start, t_uploaded)
+    trace.add_span("server", t_uploaded, t_response)
+    trace.add_span("download", t_response, t_downloaded)
+    trace.add_transfer(len(content), response.num_bytes_downloaded)
+
+    if (response.status_code == 415) and (encoding != IDENTITY):
+        # The server does not accept this encoding after all
+        return post_process(client, algorithm, param_results, trace, IDENTITY, cancel_token)
+    if response.status_code == 201:
+        with trace.span("deserialize"):
+            return deserialize_results(response.json(), "Python/Napari")
+    client._handle_response_errored(response)
+
+
+def post_stream(
+    client: Client,
+    algorithm: str,
+    param_results: Results,
+    trace: RunTrace,
+    cancel_token: Optional[CancelToken] = None,
+):
+    """Same as `Client._stream()`, aborted as soon as `cancel_token` is cancelled (instead of after the next frame).
+
+    Records the serialization, upload and server response time in `trace`, then the wait for each frame
+    ("download", which includes the server compute of the frame) and its deserialization.
+    """
+    endpoint = f"{client.server_url}/{algorithm}/stream"
+    with trace.span("serialize"):
+        content = json.dumps(param_results.serialize("Python/Napari")).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json",
+        "accept": "application/msgpack",
+        "Authorization": f"Bearer {client.token}",
+        "User-Agent": "Python/Napari",
+    }
+
+    transport_events: Dict[str, float] = {}
+    unregister_callbacks: List[Callable] = []
+    def _transport_trace(event_name: str, info: Dict):
+        transport_events[event_name] = time.perf_counter()
+        if (event_name == "connection.connect_tcp.complete") and (cancel_token is not None):
+            network_stream = info["return_value"]
+            unregister_callbacks.append(cancel_token.on_cancel(lambda: _shutdown(network_stream)))
+
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+    with httpx.Client(base_url=client.server_url, timeout=TIMEOUT_SEC) as http_client: # type: ignore
+        t_start = time.perf_counter()
+        try:
+            with http_client.stream(
+                "POST",
+                endpoint,
+                content=content,
+                headers=headers,
+                extensions={"trace": _transport_trace},
+            ) as response:
+                t_response = time.perf_counter()
+                t_uploaded = transport_events.get("http11.send_request_body.complete", t_start)
+                trace.add_span("upload", t_start, t_uploaded)
+                trace.add_span("server", t_uploaded, t_response)
+                trace.add_transfer(len(content), 0)
+                if response.status_code != 200:
+                    response.read()
+                    client._handle_response_errored(response)
+                    return
+                unpacker = msgpack.Unpacker(raw=False)
+                n_received = 0
+                t_waiting = time.perf_counter()
+                # As received (a chunk size would hold small frames back until enough data arrives)
+                for chunk in response.iter_bytes():
+                    trace.add_span("download", t_waiting, time.perf_counter())
+                    trace.add_transfer(0, response.num_bytes_downloaded - n_received)
+                    n_received = response.num_bytes_downloaded
+                    unpacker.feed(chunk)
+                    with trace.span("deserialize"):
+                        frame = deserialize_results(unpacker, "Python/Napari")
+                    if len(frame):  # Otherwise, the chunk ends within a frame
+                        yield frame
+                    t_waiting = time.perf_counter()
+                if cancel_token is not None:
+                    # The connection was shut down (the response may look complete)
+                    cancel_token.raise_if_cancelled()
+        except httpx.RequestError as e:
+            if (cancel_token is not None) and cancel_token.cancelled:
+                raise CancelledError() from e
+            raise ServerRequestError(endpoint, e)
+        finally:
+            for unregister in unregister_callbacks:
+                unregister()
@@ -0,0 +1,87 @@
+"""
+Live slice mode: algorithms are run on the plane displayed in the viewer, rather than on the whole (3D, time-lapse...) layers.
+"""
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from imaging_server_kit.core.results import Results
+
+if TYPE_CHECKING:
+    import napari
+    from napari.components import Dims
+
+SLICED_KINDS = ["image", "mask", "instance_mask"]
+
+
+def slice_key(dims: "Dims", current_step: Tuple[int, ...]) -> Tuple[int, ...]:
+    """Steps along the sliders (the non-displayed dimensions), which identify the displayed plane."""
+    return tuple(current_step[axis] for axis in dims.not_displayed)
+
+
+def _world_point(dims: "Dims", current_step: Tuple[int, ...]) -> np.ndarray:
+    return np.array([r.start + step * r.step for r, step in zip(dims.range, current_step)])
+
+
+def layer_plane(layer: "napari.layers.Layer", data, dims: "Dims", current_step: Tuple[int, ...]):
+    """The plane of `data` (the data of `layer`) displayed at `current_step`, or `data` itself if it has no sliced axis."""
+    offset = dims.ndim - layer.ndim
+    sliced_axes = [axis - offset for axis in dims.not_displayed if axis >= offset]
+    if (not sliced_axes) or (getattr(data, "ndim", 0) < layer.ndim):
+        return data
+    data_point = layer.world_to_data(_world_point(dims, current_step))
+    index: List = [slice(None)] * layer.ndim
+    for axis in sliced_axes:
+        index[axis] = int(np.clip(np.round(data_point[axis]), 0, data.shape[axis] - 1))
+    return np.asarray(data[tuple(index)])
+
+
+def slice_layer_params(
+    algo_params: Results,
+    layers: Dict[str, "napari.layers.Layer"],
+    dims: "Dims",
+    current_step: Tuple[int, ...],
+) -> Results:
+    """Copy of the algorithm parameters in which image and mask layers are replaced by their displayed plane.
+
+    `layers` maps the layer parameters to the napari layers they were read from. Other kinds of layers
+    (points, shapes...) are passed whole.
+    """
+    sliced_params = Results()
+    for layer in algo_params:
+        data = layer.data
+        if (layer.kind in SLICED_KINDS) and (layer.name in layers) and (data is not None):
+            data = layer_plane(layers[layer.name], data, dims, current_step)
+        sliced_params.create(kind=layer.kind, data=data, name=layer.name, meta=dict(layer.meta))
+    return sliced_params
+
+
+def neighbor_steps(
+    dims: "Dims",
+    current_step: Tuple[int, ...],
+    radius: int,
+    direction: int = 1,
+) -> List[Tuple[int, ...]]:
+    """Steps of the planes next to `current_step` along the last used slider, nearest first.
+
+    Planes in the scrubbing `direction` (+1 or -1) come before the ones behind.
+    """
+    sliders = list(dims.not_displayed)
+    if not sliders:
+        return []
+    axis = dims.last_used if dims.last_used in sliders else sliders[0]
+    steps = []
+    for distance in range(1, radius + 1):
+        for sign in (direction, -direction):
+            step = current_step[axis] + sign * distance
+            if 0 <= step < dims.nsteps[axis]:
+                steps.append(current_step[:axis] + (step,) + current_step[axis + 1 :])
+    return steps
+
+
+def scrub_direction(previous_step: Optional[Tuple[int, ...]], current_step: Tuple[int, ...]) -> int:
+    if (previous_step is None) or (len(previous_step) != len(current_step)):
+        return 1
+    delta = sum(current - previous for previous, current in zip(previous_step, current_step))
+    return -1 if delta < 0 else 1
@@ -2,34 +2,147 @@
 Implements the LayerStackBase interface for Napari's viewer.
 """
 
-from typing import Any, Callable, Dict, Optional
+import atexit
+import contextlib
+import os
+import shutil
+import tempfile
+import warnings
+import weakref
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Set, Tuple
 import numpy as np
 
 import napari
-import napari.layers
 from napari.utils.notifications import show_error, show_info, show_warning
 
 from imaging_server_kit.core.results import Results, LayerStackBase, DataLayer
 
 
+# Meta keys that are not napari layer properties
+NON_LAYER_META_KEYS = ["tile_params", "name", "ndim"]
+
+# Events that are not re-emitted after setting the layer properties (the layer is refreshed anyway)
+BATCH_SKIPPED_EVENTS = ["data", "set_data", "refresh", "reload", "thumbnail"]
+
+# Napari layer => {key: (meta value, layer property value)} last applied by `_set_layer_attributes_from_meta`
+_applied_meta: "weakref.WeakKeyDictionary[Any, Dict[str, Tuple[Any, Any]]]" = weakref.WeakKeyDictionary()
+
+
+def _meta_values_equal(a: Any, b: Any) -> bool:
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, np.ndarray):
+        return (a.shape == b.shape) and np.array_equal(a, b)
+    if hasattr(a, "equals"):  # pandas objects (eg. features tables)
+        return bool(a.equals(b))
+    if isinstance(a, dict):
+        return (a.keys() == b.keys()) and all(_meta_values_equal(a[key], b[key]) for key in a)
+    if isinstance(a, (list, tuple)):
+        return (len(a) == len(b)) and all(_meta_values_equal(x, y) for (x, y) in zip(a, b))
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
+
+def _is_applied(layer, key: str, value: Any, applied: Dict[str, Tuple[Any, Any]]) -> bool:
+    """Whether `value` was applied to the layer property `key`, which kept its value since then.
+
+    Napari resets some properties when the layer data changes (eg. the features of Tracks), which have to be applied again.
+    """
+    if key not in applied:
+        return False
+    applied_value, property_value = applied[key]
+    if not _meta_values_equal(applied_value, value):
+        return False
+    try:
+        return _meta_values_equal(property_value, getattr(layer, key))
+    except Exception:
+        return False
+
+
 def _set_layer_attributes_from_meta(meta: Dict, layer: DataLayer):
-    # Set the features first
-    if "features" in meta:
-        value = meta["features"]
-        try:
-            setattr(layer, "features", value)
-        except:
-            print("Could not set layer features.")
-    
-    for key, value in meta.items():
-        if key not in ["tile_params", "name", "features", "ndim"]:
-            try:
-                setattr(layer, key, value)
-            except:
-                print("Could not set this layer property: ", key)
+    """Set the properties of a napari layer from the meta, skipping the values already applied by a previous call.
+
+    The properties are set while the layer events are blocked; afterwards, the event of each property that was set
+    is emitted once (the events that napari emits as side effects stay blocked).
+    """
+    applied = _applied_meta.get(layer, {})
+    changed = {
+        key: value
+        for key, value in meta.items()
+        if (key not in NON_LAYER_META_KEYS) and not _is_applied(layer, key, value, applied)
+    }
+    if not changed:
+        return
 
+    with contextlib.ExitStack() as stack:
+        blockers = {name: stack.enter_context(emitter.blocker()) for name, emitter in layer.events.emitters.items()}
 
-def create(viewer, layer) -> None:
+        # Set the features first
+        for key in sorted(changed, key=lambda key: key != "features"):
+            try:
+                setattr(layer, key, changed[key])
+            except Exception as e:
+                warnings.warn(f"Could not set the {key!r} property of layer {layer.name!r}: {e}")
+                changed.pop(key)
+
+    for key, value in changed.items():
+        applied[key] = (value, getattr(layer, key, None))
+    _applied_meta[layer] = applied
+
+    for key in changed:
+        blocker = blockers.get(key)
+        if (blocker is not None) and (blocker.count > 0) and (key not in BATCH_SKIPPED_EVENTS):
+            layer.events.emitters[key](value=getattr(layer, key))
+
+
+def _labels_data(data: np.ndarray, keep_buffer: bool = False) -> np.ndarray:
+    """Make mask data displayable as napari Labels, converting (copying) it only when needed.
+
+    Integer arrays are kept as-is, boolean arrays are viewed as uint8, and other arrays are
+    converted to the smallest integer type that holds their values (NaN and infinite values become background).
+    With `keep_buffer=True`, warns when the incoming buffer cannot be kept (napari Labels only support integers).
+    """
+    if np.issubdtype(data.dtype, np.integer):
+        return data
+    if data.dtype == bool:
+        return data.view(np.uint8)
+    if keep_buffer:
+        warnings.warn(f"Converting mask data of type {data.dtype} to integers (napari Labels only support integers).")
+    if data.size == 0:
+        return data.astype(np.uint8)
+    min_value, max_value = np.min(data), np.max(data)
+    if not (np.isfinite(min_value) and np.isfinite(max_value)):
+        data = np.where(np.isfinite(data), data, 0)
+        min_value, max_value = np.min(data), np.max(data)
+    min_value, max_value = int(min_value), int(max_value)
+    dtype = np.promote_types(np.min_scalar_type(min_value), np.min_scalar_type(max_value))
+    return data.astype(dtype)
+
+
+def _shapes_to_boxes(data: Any, napari_layer=None) -> Optional[np.ndarray]:
+    """Cast the data of a Shapes layer (a list of arrays) into a boxes array of shape (N, 4, D)."""
+    if not isinstance(data, list):
+        return data
+    if len(data) == 0:
+        # If the layer data is an empty list, we should convert it to None instead.
+        return None
+    # We assume the Shapes layer contains rectangles that can be casted to a single "boxes" array.
+    try:
+        return np.asarray(data)
+    except:
+        print("Could not interpret the content of this Shapes layer as boxes (ignoring it instead): ", napari_layer)
+        return None
+
+
+SHAPE_TYPES = {"boxes": "rectangle", "paths": "path"}
+
+
+def create(viewer, layer, keep_buffer: bool = False):
     kind = layer.kind
     data = layer.data
     name = layer.name
@@ -38,7 +151,9 @@ def create(viewer, layer) -> None:
     if kind == "image":
         layer = viewer.add_image(data, name=name)
     elif kind in ["mask", "instance_mask"]:
-        layer = viewer.add_labels(data.astype(np.uint16), name=name)
+        data = _labels_data(data, keep_buffer)
+        layer.data = data  # The results layer and the napari layer share the same array
+        layer = viewer.add_labels(data, name=name)
     elif kind == "points":
         layer = viewer.add_points(data, name=name)
     elif kind in ["boxes", "paths"]:
@@ -57,16 +172,74 @@ def create(viewer, layer) -> None:
 
     layer.refresh()
 
-
-def _napari_layer_update(viewer, layer):
-    for l in viewer.layers:
-        if l.name == layer.name:
-            l.data = layer.data
-            _set_layer_attributes_from_meta(layer.meta, l)
-            l.refresh()
+    return layer
 
 
-def _notification_update(viewer, layer):
+def _napari_layer_update(viewer, layer, napari_layer=None, keep_buffer: bool = False):
+    if napari_layer is not None:
+        if isinstance(napari_layer, napari.layers.Labels) and isinstance(layer.data, np.ndarray):
+            layer.data = _labels_data(layer.data, keep_buffer)
+        if isinstance(napari_layer, napari.layers.Shapes) and (layer.kind in SHAPE_TYPES) and (layer.data is not None):
+            # Otherwise, napari would add the shapes as polygons
+            napari_layer.data = (layer.data, [SHAPE_TYPES[layer.kind]] * len(layer.data))
+        else:
+            napari_layer.data = layer.data
+        _set_layer_attributes_from_meta(layer.meta, napari_layer)
+        napari_layer.refresh()
+
+
+def _get_tile_slices(tile_params: Dict) -> Tuple[slice, ...]:
+    return tuple(
+        slice(tile_params[f"pos_{idx}"], tile_params[f"pos_{idx}"] + tile_params[f"tile_size_{idx}"])
+        for idx in range(tile_params["ndim"])
+    )
+
+
+def _partial_labels_refresh(napari_layer, tile_slices: Tuple[slice, ...]) -> bool:
+    """Refresh only the region of a Labels layer covered by a tile. This relies on napari's private API,
+    so we return False (and let the caller refresh the whole layer) if it isn't available."""
+    try:
+        layer_slice = napari_layer._slice.image
+        displayed_slices = tuple(tile_slices[axis] for axis in napari_layer._slice_input.displayed)
+        if napari_layer.contour == 0:
+            layer_slice.view[displayed_slices] = napari_layer.colormap._data_to_texture(
+                layer_slice.raw[displayed_slices]
+            )
+        napari_layer._updated_slice = tile_slices
+        napari_layer._partial_labels_refresh()
+    except Exception:
+        return False
+    return True
+
+
+def merge_tile(viewer, layer, tile_data: np.ndarray, tile_params: Dict, napari_layer) -> Tuple[slice, ...]:
+    """Write a tile in place into the (preallocated) napari layer data. Returns the region it covers, to be
+    refreshed once all the tiles of a merge are written (see `refresh_region()`)."""
+    tile_slices = _get_tile_slices(tile_params)
+    napari_layer.data[tile_slices] = tile_data
+    return tile_slices
+
+
+def _union_slices(a: Tuple[slice, ...], b: Tuple[slice, ...]) -> Tuple[slice, ...]:
+    """Bounding box of two regions."""
+    return tuple(slice(min(x.start, y.start), max(x.stop, y.stop)) for x, y in zip(a, b))
+
+
+def refresh_region(napari_layer, region: Tuple[slice, ...], is_last_tile: bool) -> None:
+    """Refresh the region of a layer written by `merge_tile()`.
+
+    Only Labels layers are refreshed partially (through napari's private API), until their last tile is merged.
+    napari has no partial refresh for Image layers, which are refreshed whole: in `benchmarks/bench_client.py`,
+    merging the 1024 tiles of a 4096 x 4096 output one by one takes about 10 times longer for an image than for
+    a mask (`tiled_merge/image/large` and `tiled_merge/mask/large`). Coalesced tiles are refreshed together, though.
+    """
+    if isinstance(napari_layer, napari.layers.Labels) and not is_last_tile:
+        if _partial_labels_refresh(napari_layer, region):
+            return
+    napari_layer.refresh()
+
+
+def _notification_update(viewer, layer, napari_layer=None):
     if layer.data is not None:
         level = layer.meta.get("level", "info")
         if level == "error":
@@ -77,17 +250,17 @@ def _notification_update(viewer, layer):
             show_info(layer.data)
 
 
-def _textlayer_update(viewer, layer):
+def _textlayer_update(viewer, layer, napari_layer=None):
     viewer.text_overlay.visible = True
     viewer.text_overlay.text = str(layer.data)
 
 
-def update(viewer, layer) -> None:
+def update(viewer, layer, napari_layer=None, keep_buffer: bool = False) -> None:
     """Based on the kind of layer, execute the right update function."""
     update_hooks = {
         "image": _napari_layer_update,
-        "mask": _napari_layer_update,
-        "instance_mask": _napari_layer_update,
+        "mask": partial(_napari_layer_update, keep_buffer=keep_buffer),
+        "instance_mask": partial(_napari_layer_update, keep_buffer=keep_buffer),
         "points": _napari_layer_update,
         "boxes": _napari_layer_update,
         "paths": _napari_layer_update,
@@ -102,7 +275,7 @@ def update(viewer, layer) -> None:
     }
     update_func: Optional[Callable] = update_hooks.get(layer.kind)
     if update_func is not None:
-        update_func(viewer, layer)
+        update_func(viewer, layer, napari_layer)
 
 
 def read(viewer, layer) -> None:
@@ -110,12 +283,6 @@ def read(viewer, layer) -> None:
     pass
 
 
-def delete(viewer, layer_name) -> None:
-    for idx, l in enumerate(viewer.layers):
-        if l.name == layer_name:
-            viewer.layers.pop(idx)
-
-
 def napari_layer_to_results_layer(napari_layer, results: Results):
     # layer_to_kind = {}  # TODO: better approach...
     if isinstance(napari_layer, napari.layers.Image):
@@ -147,15 +314,43 @@ def napari_layer_to_results_layer(napari_layer, results: Results):
     return results
 
 
-class NapariResults(LayerStackBase):
-    """Works like Results, but behaves in sync with a Napari Viewer."""
+TILED_ARRAY_KINDS = ["image", "mask", "instance_mask"]
 
-    def __init__(self, viewer: Optional[napari.Viewer] = None):
+
+class NapariResults(LayerStackBase):
+    """Works like Results, but behaves in sync with a Napari Viewer.
+
+    Set `keep_label_buffers=True` to be warned when mask data cannot be passed to napari exactly as received
+    (integer masks are never copied, but other types need a conversion).
+    Set `memmap_tiled_outputs=True` to write the image and mask outputs of tiled runs into memory-mapped files
+    (in `scratch_dir`, or a temporary directory), so that they don't need to fit in memory.
+    """
+
+    def __init__(
+        self,
+        viewer: Optional["napari.Viewer"] = None,
+        keep_label_buffers: bool = False,
+        memmap_tiled_outputs: bool = False,
+        scratch_dir: Optional[str] = None,
+    ):
         super().__init__()
 
+        self.keep_label_buffers = keep_label_buffers
+        self.memmap_tiled_outputs = memmap_tiled_outputs
+        self._scratch_dir = scratch_dir
+        self._memmap_files: Dict[str, str] = {}  # layer name => backing file of its memory-mapped data
+
         # Create a Results object
         self.results = Results()
 
+        # Name => layer indices, kept in sync with the viewer events
+        self._results_layers: Dict[str, DataLayer] = {}
+        self._napari_layers: Dict[str, "napari.layers.Layer"] = {}
+        self._napari_layer_names: Dict[int, str] = {}  # id(napari layer) => indexed name
+
+        # Names of the layers whose napari data changed since the results layer was last synced
+        self._dirty_layers: Set[str] = set()
+
         # Create a Viewer
         if viewer is None:
             self.viewer = napari.Viewer()
@@ -172,22 +367,73 @@ class NapariResults(LayerStackBase):
         self.connect_layer_renamed_event(self.sync_layer_renamed)
 
     def sync_layer_added(self, e):
-        added_napari_layer = e.source[-1]
+        added_napari_layer = e.value
         self._handle_new_layer(added_napari_layer)
 
     def sync_layer_renamed(self, e):
-        viewer_layer_names = [l.name for l in self.viewer.layers]
-        new_name = e.source
-        for layer in self.results:
-            if layer.name not in viewer_layer_names:
-                layer.name = new_name
+        napari_layer = e.source
+        old_name = self._napari_layer_names.get(id(napari_layer))
+        if old_name is None:
+            return
+        new_name = napari_layer.name
+        self._index_napari_layer(napari_layer)
+        self._napari_layers.pop(old_name, None)
+        layer = self._results_layers.pop(old_name, None)
+        if layer is not None:
+            layer.name = new_name
+            self._results_layers[new_name] = layer
+        if old_name in self._memmap_files:
+            self._memmap_files[new_name] = self._memmap_files.pop(old_name)
+        if old_name in self._dirty_layers:
+            self._dirty_layers.discard(old_name)
+            self._dirty_layers.add(new_name)
 
     def sync_layer_removed(self, e):
-        layer_name = e.value.name
-        self.delete(layer_name)
+        layer_name = self._napari_layer_names.pop(id(e.value), None)
+        if layer_name is not None:
+            # Already removed from the viewer
+            self._napari_layers.pop(layer_name, None)
+            self.delete(layer_name)
+
+    def _index_napari_layer(self, napari_layer):
+        self._napari_layers[napari_layer.name] = napari_layer
+        self._napari_layer_names[id(napari_layer)] = napari_layer.name
 
     def _handle_new_layer(self, napari_layer):
+        self._index_napari_layer(napari_layer)
+        napari_layer.events.data.connect(self._napari_layer_data_changed)
+        if napari_layer.name in self._results_layers:
+            # The napari layer was added by self.create()
+            return
+        self._dirty_layers.add(napari_layer.name)
+        n_layers = len(self.results.layers)
         self.results = napari_layer_to_results_layer(napari_layer, self.results)
+        if len(self.results.layers) > n_layers:
+            layer = self.results.layers[-1]
+            self._results_layers[layer.name] = layer
+
+    def _napari_layer_data_changed(self, e):
+        layer_name = self._napari_layer_names.get(id(e.source))
+        if layer_name is not None:
+            self._dirty_layers.add(layer_name)
+
+    def read_synced(self, layer_name: str) -> Optional[DataLayer]:
+        """Read a layer, after syncing its data with the napari layer if it was edited in the viewer.
+
+        The data of Shapes layers is converted into boxes only after it was edited; the converted array is kept otherwise.
+        """
+        layer = self._results_layers.get(layer_name)
+        napari_layer = self._napari_layers.get(layer_name)
+        if (layer is None) or (napari_layer is None) or (layer_name not in self._dirty_layers):
+            return layer
+        self._dirty_layers.discard(layer_name)
+        data = napari_layer.data
+        if layer.data is not data:
+            # Shapes.data are interpreted as boxes, however the napari layer data is a list of arrays
+            if layer.kind == "boxes":
+                data = _shapes_to_boxes(data, napari_layer)
+            layer.update(data, layer.meta)
+        return layer
 
     @property
     def layers(self):
@@ -201,24 +447,148 @@ class NapariResults(LayerStackBase):
 
     def create(self, kind, data, name=None, meta=None):
         layer = self.results.create(kind, data, name, meta) # type: ignore
-        create(self.viewer, layer)
+        self._results_layers[layer.name] = layer
+        napari_layer = create(self.viewer, layer, self.keep_label_buffers)
+        if napari_layer is not None and napari_layer.name != layer.name:
+            # Napari resolved a naming conflict differently; follow the viewer
+            self._results_layers.pop(layer.name)
+            layer.name = napari_layer.name
+            self._results_layers[layer.name] = layer
         return layer
 
     def read(self, layer_name):
-        layer = self.results.read(layer_name)
+        layer = self._results_layers.get(layer_name)
         read(self.viewer, layer)
         return layer
 
     def update(self, layer_name, layer_data: Any, layer_meta: Dict):
-        layer = self.results.update(layer_name, layer_data, layer_meta)
-        update(self.viewer, layer)
+        layer = self._results_layers.get(layer_name)
+        if layer is not None:
+            layer.update(layer_data, layer_meta)
+            update(self.viewer, layer, self._napari_layers.get(layer_name), self.keep_label_buffers)
+            # The napari layer now reflects the results layer
+            self._dirty_layers.discard(layer_name)
         return layer
 
     def delete(self, layer_name) -> None:
-        self.results.delete(layer_name)
-        delete(self.viewer, layer_name)
+        self._dirty_layers.discard(layer_name)
+        self._remove_memmap_file(layer_name)
+        layer = self._results_layers.pop(layer_name, None)
+        if layer is not None:
+            # The results stack (and the viewer's layer list) are plain lists, so removing a layer stays O(n),
+            # however it only compares identities (once per deleted layer), unlike lookups by name
+            self.results.layers.remove(layer)
+        napari_layer = self._napari_layers.pop(layer_name, None)
+        if napari_layer is not None:
+            self._napari_layer_names.pop(id(napari_layer), None)
+            self.viewer.layers.remove(napari_layer)
+
+    def merge(
+        self,
+        layer_stack: Optional[LayerStackBase] = None,
+        tiles_callback: Optional[Callable] = None,
+    ):
+        """Merge another layer stack, based on layer names.
+
+        Tiles of image and mask layers are written in place into an output layer allocated once at full size.
+        Once all of them are written, each output layer is refreshed once, over the region covered by its tiles.
+        """
+        if layer_stack is None:
+            return
+
+        # Layer name => (region covered by the merged tiles, whether the last tile is among them)
+        merged_regions: Dict[str, Tuple[Tuple[slice, ...], bool]] = {}
+        for layer in layer_stack:
+            if layer.is_tiled and layer.kind in TILED_ARRAY_KINDS and isinstance(layer.data, np.ndarray):
+                layer_name, tile_slices = self._merge_array_tile(layer)
+                tile_params = layer.meta["tile_params"]
+                is_last_tile = tile_params["tile_idx"] == tile_params["n_tiles"] - 1
+                if layer_name in merged_regions:
+                    region, merged_last_tile = merged_regions[layer_name]
+                    tile_slices = _union_slices(region, tile_slices)
+                    is_last_tile = is_last_tile or merged_last_tile
+                merged_regions[layer_name] = (tile_slices, is_last_tile)
+            else:
+                self._merge_layer(layer)
+
+            if layer.is_tiled and tiles_callback is not None:
+                tiles_callback(
+                    tile_idx=layer.meta["tile_params"]["tile_idx"],
+                    n_tiles=layer.meta["tile_params"]["n_tiles"],
+                )
+
+        for layer_name, (region, is_last_tile) in merged_regions.items():
+            napari_layer = self._napari_layers.get(layer_name)
+            if napari_layer is not None:
+                refresh_region(napari_layer, region, is_last_tile)
+
+    def _merge_layer(self, layer: DataLayer):
+        existing_layer = self.read(layer.name)
+        if existing_layer is None:
+            existing_layer = self.create(layer.kind, layer.get_initial_data(), layer.name, layer.meta)
+        elif layer.is_first_tile:
+            self.update(existing_layer.name, layer.get_initial_data(), layer.meta)
+
+        if layer.is_tiled:
+            existing_layer.merge_tile(layer.data, layer.meta)
+            self.update(existing_layer.name, existing_layer.data, existing_layer.meta)
+        else:
+            self.update(existing_layer.name, layer.data, layer.meta)
+
+    def _merge_array_tile(self, layer: DataLayer) -> Tuple[str, Tuple[slice, ...]]:
+        """Write a tile into its output layer, without refreshing it. Returns the name of the output layer and
+        the region of the tile."""
+        tile_params = layer.meta["tile_params"]
+        domain_shape = tuple(tile_params[f"domain_size_{idx}"] for idx in range(tile_params["ndim"]))
+
+        existing_layer = self.read(layer.name)
+        if existing_layer is None:
+            existing_layer = self.create(layer.kind, self._get_tiled_output(layer, domain_shape), layer.name, layer.meta)
+            if (existing_layer.name != layer.name) and (layer.name in self._memmap_files):
+                self._memmap_files[existing_layer.name] = self._memmap_files.pop(layer.name)
+        elif layer.is_first_tile or getattr(existing_layer.data, "shape", None) != domain_shape:
+            self.update(existing_layer.name, self._get_tiled_output(layer, domain_shape), layer.meta)
+
+        napari_layer = self._napari_layers[existing_layer.name]
+        tile_slices = merge_tile(self.viewer, existing_layer, layer.data, tile_params, napari_layer)
+
+        # The results layer shares its data with the napari layer, so that it stays up to date without copies
+        existing_layer.data = napari_layer.data
+        return existing_layer.name, tile_slices
+
+    def _get_tiled_output(self, layer: DataLayer, domain_shape: Tuple[int, ...]) -> np.ndarray:
+        """Allocate the full-size output of a tiled layer, in memory or in a memory-mapped file."""
+        self._remove_memmap_file(layer.name)
+        if not self.memmap_tiled_outputs:
+            return layer.get_initial_data()
+        # The dtype of the initial data, without allocating it
+        dtype = type(layer)._get_initial_data((1,) * len(domain_shape)).dtype
+        file_descriptor, file_name = tempfile.mkstemp(suffix=".dat", dir=self.scratch_dir)
+        os.close(file_descriptor)
+        self._memmap_files[layer.name] = file_name
+        # The file is sparse: disk space is only used by the tiles written into it
+        return np.memmap(file_name, dtype=dtype, mode="w+", shape=domain_shape)
+
+    @property
+    def scratch_dir(self) -> str:
+        if self._scratch_dir is None:
+            self._scratch_dir = tempfile.mkdtemp(prefix="napari-serverkit-tiles-")
+            atexit.register(shutil.rmtree, self._scratch_dir, ignore_errors=True)
+        os.makedirs(self._scratch_dir, exist_ok=True)
+        return self._scratch_dir
+
+    def _remove_memmap_file(self, layer_name: str):
+        file_name = self._memmap_files.pop(layer_name, None)
+        if file_name is not None:
+            try:
+                # Still mapped by the previous array until it is garbage collected (where the platform allows it)
+                os.remove(file_name)
+            except OSError:
+                pass
 
     def connect_layer_renamed_event(self, func: Callable):
+        for l in self.viewer.layers:
+            l.events.name.connect(func)
         self.viewer.layers.events.inserted.connect(
             lambda e: e.value.events.name.connect(func)
         )
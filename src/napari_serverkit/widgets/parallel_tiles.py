@@ -0,0 +1,137 @@
+"""
+Parallel tiled execution of in-process algorithms, on a thread or process pool.
+"""
+
+import pickle
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Optional, Tuple
+
+from imaging_server_kit.core.algorithm import Algorithm
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.cancellation import CancelToken
+from napari_serverkit.widgets.tile_order import Viewport, tiles_generator
+
+# Algorithm of the pool processes (sent once per process rather than with every tile)
+_process_algorithm = None
+
+
+def _init_process(algorithm: Algorithm):
+    global _process_algorithm
+    _process_algorithm = algorithm
+
+
+def _run_tile_in_process(algorithm: str, tile_results: Results) -> Results:
+    return _process_algorithm._run(algorithm, tile_results)  # type: ignore
+
+
+def is_picklable(obj: Any) -> bool:
+    try:
+        pickle.dumps(obj)
+    except Exception:
+        return False
+    return True
+
+
+def _create_executor(algorithm: Algorithm, n_workers: int, use_processes: bool) -> Executor:
+    if use_processes:
+        return ProcessPoolExecutor(n_workers, initializer=_init_process, initargs=(algorithm,))
+    return ThreadPoolExecutor(n_workers, thread_name_prefix="serverkit-tile")
+
+
+def tile_in_parallel(
+    runner: Algorithm,
+    algorithm: str,
+    tile_size_px: int,
+    overlap_percent: float,
+    delay_sec: float,
+    randomize: bool,
+    param_results: Results,
+    n_workers: int = 4,
+    use_processes: bool = False,
+    ordered: bool = False,
+    cancel_token: Optional[CancelToken] = None,
+    viewport: Optional[Viewport] = None,
+    visible_only: bool = False,
+):
+    """Same as `Algorithm._tile()`, but the tiles are processed by a pool of `n_workers` threads (or processes).
+
+    Results are yielded in tiles order if `ordered`, otherwise as soon as they are completed. In the latter case,
+    the tile indices are renumbered in completion order, so that the first and last tiles yielded are flagged as such.
+    At most two tiles per worker are in flight, so the input image is never split in memory all at once.
+    Once `cancel_token` is cancelled, no more tiles are scheduled or yielded, and the queued ones are dropped.
+    Tiles are scheduled in `viewport` order, if given (see `tile_order.generate_tiles()`).
+    """
+    executor = _create_executor(runner, n_workers, use_processes)
+    # Completed when the run is cancelled, to stop waiting for the tiles in flight
+    cancelled: Future = Future()
+    unregister = cancel_token.on_cancel(lambda: cancelled.set_result(None)) if cancel_token is not None else None
+    pending: Dict[Future, Tuple[int, Dict]] = {}
+    completed: Dict[int, Tuple[Results, Dict]] = {}
+    next_index = 0  # Next tile to yield (in order)
+    n_yielded = 0
+    tiles = tiles_generator(param_results, tile_size_px, overlap_percent, delay_sec, randomize, viewport, visible_only)
+    exhausted = False
+
+    def _tagged(results: Results, tile_info: Dict) -> Results:
+        nonlocal n_yielded
+        if not ordered:
+            tile_params = dict(tile_info["tile_params"])
+            tile_params["tile_idx"] = n_yielded
+            tile_params.pop("first_tile", None)
+            if n_yielded == 0:
+                tile_params["first_tile"] = True
+            tile_info = {"tile_params": tile_params}
+        n_yielded += 1
+        for layer in results:
+            layer.meta = layer.meta | tile_info
+        return results
+
+    try:
+        submitted = 0
+        while True:
+            # Keep the pool busy
+            while (not exhausted) and (len(pending) + len(completed) < 2 * n_workers):
+                try:
+                    tile_results, tile_info = next(tiles)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if use_processes:
+                    future = executor.submit(_run_tile_in_process, algorithm, tile_results)
+                else:
+                    future = executor.submit(runner._run, algorithm, tile_results)
+                pending[future] = (submitted, tile_info)
+                submitted += 1
+
+            if not pending and not completed:
+                return
+
+            if pending:
+                done, _ = wait(list(pending) + [cancelled], return_when=FIRST_COMPLETED)
+                if cancelled.done():
+                    return
+                for future in done:
+                    index, tile_info = pending.pop(future)
+                    completed[index] = (future.result(), tile_info)
+
+            if ordered:
+                while (next_index in completed) and not cancelled.done():
+                    results, tile_info = completed.pop(next_index)
+                    next_index += 1
+                    if results is not None:
+                        yield _tagged(results, tile_info)
+            else:
+                for index in sorted(completed):
+                    if cancelled.done():
+                        break
+                    results, tile_info = completed.pop(index)
+                    if results is not None:
+                        yield _tagged(results, tile_info)
+
+            if cancelled.done():
+                return
+    finally:
+        if unregister is not None:
+            unregister()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,55 +1,111 @@
-from typing import Callable, Dict, Type
-import numpy as np
+import hashlib
+import json
+from typing import Callable, Dict, Hashable, Mapping, Optional, Tuple, Type
 
-import napari.layers
+import napari
+from qtpy.QtCore import QTimer
 from qtpy.QtWidgets import (QCheckBox, QComboBox, QDoubleSpinBox, QGridLayout,
-                            QGroupBox, QLabel, QLineEdit, QSpinBox)
+                            QGroupBox, QLabel, QLineEdit, QSizePolicy, QSpinBox,
+                            QStackedLayout, QWidget)
 
 from imaging_server_kit.core.results import Results
 from napari_serverkit.widgets.napari_results import NapariResults
 
-NAPARI_LAYER_MAPPINGS: Dict[str, Type[napari.layers.Layer]] = {
-    "image": napari.layers.Image,
-    "mask": napari.layers.Labels,
-    "instance_mask": napari.layers.Labels,
-    "points": napari.layers.Points,
-    "boxes": napari.layers.Shapes,
-    "paths": napari.layers.Shapes,
-    "vectors": napari.layers.Vectors,
-    "tracks": napari.layers.Tracks,
-}
+
+class _NapariLayerMappings(Mapping):
+    """Maps layer kinds to napari layer types. `napari.layers` is only imported when a type is first looked up."""
+
+    _layer_type_names = {
+        "image": "Image",
+        "mask": "Labels",
+        "instance_mask": "Labels",
+        "points": "Points",
+        "boxes": "Shapes",
+        "paths": "Shapes",
+        "vectors": "Vectors",
+        "tracks": "Tracks",
+    }
+
+    def __getitem__(self, kind: str) -> Type["napari.layers.Layer"]:
+        return getattr(napari.layers, self._layer_type_names[kind])
+
+    def __iter__(self):
+        return iter(self._layer_type_names)
+
+    def __len__(self):
+        return len(self._layer_type_names)
+
+
+NAPARI_LAYER_MAPPINGS: Mapping[str, Type["napari.layers.Layer"]] = _NapariLayerMappings()
 
 
 class ParameterPanel:
-    def __init__(self, trigger: Callable, napari_results: NapariResults):
+    def __init__(self, trigger: Callable, napari_results: NapariResults, auto_call_delay_ms: int = 300):
         self._trigger_func = trigger
         self.napari_results = napari_results
 
+        # auto_call parameter changes are debounced: the trigger fires once the values have settled
+        self.auto_call_delay_ms = auto_call_delay_ms
+        self._auto_call_timer = QTimer()
+        self._auto_call_timer.setSingleShot(True)
+        self._auto_call_timer.timeout.connect(self._trigger_func)
+
         self.ui_state = {}
         self.layer_comboboxes = {}
 
         self.widget = QGroupBox()
         self.widget.setTitle("Parameters")
 
-        self.layout = QGridLayout()
-        self.widget.setLayout(self.layout)
+        # Built panels are kept (with their parameter values) and swapped in a stacked layout
+        self.stack = QStackedLayout()
+        self.widget.setLayout(self.stack)
+        self._panels: Dict[Tuple[Optional[Hashable], str], Tuple[QWidget, Dict, Dict]] = {}
 
-        self.napari_results.connect_layer_added_event(self._on_layer_change)
-        self.napari_results.connect_layer_removed_event(self._on_layer_change)
-        self.napari_results.connect_layer_renamed_event(self._on_layer_change)
-        self._on_layer_change(None)
+        # Layer comboboxes are updated incrementally; they reference layers by name
+        self._layer_names: Dict[int, str] = {
+            id(layer): layer.name for layer in self.napari_results.viewer.layers
+        }
+        self.napari_results.connect_layer_added_event(self._on_layer_added)
+        self.napari_results.connect_layer_removed_event(self._on_layer_removed)
+        self.napari_results.connect_layer_renamed_event(self._on_layer_renamed)
 
-    def update(self, schema: Dict):
-        # Clean-up the previous dynamic UI layout
-        for i in reversed(range(self.layout.count())):
-            ui_item = self.layout.itemAt(i)
-            if ui_item is not None:
-                ui_item_widget = ui_item.widget()
-                if ui_item_widget is not None:
-                    ui_item_widget.setParent(None)
+    def update(self, schema: Dict, panel_key: Optional[Hashable] = None):
+        """Show the panel of a parameters schema. Panels are built once per (panel_key, schema) and reused afterwards.
 
-        # Generate the new dynamic UI state and layout (TODO: this has grown to be quite complex; we should probably rework self.ui_state and the design here)
-        self.ui_state = {}
+        The panel_key identifies the algorithm, e.g. (server, algorithm name).
+        """
+        schema_hash = hashlib.md5(json.dumps(schema, sort_keys=True, default=str).encode()).hexdigest()
+        key = (panel_key, schema_hash)
+        if key not in self._panels:
+            # Drop the panel built for an outdated schema of the same algorithm
+            for outdated_key in [k for k in self._panels if k[0] == panel_key]:
+                self._remove_panel(outdated_key)
+            self._panels[key] = self._build_panel(schema)
+            self.stack.addWidget(self._panels[key][0])
+            self._fill_layer_comboboxes(self._panels[key][2])
+
+        page, self.ui_state, self.layer_comboboxes = self._panels[key]
+        for other_page, _, _ in self._panels.values():
+            # Hidden pages should not contribute to the size of the stacked layout
+            policy = QSizePolicy.Preferred if other_page is page else QSizePolicy.Ignored
+            other_page.setSizePolicy(policy, policy)
+        self.stack.setCurrentWidget(page)
+
+    def _remove_panel(self, key: Tuple[Optional[Hashable], str]):
+        page, _, _ = self._panels.pop(key)
+        self.stack.removeWidget(page)
+        page.deleteLater()
+
+    def _build_panel(self, schema: Dict) -> Tuple[QWidget, Dict, Dict]:
+        """Build the parameters page of an algorithm schema. Returns the page, its UI state and its layer comboboxes."""
+        page = QWidget()
+        layout = QGridLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        page.setLayout(layout)
+
+        # Generate the dynamic UI state and layout (TODO: this has grown to be quite complex; we should probably rework ui_state and the design here)
+        ui_state = {}
+        layer_comboboxes = {}
         for k, (param_name, param_values) in enumerate(schema["properties"].items()):
             # Add the right UI element based on the retreived parameter type.
             param_type = param_values.get("param_type")
@@ -63,7 +119,7 @@ class ParameterPanel:
                     qt_widget.addItems(param_values.get("enum"))
                 qt_widget.setCurrentText(param_values.get("default"))
                 if param_values.get("auto_call"):
-                    qt_widget.currentTextChanged.connect(self._trigger_func)
+                    qt_widget.currentTextChanged.connect(self._auto_call_requested)
                 qt_widget_setter_func = qt_widget.setCurrentText
                 widget_value_recover_func = lambda qt_widget: qt_widget.currentText()
             elif param_type == "int":
@@ -74,7 +130,7 @@ class ParameterPanel:
                 if param_values.get("step"):
                     qt_widget.setSingleStep(param_values.get("step"))
                 if param_values.get("auto_call"):
-                    qt_widget.valueChanged.connect(self._trigger_func)
+                    qt_widget.valueChanged.connect(self._auto_call_requested)
                 qt_widget_setter_func = qt_widget.setValue
                 widget_value_recover_func = lambda qt_widget: int(qt_widget.value())
             elif param_type == "float":
@@ -85,14 +141,14 @@ class ParameterPanel:
                 if param_values.get("step"):
                     qt_widget.setSingleStep(param_values.get("step"))
                 if param_values.get("auto_call"):
-                    qt_widget.valueChanged.connect(self._trigger_func)
+                    qt_widget.valueChanged.connect(self._auto_call_requested)
                 qt_widget_setter_func = qt_widget.setValue
                 widget_value_recover_func = lambda qt_widget: float(qt_widget.value())
             elif param_type == "bool":
                 qt_widget = QCheckBox()
                 qt_widget.setChecked(param_values.get("default"))
                 if param_values.get("auto_call"):
-                    qt_widget.stateChanged.connect(self._trigger_func)
+                    qt_widget.stateChanged.connect(self._auto_call_requested)
                 qt_widget_setter_func = qt_widget.setChecked
                 widget_value_recover_func = lambda qt_widget: qt_widget.isChecked()
             elif param_type == "str":
@@ -115,31 +171,74 @@ class ParameterPanel:
                 # Numpy layers
                 if param_type not in NAPARI_LAYER_MAPPINGS:
                     qt_widget = None
-                    self.layer_comboboxes[param_type] = []
                 else:
                     qt_widget = QComboBox()
-                    if param_type not in self.layer_comboboxes:
-                        self.layer_comboboxes[param_type] = []
-                    self.layer_comboboxes[param_type].append(qt_widget)
+                    # Pipeline steps can be wired to the outputs of the previous steps, which are not in the viewer yet
+                    qt_widget.setEditable(True)
+                    qt_widget.setInsertPolicy(QComboBox.NoInsert) # type: ignore
+                    qt_widget.setToolTip("A layer of the viewer, or the name of an output of a previous pipeline step.")
+                    if param_type not in layer_comboboxes:
+                        layer_comboboxes[param_type] = []
+                    layer_comboboxes[param_type].append(qt_widget)
                 qt_widget_setter_func = None
                 widget_value_recover_func = lambda qt_widget: None
 
             if qt_widget is not None:
-                self.layout.addWidget(QLabel(param_values.get("title")), k, 0)
-                self.layout.addWidget(qt_widget, k, 1)
+                layout.addWidget(QLabel(param_values.get("title")), k, 0)
+                layout.addWidget(qt_widget, k, 1)
 
-            self.ui_state[param_name] = (param_type, qt_widget, qt_widget_setter_func, widget_value_recover_func)
+            ui_state[param_name] = (param_type, qt_widget, qt_widget_setter_func, widget_value_recover_func)
 
-        self._on_layer_change(None)  # Refresh dropdowns in new UI
+        return page, ui_state, layer_comboboxes
 
-    def _on_layer_change(self, *args, **kwargs):
-        for kind, cb_list in self.layer_comboboxes.items():
-            layer_type: Type[napari.layers.Layer] = NAPARI_LAYER_MAPPINGS[kind]
+    def _auto_call_requested(self, *args, **kwargs):
+        self.request_auto_call()
+
+    def request_auto_call(self):
+        """Fire the trigger once the requests have settled (no new request for `auto_call_delay_ms`)."""
+        self._auto_call_timer.start(self.auto_call_delay_ms)
+
+    def _iter_layer_comboboxes(self, layer):
+        """Comboboxes of all the panels that accept a given napari layer."""
+        for _, _, layer_comboboxes in self._panels.values():
+            for kind, cb_list in layer_comboboxes.items():
+                if isinstance(layer, NAPARI_LAYER_MAPPINGS[kind]):
+                    yield from cb_list
+
+    def _fill_layer_comboboxes(self, layer_comboboxes: Dict):
+        for kind, cb_list in layer_comboboxes.items():
+            layer_type: Type["napari.layers.Layer"] = NAPARI_LAYER_MAPPINGS[kind]
+            layer_names = [
+                layer.name for layer in self.napari_results.viewer.layers if isinstance(layer, layer_type)
+            ]
             for cb in cb_list:
                 cb.clear()
-                for layer in self.napari_results.viewer.layers:
-                    if isinstance(layer, layer_type):
-                        cb.addItem(layer.name, layer.data)
+                cb.addItems(layer_names)
+
+    def _on_layer_added(self, e):
+        layer = e.value
+        self._layer_names[id(layer)] = layer.name
+        for cb in self._iter_layer_comboboxes(layer):
+            cb.addItem(layer.name)
+
+    def _on_layer_removed(self, e):
+        layer = e.value
+        layer_name = self._layer_names.pop(id(layer), layer.name)
+        for cb in self._iter_layer_comboboxes(layer):
+            idx = cb.findText(layer_name)
+            if idx >= 0:
+                cb.removeItem(idx)
+
+    def _on_layer_renamed(self, e):
+        layer = e.source
+        old_name = self._layer_names.get(id(layer))
+        self._layer_names[id(layer)] = layer.name
+        if old_name is None:
+            return
+        for cb in self._iter_layer_comboboxes(layer):
+            idx = cb.findText(old_name)
+            if idx >= 0:
+                cb.setItemText(idx, layer.name)
 
     def get_algo_params(self) -> Results:
         """Create a dictionary representation of parameter values based on the UI state."""
@@ -148,30 +247,16 @@ class ParameterPanel:
             if kind in NAPARI_LAYER_MAPPINGS:
                 if qt_widget.currentText():
                     layer_name = qt_widget.currentText()
-                    layer = self.napari_results.viewer.layers[layer_name]
-                    data = layer.data if layer else None
                     # For Images and Masks, the results_layer.data is the napari layer's data (remains true when a mask is annotated)
-                    # However, this is not the case for shapes (points, vectors, rectangles...).
-                    # In this case, we need to manually sync results_layer.data with the current napari layer data here.
-                    # This is not great (probably prone to bugs) - TODO: find a better way of handling this?
-                    results_layer = self.napari_results.read(layer_name)
+                    # However, this is not the case for shapes (points, vectors, rectangles...), so layers edited in the viewer
+                    # are synced (and Shapes converted into boxes) when they are read.
+                    results_layer = self.napari_results.read_synced(layer_name)
                     if results_layer is not None:
-                        if results_layer.data is not data:
-                            # Moreover, we need to handle boxes as a special case; Shapes.data are interpreted as boxes, 
-                            # however the napari layer data is a list of arrays, so we need to cast it into a numpy array of shape (N, 4, D).
-                            if results_layer.kind == "boxes":
-                                if isinstance(data, list):
-                                    if len(data) == 0:
-                                        # If the layer data is an empty list, we should convert it to None instead.
-                                        data = None
-                                    else:
-                                        # We assume the Shapes layer contains rectangles that can be casted to a single "boxes" array.
-                                        try:
-                                            data = np.asarray(data)
-                                        except:
-                                            print("Could not interpret the content of this Shapes layer as boxes (ignoring it instead): ", layer)
-                                            data = None
-                            self.napari_results.update(layer_name, data, results_layer.meta)
+                        data = results_layer.data
+                    elif layer_name in self.napari_results.viewer.layers:
+                        data = self.napari_results.viewer.layers[layer_name].data
+                    else:
+                        data = None  # Not in the viewer (yet)
                 else:
                     data = None
             else:
@@ -179,6 +264,16 @@ class ParameterPanel:
             algo_params.create(kind=kind, data=data, name=name)
         return algo_params
 
+    def get_param_values(self) -> Tuple[Dict, Dict[str, Optional[str]]]:
+        """Values of the parameters set in the UI, and names of the layers selected for the layer parameters."""
+        values, inputs = {}, {}
+        for name, (kind, qt_widget, qt_widget_setter_func, widget_value_recover_func) in self.ui_state.items():
+            if kind in NAPARI_LAYER_MAPPINGS:
+                inputs[name] = qt_widget.currentText() or None
+            else:
+                values[name] = widget_value_recover_func(qt_widget)
+        return values, inputs
+
     def manage_cbs_events(self, worker):
         """Whenever a worker returns, we update the napari layer comboboxes to their current index (instead of resetting it)"""
         for kind, cb_list in self.layer_comboboxes.items():
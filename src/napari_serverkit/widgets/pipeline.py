@@ -0,0 +1,99 @@
+"""
+Pipelines: algorithms run one after the other as a single job, passing their outputs to the next steps by layer name.
+
+Intermediate outputs are kept in the worker and never merged into the viewer, unless their step is materialized.
+Steps can be wired to the outputs of the previous steps by name, before these outputs exist.
+
+With an algorithm server, the intermediate outputs still go through the worker: each step downloads its outputs,
+and the steps that use them upload them again (the server does not keep results between requests).
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+from imaging_server_kit.core.results import DataLayer, Results
+
+from napari_serverkit.widgets.run_trace import RunTrace
+
+
+class PipelineStep:
+    """An algorithm with its parameter values, and the names of the layers wired to its layer parameters."""
+
+    def __init__(
+        self,
+        algorithm: str,
+        param_defs: Dict[str, Dict],
+        values: Dict[str, Any],
+        inputs: Dict[str, Optional[str]],
+        materialize: bool = True,
+    ):
+        self.algorithm = algorithm
+        self.param_defs = param_defs  # Parameters schema properties
+        self.values = values  # Parameter name => value
+        self.inputs = inputs  # Layer parameter name => layer name (output of a previous step, or viewer layer)
+        self.materialize = materialize  # Whether the outputs are merged into the viewer
+
+    def __repr__(self):
+        wiring = ", ".join(f"{name}={layer_name}" for name, layer_name in self.inputs.items() if layer_name)
+        return f"PipelineStep({self.algorithm}, {wiring})"
+
+    def param_results(self, layers: Dict[str, DataLayer], viewer_inputs: Dict[str, Any]) -> Results:
+        param_results = Results()
+        for name, param_def in self.param_defs.items():
+            kind = param_def.get("param_type")
+            if name in self.inputs:
+                layer_name = self.inputs[name]
+                if layer_name in layers:
+                    data = layers[layer_name].data
+                elif layer_name in viewer_inputs:
+                    data = viewer_inputs[layer_name]
+                elif layer_name:
+                    raise ValueError(
+                        f"{self.algorithm}: no layer named {layer_name!r} in the viewer or in the outputs of the previous steps."
+                    )
+                else:
+                    data = None
+            else:
+                data = self.values.get(name, param_def.get("default"))
+            layer = param_results.create(kind=kind, data=data, name=name)
+            if kind == "image":
+                layer.rgb = param_def.get("rgb")  # type: ignore
+        return param_results
+
+
+def viewer_input_names(steps: List[PipelineStep]) -> List[str]:
+    """Names of the layers that the pipeline reads from the viewer (those not produced by a previous step).
+
+    Output names are only known once a step has run, so any wired layer that exists in the viewer is read from it.
+    """
+    names = []
+    for step in steps:
+        for layer_name in step.inputs.values():
+            if layer_name and (layer_name not in names):
+                names.append(layer_name)
+    return names
+
+
+def run_pipeline(
+    steps: List[PipelineStep],
+    run_step: Callable[[str, Results], Optional[Results]],
+    viewer_inputs: Dict[str, Any],
+    trace: Optional[RunTrace] = None,
+):
+    """Run the steps in order with `run_step(algorithm, param_results)`, yielding after each step
+    the outputs of the step if it is materialized (`None` otherwise).
+
+    Outputs are passed to the next steps by name; an output shadows the viewer layer (or previous output) of the same name.
+    """
+    layers: Dict[str, DataLayer] = {}
+    for idx, step in enumerate(steps):
+        param_results = step.param_results(layers, viewer_inputs)
+        if trace is not None:
+            with trace.span(f"step {idx + 1}"):
+                results = run_step(step.algorithm, param_results)
+        else:
+            results = run_step(step.algorithm, param_results)
+        if results is None:
+            return
+        for layer in results:
+            layers[layer.name] = layer
+        yield results if step.materialize else None
@@ -0,0 +1,155 @@
+"""
+Client-side LRU cache of algorithm results, with spill-over to disk.
+"""
+
+import copy
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+from imaging_server_kit.core.results import LayerStackBase, Results
+
+
+def _hash_array(h: "hashlib.blake2b", data: np.ndarray):
+    if data.flags.c_contiguous or data.ndim <= 1:
+        h.update(np.ascontiguousarray(data).data)
+    else:
+        # Hashed plane by plane, rather than copying the whole (eg. transposed) array
+        for plane in data:
+            _hash_array(h, plane)
+
+
+def fingerprint(data: Any) -> Hashable:
+    """A content fingerprint of layer data.
+
+    The whole buffer of arrays is hashed, so that any edit (eg. a few painted pixels) gives a new fingerprint.
+    """
+    if isinstance(data, np.ndarray):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{data.shape}{data.dtype}".encode())
+        _hash_array(h, data)
+        return h.hexdigest()
+    if isinstance(data, (list, tuple)):
+        return tuple(fingerprint(d) for d in data)
+    if isinstance(data, dict):
+        return tuple((k, fingerprint(v)) for k, v in sorted(data.items()))
+    return repr(data)
+
+
+def _results_nbytes(results: LayerStackBase) -> int:
+    return sum(getattr(layer.data, "nbytes", 0) for layer in results)
+
+
+class ResultsCache:
+    """LRU cache mapping (server, algorithm, parameters) keys to results.
+
+    Entries evicted from memory (beyond `max_memory_bytes`) are written to a scratch directory,
+    which holds at most `max_disk_bytes` of entries. Set `max_disk_bytes=0` to disable spill-over.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 512 * 1024**2,
+        max_disk_bytes: int = 4 * 1024**3,
+        cache_dir: Optional[str] = None,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._cache_dir = cache_dir
+        self._memory: "OrderedDict[Hashable, Tuple[Results, int]]" = OrderedDict()
+        self._disk: "OrderedDict[Hashable, Tuple[str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._memory) + len(self._disk)
+
+    def __contains__(self, key: Hashable):
+        return (key in self._memory) or (key in self._disk)
+
+    @property
+    def cache_dir(self) -> str:
+        if self._cache_dir is None:
+            self._cache_dir = tempfile.mkdtemp(prefix="napari-serverkit-cache-")
+        os.makedirs(self._cache_dir, exist_ok=True)
+        return self._cache_dir
+
+    @staticmethod
+    def make_key(server: Optional[str], algorithm: str, algo_params: LayerStackBase) -> Hashable:
+        return (
+            server,
+            algorithm,
+            tuple((layer.name, layer.kind, fingerprint(layer.data)) for layer in algo_params),
+        )
+
+    def get(self, key: Hashable) -> Optional[Results]:
+        """Returns a copy of the cached results, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                results, _ = self._memory[key]
+            elif key in self._disk:
+                path, nbytes = self._disk.pop(key)
+                self._disk_bytes -= nbytes
+                with open(path, "rb") as f:
+                    results = pickle.load(f)
+                os.remove(path)
+                self._put(key, results, nbytes)
+            else:
+                return
+            return copy.deepcopy(results)
+
+    def put(self, key: Hashable, results: LayerStackBase):
+        """Stores a copy of the results (the viewer may later modify the original data in place)."""
+        with self._lock:
+            self._put(key, copy.deepcopy(results), _results_nbytes(results))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._disk.clear()
+            self._memory_bytes = 0
+            self._disk_bytes = 0
+            if self._cache_dir is not None:
+                shutil.rmtree(self._cache_dir, ignore_errors=True)
+
+    def _put(self, key: Hashable, results: Results, nbytes: int):
+        self._discard(key)
+        self._memory[key] = (results, nbytes)
+        self._memory_bytes += nbytes
+        while (self._memory_bytes > self.max_memory_bytes) and len(self._memory) > 1:
+            evicted_key, (evicted_results, evicted_nbytes) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_nbytes
+            self._spill(evicted_key, evicted_results, evicted_nbytes)
+
+    def _spill(self, key: Hashable, results: Results, nbytes: int):
+        if nbytes > self.max_disk_bytes:
+            return
+        path = os.path.join(self.cache_dir, f"{hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()}.pkl")
+        with open(path, "wb") as f:
+            pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._disk[key] = (path, nbytes)
+        self._disk_bytes += nbytes
+        while self._disk_bytes > self.max_disk_bytes:
+            _, (evicted_path, evicted_nbytes) = self._disk.popitem(last=False)
+            self._disk_bytes -= evicted_nbytes
+            if os.path.exists(evicted_path):
+                os.remove(evicted_path)
+
+    def _discard(self, key: Hashable):
+        if key in self._memory:
+            _, nbytes = self._memory.pop(key)
+            self._memory_bytes -= nbytes
+        if key in self._disk:
+            path, nbytes = self._disk.pop(key)
+            self._disk_bytes -= nbytes
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,61 @@
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+from qtpy.QtCore import QTimer
+
+from imaging_server_kit.core.results import DataLayer, LayerStackBase, Results
+
+
+class ResultsCoalescer:
+    """Buffers the layer stacks yielded by a worker and merges them at a bounded rate.
+
+    Only the latest state of each (non-tiled) layer is kept between two merges. Tiles are
+    deltas of the output, so they are all kept and merged together on the next flush.
+    """
+
+    def __init__(self, merge_func: Callable, max_rate_hz: float = 30.0):
+        self.merge_func = merge_func
+        self.max_rate_hz = max_rate_hz
+        self._pending: Dict[Hashable, DataLayer] = {}
+        self._last_flush = 0.0
+
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+    @property
+    def n_pending(self) -> int:
+        return len(self._pending)
+
+    def push(self, layer_stack: Optional[LayerStackBase]):
+        if layer_stack is None:
+            return
+
+        for layer in layer_stack:
+            if layer.is_tiled:
+                key = (layer.name, layer.meta["tile_params"]["tile_idx"])
+            else:
+                key = layer.name
+            # Move the layer to the end, so that layers are merged in the order of their latest update
+            self._pending.pop(key, None)
+            self._pending[key] = layer
+
+        if self.max_rate_hz <= 0:
+            self.flush()
+        elif not self._timer.isActive():
+            elapsed_ms = (time.perf_counter() - self._last_flush) * 1000
+            self._timer.start(max(0, int(1000 / self.max_rate_hz - elapsed_ms)))
+
+    def flush(self):
+        self._timer.stop()
+        if not self._pending:
+            return
+        layer_stack = Results()
+        layer_stack.layers.extend(self._pending.values())
+        self._pending.clear()
+        self._last_flush = time.perf_counter()
+        self.merge_func(layer_stack)
+
+    def discard(self):
+        self._timer.stop()
+        self._pending.clear()
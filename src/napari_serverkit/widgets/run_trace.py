@@ -0,0 +1,168 @@
+"""
+Timing breakdown of algorithm runs (parameters collection, upload, compute, download, merge...).
+"""
+
+import datetime
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class Span:
+    """A timed phase of a run (`perf_counter` timestamps, in seconds)."""
+
+    def __init__(self, phase: str, start: float, end: float, thread_id: int):
+        self.phase = phase
+        self.start = start
+        self.end = end
+        self.thread_id = thread_id
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class RunTrace:
+    """Records the spans of a run. Spans can be recorded from any thread."""
+
+    def __init__(self, run_id: int, algorithm: str):
+        self.run_id = run_id
+        self.algorithm = algorithm
+        self.timestamp = datetime.datetime.now().isoformat(timespec="milliseconds")
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status: Optional[str] = None
+        self.spans: List[Span] = []
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.end is not None:
+            return self.end - self.start
+
+    def add_span(self, phase: str, start: float, end: float):
+        with self._lock:
+            self.spans.append(Span(phase, start, end, threading.get_ident()))
+
+    def add_transfer(self, bytes_sent: int, bytes_received: int):
+        """Payload sizes, as sent and received over the network."""
+        with self._lock:
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+
+    @contextmanager
+    def span(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(phase, start, time.perf_counter())
+
+    def wrap(self, func: Callable, phase: str) -> Callable:
+        """Record each call of a function, or each step of a generator function."""
+        if inspect.isgeneratorfunction(func):
+            def traced_generator(*args, **kwargs):
+                return (yield from self._traced_generator(func(*args, **kwargs), phase))
+            return traced_generator
+
+        def traced(*args, **kwargs):
+            with self.span(phase):
+                return func(*args, **kwargs)
+        return traced
+
+    def _traced_generator(self, generator, phase: str):
+        try:
+            while True:
+                with self.span(phase):
+                    try:
+                        value = next(generator)
+                    except StopIteration as e:
+                        return e.value
+                yield value
+        finally:
+            generator.close()
+
+    def finish(self, status: str):
+        self.end = time.perf_counter()
+        self.status = status
+
+    def summary(self) -> Dict[str, Tuple[float, int]]:
+        """Phase => (total duration, number of spans), in order of first occurrence."""
+        summary: Dict[str, Tuple[float, int]] = {}
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        for span in spans:
+            total, count = summary.get(span.phase, (0.0, 0))
+            summary[span.phase] = (total + span.duration, count + 1)
+        return summary
+
+    def to_records(self) -> List[Dict]:
+        """One record per span, with times relative to the start of the run."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return [
+            {
+                "run_id": self.run_id,
+                "algorithm": self.algorithm,
+                "timestamp": self.timestamp,
+                "status": self.status,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "phase": span.phase,
+                "start_sec": span.start - self.start,
+                "duration_sec": span.duration,
+            }
+            for span in spans
+        ]
+
+
+def to_jsonl(traces: Iterable[RunTrace]) -> str:
+    return "".join(json.dumps(record) + "\n" for trace in traces for record in trace.to_records())
+
+
+def to_chrome_trace(traces: Iterable[RunTrace]) -> str:
+    """Trace Event Format, readable by chrome://tracing or https://ui.perfetto.dev. Each run is shown as a process."""
+    traces = list(traces)
+    if not traces:
+        return json.dumps({"traceEvents": []})
+    origin = min(trace.start for trace in traces)
+    thread_ids: Dict[int, int] = {}
+    events = []
+    for trace in traces:
+        events.append(
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": trace.run_id,
+                "args": {"name": f"{trace.algorithm} #{trace.run_id} ({trace.status})"},
+            }
+        )
+        events.append(
+            {
+                "name": "transfer",
+                "ph": "C",
+                "pid": trace.run_id,
+                "ts": (trace.start - origin) * 1e6,
+                "args": {"bytes_sent": trace.bytes_sent, "bytes_received": trace.bytes_received},
+            }
+        )
+        with trace._lock:
+            spans = list(trace.spans)
+        for span in spans:
+            events.append(
+                {
+                    "name": span.phase,
+                    "cat": trace.algorithm,
+                    "ph": "X",
+                    "ts": (span.start - origin) * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": trace.run_id,
+                    "tid": thread_ids.setdefault(span.thread_id, len(thread_ids)),
+                }
+            )
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
@@ -1,3 +1,4 @@
+import os
 from functools import partial
 from typing import Callable, Dict, Optional
 
@@ -16,6 +17,20 @@ from qtpy.QtWidgets import (
     QWidget,
 )
 
+from napari_serverkit.widgets.cancellation import CancelToken
+from napari_serverkit.widgets.parallel_tiles import is_picklable, tile_in_parallel
+from napari_serverkit.widgets.run_trace import RunTrace
+from napari_serverkit.widgets.sample_cache import SAMPLE_CACHE, SampleCache
+from napari_serverkit.widgets.schema_cache import SCHEMA_CACHE, SchemaCache
+from napari_serverkit.widgets.tile_order import (
+    RANDOM,
+    TILE_ORDERS,
+    VIEWPORT_FIRST,
+    VISIBLE_ONLY,
+    Viewport,
+    tile_by_viewport,
+)
+
 
 def require_algorithm(func):
     def wrapper(self, *args, **kwargs):
@@ -30,6 +45,8 @@ def require_algorithm(func):
 class RunnerWidget:
     def __init__(self, algorithm: Optional[Algorithm]):
         self.algorithm = algorithm
+        self.schema_cache: SchemaCache = SCHEMA_CACHE
+        self.sample_cache: SampleCache = SAMPLE_CACHE
 
         # Layout and widget
         self._widget = QWidget()
@@ -97,40 +114,110 @@ class RunnerWidget:
         self.qds_delay.setEnabled(False)
         experimental_layout.addWidget(self.qds_delay, 3, 1)
 
-        experimental_layout.addWidget(QLabel("Randomize"), 4, 0)
-        self.cb_randomize = QCheckBox()
-        self.cb_randomize.setChecked(True)
-        self.cb_randomize.setEnabled(False)
-        experimental_layout.addWidget(self.cb_randomize, 4, 1)
+        # Tiles in the viewport (kept up to date by the widget that owns the viewer) can be processed first
+        experimental_layout.addWidget(QLabel("Tile order"), 4, 0)
+        self.cb_tile_priority = QComboBox()
+        self.cb_tile_priority.addItems(TILE_ORDERS)
+        self.cb_tile_priority.setCurrentText(RANDOM)
+        self.cb_tile_priority.setToolTip(
+            "viewport first: tiles in view first, nearest its center first (re-prioritized when panning or zooming).\n"
+            "visible only: tiles in view when the run starts."
+        )
+        self.cb_tile_priority.setEnabled(False)
+        experimental_layout.addWidget(self.cb_tile_priority, 4, 1)
+        self.viewport = Viewport()
+
+        # Large outputs are written into memory-mapped files instead of RAM
+        experimental_layout.addWidget(QLabel("Output to disk"), 5, 0)
+        self.cb_tiles_to_disk = QCheckBox()
+        self.cb_tiles_to_disk.setChecked(False)
+        self.cb_tiles_to_disk.setEnabled(False)
+        experimental_layout.addWidget(self.cb_tiles_to_disk, 5, 1)
+
+        # Parallel tiles (in-process algorithms only)
+        self.parallel_tiles_ui = []
+        label = QLabel("Workers")
+        experimental_layout.addWidget(label, 6, 0)
+        self.qds_tile_workers = QSpinBox()
+        self.qds_tile_workers.setMinimum(1)
+        self.qds_tile_workers.setMaximum(max(64, os.cpu_count() or 1))
+        self.qds_tile_workers.setValue(1)
+        self.qds_tile_workers.setEnabled(False)
+        experimental_layout.addWidget(self.qds_tile_workers, 6, 1)
+        self.parallel_tiles_ui.extend([label, self.qds_tile_workers])
+
+        label = QLabel("Workers pool")
+        experimental_layout.addWidget(label, 7, 0)
+        self.cb_tile_pool = QComboBox()
+        self.cb_tile_pool.addItems(["threads", "processes"])
+        self.cb_tile_pool.setEnabled(False)
+        experimental_layout.addWidget(self.cb_tile_pool, 7, 1)
+        self.parallel_tiles_ui.extend([label, self.cb_tile_pool])
+
+        label = QLabel("Merge tiles")
+        experimental_layout.addWidget(label, 8, 0)
+        self.cb_tile_order = QComboBox()
+        self.cb_tile_order.addItems(["as completed", "in order"])
+        self.cb_tile_order.setEnabled(False)
+        experimental_layout.addWidget(self.cb_tile_order, 8, 1)
+        self.parallel_tiles_ui.extend([label, self.cb_tile_order])
 
     @property
     def widget(self) -> QWidget:
         return self._widget
 
+    @property
+    def server_id(self) -> Optional[str]:
+        """Identifies the server in caches (None for in-process algorithms)."""
+        return None
+
+    @property
+    def loads_remotely(self) -> bool:
+        """Whether loading algorithm info involves network round trips."""
+        return self.server_id is not None
+
     @property
     def update_params_trigger(self) -> Callable:
         return self.cb_algorithms.currentTextChanged # type: ignore
 
+    @property
+    def server_digest(self) -> Optional[str]:
+        """Identifies the state of the server (its version, algorithms...) in caches."""
+        return None
+
     @require_algorithm
-    def _download_sample(self, *args, **kwargs) -> Results:
-        try:
-            sample = self.algorithm.get_sample( # type: ignore
-                self.cb_algorithms.currentText(), *args, **kwargs
-            )
-            if sample is not None:
-                return sample
-        except:
-            show_warning("Failed to download sample.")
-        return Results()
+    def _download_sample(self, idx: int, algorithm: Optional[str] = None) -> Results:
+        """Get a sample (blocking). Samples of algorithm servers are cached on disk."""
+        if algorithm is None:
+            algorithm = self.cb_algorithms.currentText()
+        download = partial(self.algorithm.get_sample, algorithm, idx=idx) # type: ignore
+        if (self.server_id is None) or not self.sample_cache.enabled:
+            sample = download()
+        else:
+            key = self.sample_cache.make_key(self.server_id, algorithm, idx, self.server_digest or "")
+            sample = self.sample_cache.fetch(key, download)
+        return sample if sample is not None else Results()
+
+    def prefetch_samples(self, algorithm: str, n_samples: int, cancel_token: CancelToken):
+        """Download the samples of an algorithm server into the sample cache (blocking), until cancelled."""
+        if (self.server_id is None) or not self.sample_cache.enabled:
+            return
+        for idx in range(n_samples):
+            if cancel_token.cancelled:
+                return
+            key = self.sample_cache.make_key(self.server_id, algorithm, idx, self.server_digest or "")
+            if key not in self.sample_cache:
+                self.sample_cache.fetch(key, partial(self.algorithm.get_sample, algorithm, idx=idx)) # type: ignore
 
     @require_algorithm
     def _get_run_func(self, algo_params: Results) -> Optional[Callable]:
         algorithm: str = self.cb_algorithms.currentText()
         tiled = self.cb_run_in_tiles.isChecked()
-        is_stream = self.algorithm._is_stream(algorithm) # type: ignore
+        algorithm_info = self.load_algorithm_info(algorithm)
+        is_stream = algorithm_info["is_stream"]
 
         # Handle the RGB case (suboptimal)
-        algo_param_defs: Dict = self.algorithm.get_parameters(algorithm)["properties"] # type: ignore
+        algo_param_defs: Dict = algorithm_info["parameters"]["properties"]
         for param_name, param_value in algo_param_defs.items():
             layer: Optional[DataLayer] = algo_params.read(param_name)
             if layer is not None:
@@ -141,13 +228,44 @@ class RunnerWidget:
             if is_stream:
                 show_warning("Cannot run streamed algorithm in tiling mode!")
                 return
+            if (self.server_id is None) and (self.qds_tile_workers.value() > 1):
+                use_processes = self.cb_tile_pool.currentText() == "processes"
+                if use_processes and not is_picklable(self.algorithm):
+                    show_warning("This algorithm cannot be sent to other processes; running the tiles in threads instead.")
+                    use_processes = False
+                return partial(
+                    tile_in_parallel,
+                    self.algorithm,
+                    algorithm=algorithm,
+                    tile_size_px=self.qds_tile_size.value(),
+                    overlap_percent=self.qds_overlap.value(),
+                    delay_sec=self.qds_delay.value(),
+                    randomize=self.tile_order == RANDOM,
+                    param_results=algo_params,
+                    n_workers=self.qds_tile_workers.value(),
+                    use_processes=use_processes,
+                    ordered=self.cb_tile_order.currentText() == "in order",
+                    **self._viewport_kwargs(),
+                )
+            if self.tile_order in [VIEWPORT_FIRST, VISIBLE_ONLY]:
+                return partial(
+                    tile_by_viewport,
+                    self.algorithm,
+                    algorithm=algorithm,
+                    tile_size_px=self.qds_tile_size.value(),
+                    overlap_percent=self.qds_overlap.value(),
+                    delay_sec=self.qds_delay.value(),
+                    randomize=False,
+                    param_results=algo_params,
+                    **self._viewport_kwargs(),
+                )
             return partial(
                 self.algorithm._tile, # type: ignore
                 algorithm=algorithm,
                 tile_size_px=self.qds_tile_size.value(),
                 overlap_percent=self.qds_overlap.value(),
                 delay_sec=self.qds_delay.value(),
-                randomize=self.cb_randomize.isChecked(),
+                randomize=self.tile_order == RANDOM,
                 param_results=algo_params,
             )
         else:
@@ -164,6 +282,28 @@ class RunnerWidget:
                     param_results=algo_params,
                 )
 
+    @property
+    def tile_order(self) -> str:
+        return self.cb_tile_priority.currentText()
+
+    def _viewport_kwargs(self) -> Dict:
+        if self.tile_order in [VIEWPORT_FIRST, VISIBLE_ONLY]:
+            return {"viewport": self.viewport, "visible_only": self.tile_order == VISIBLE_ONLY}
+        return {}
+
+    def trace_task(self, task: Callable, trace: RunTrace, cancel_token: Optional[CancelToken] = None) -> Callable:
+        """Record the timing of a run function returned by `_get_run_func()`.
+
+        Parallel tiled runs stop scheduling tiles once `cancel_token` is cancelled.
+        """
+        if (cancel_token is not None) and isinstance(task, partial) and (task.func is tile_in_parallel):
+            task = partial(task, cancel_token=cancel_token)
+        return trace.wrap(task, "compute")
+
+    def step_func(self, trace: RunTrace, cancel_token: Optional[CancelToken] = None) -> Callable:
+        """Run function of pipeline steps: `func(algorithm, param_results)`, in a worker thread."""
+        return trace.wrap(self.algorithm._run, "compute") # type: ignore
+
     @require_algorithm
     def _open_info_link_from_btn(self, *args, **kwargs):
         self.algorithm.info(algorithm=self.cb_algorithms.currentText()) # type: ignore
@@ -172,9 +312,29 @@ class RunnerWidget:
     def get_algorithm_parameters(self):
         return self.algorithm.get_parameters(self.cb_algorithms.currentText()) # type: ignore
 
+    def get_cached_algorithm_info(self, algorithm: str) -> Optional[Dict]:
+        if self.server_id is None:
+            return
+        return self.schema_cache.get(self.server_id, algorithm)
+
+    def load_algorithm_info(self, algorithm: str) -> Dict:
+        """Get the parameters schema, number of samples and tileability of an algorithm (blocking)."""
+        algorithm_info = self.get_cached_algorithm_info(algorithm)
+        if algorithm_info is None:
+            algorithm_info = {
+                "parameters": self.algorithm.get_parameters(algorithm), # type: ignore
+                "n_samples": self.algorithm.get_n_samples(algorithm), # type: ignore
+                "tileable": self.algorithm.is_tileable(algorithm), # type: ignore
+                "is_stream": self.algorithm._is_stream(algorithm), # type: ignore
+            }
+            if self.server_id is not None:
+                self.schema_cache.put(self.server_id, algorithm, algorithm_info)
+        return algorithm_info
+
     @require_algorithm
-    def update_n_samples(self):
-        n_samples_available = self.algorithm.get_n_samples(self.cb_algorithms.currentText()) # type: ignore
+    def update_n_samples(self, n_samples_available: Optional[int] = None):
+        if n_samples_available is None:
+            n_samples_available = self.algorithm.get_n_samples(self.cb_algorithms.currentText()) # type: ignore
         
         self.samples_select.clear()
         if n_samples_available == 0:
@@ -189,8 +349,9 @@ class RunnerWidget:
             self.samples_select_label.setText(f"Samples ({n_samples_available})")
 
     @require_algorithm
-    def update_tiled_ui(self):
-        algo_is_tileable = self.algorithm.is_tileable(self.cb_algorithms.currentText())
+    def update_tiled_ui(self, algo_is_tileable: Optional[bool] = None):
+        if algo_is_tileable is None:
+            algo_is_tileable = self.algorithm.is_tileable(self.cb_algorithms.currentText()) # type: ignore
         self.experimental_gb.setVisible(algo_is_tileable)
     
     def _run_in_tiles_changed(self, run_in_tiles: bool):
@@ -198,6 +359,10 @@ class RunnerWidget:
             self.qds_tile_size,
             self.qds_overlap,
             self.qds_delay,
-            self.cb_randomize,
+            self.cb_tile_priority,
+            self.cb_tiles_to_disk,
+            self.qds_tile_workers,
+            self.cb_tile_pool,
+            self.cb_tile_order,
         ]:
             ui_element.setEnabled(run_in_tiles)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+On-disk cache of the samples downloaded from algorithm servers.
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import platformdirs
+
+from imaging_server_kit.core.results import Results
+
+DEFAULT_MAX_BYTES = 5 * 1024**3
+
+LAYERS_FILE_NAME = "layers.pkl"
+
+
+class SampleCache:
+    """Caches samples on disk, evicting the least recently used ones beyond `max_bytes`.
+
+    Entries are keyed by server, algorithm, sample index and a digest of the server state (so that they are
+    not reused once the server changes). Arrays are stored as `.npy` files and loaded memory-mapped (copy-on-write).
+    Concurrent fetches of the same sample share a single download.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or os.path.join(platformdirs.user_cache_dir("napari-serverkit"), "samples")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._downloads: Dict[str, threading.Event] = {}  # Entry => set once downloaded
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(server: str, algorithm: str, idx: int, digest: str) -> str:
+        return hashlib.sha256(repr((server, algorithm, idx, digest)).encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.isfile(os.path.join(self._entry_dir(key), LAYERS_FILE_NAME))
+
+    def get(self, key: str) -> Optional[Results]:
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, LAYERS_FILE_NAME), "rb") as f:
+                layers: List[Tuple[str, str, Dict, object]] = pickle.load(f)
+            results = Results()
+            for kind, name, meta, data in layers:
+                if isinstance(data, str) and data.endswith(".npy"):
+                    data = np.load(os.path.join(entry_dir, data), mmap_mode="c")
+                results.create(kind=kind, data=data, name=name, meta=meta)
+            os.utime(entry_dir)  # Most recently used
+        except Exception:
+            return None  # Missing, evicted or corrupted
+        return results
+
+    def put(self, key: str, results: Results):
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Written in a temporary directory, then moved in place, so that incomplete entries are never read
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            layers = []
+            for k, layer in enumerate(results):
+                data = layer.data
+                if isinstance(data, np.ndarray) and data.dtype != object:
+                    file_name = f"layer_{k}.npy"
+                    np.save(os.path.join(tmp_dir, file_name), data)
+                    data = file_name
+                layers.append((layer.kind, layer.name, layer.meta, data))
+            with open(os.path.join(tmp_dir, LAYERS_FILE_NAME), "wb") as f:
+                pickle.dump(layers, f)
+            with self._lock:
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                os.replace(tmp_dir, self._entry_dir(key))
+        except Exception:
+            # The sample is not cached (eg. disk full, or meta that cannot be pickled)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self.evict()
+
+    def fetch(self, key: str, download: Callable[[], Optional[Results]]) -> Optional[Results]:
+        """Get a sample from the cache, or download and cache it. Waits for the download in progress, if any."""
+        while True:
+            results = self.get(key)
+            if results is not None:
+                return results
+            with self._lock:
+                in_progress = self._downloads.get(key)
+                if in_progress is None:
+                    if key in self:
+                        continue  # Downloaded in the meantime
+                    self._downloads[key] = threading.Event()
+            if in_progress is None:
+                break
+            in_progress.wait()
+            if key not in self:
+                # The other download failed (or is not cacheable)
+                return download()
+
+        try:
+            results = download()
+            if results is not None:
+                self.put(key, results)
+                # Load the cached arrays memory-mapped, rather than keeping the downloaded ones in memory
+                results = self.get(key) or results
+            return results
+        finally:
+            with self._lock:
+                self._downloads.pop(key).set()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(last access time, size in bytes, path) of the entries."""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".tmp-") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                entries.append((os.stat(path).st_mtime, size, path))
+            except OSError:
+                continue
+        return entries
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(size for (_, size, _) in self._entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in `max_bytes`."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for (_, size, _) in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                shutil.rmtree(path, ignore_errors=True)
+
+
+# Shared by all the widgets of the session
+SAMPLE_CACHE = SampleCache()
@@ -0,0 +1,45 @@
+"""
+Per-server cache of algorithm schemas, sample counts and tileability.
+"""
+
+import threading
+from typing import Dict, Optional
+
+
+class SchemaCache:
+    """Caches the algorithm info (parameters schema, number of samples, tileability) of each server.
+
+    The entries of a server are dropped when its validator (e.g. server version, ETag) changes.
+    """
+
+    def __init__(self):
+        self._validators: Dict[str, str] = {}
+        self._entries: Dict[str, Dict[str, Dict]] = {}
+        self._lock = threading.Lock()
+
+    def validate(self, server: str, validator: str):
+        with self._lock:
+            if self._validators.get(server) != validator:
+                self._validators[server] = validator
+                self._entries[server] = {}
+
+    def get(self, server: str, algorithm: str) -> Optional[Dict]:
+        with self._lock:
+            return self._entries.get(server, {}).get(algorithm)
+
+    def put(self, server: str, algorithm: str, algorithm_info: Dict):
+        with self._lock:
+            self._entries.setdefault(server, {})[algorithm] = algorithm_info
+
+    def invalidate(self, server: Optional[str] = None):
+        with self._lock:
+            if server is None:
+                self._validators.clear()
+                self._entries.clear()
+            else:
+                self._validators.pop(server, None)
+                self._entries.pop(server, None)
+
+
+# Shared by all the widgets of the session
+SCHEMA_CACHE = SchemaCache()
@@ -1,23 +1,47 @@
+import itertools
+from collections import deque
 from functools import partial
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Tuple
 import napari
 from napari.utils.notifications import show_info, show_warning
-from qtpy.QtCore import Qt
-from qtpy.QtWidgets import QProgressBar, QPushButton, QVBoxLayout, QWidget
+from qtpy.QtCore import Qt, QTimer
+from qtpy.QtGui import QFontDatabase
+from napari_toolkit.containers.collapsible_groupbox import QCollapsibleGroupBox
+from qtpy.QtWidgets import (
+    QCheckBox,
+    QFileDialog,
+    QGridLayout,
+    QLabel,
+    QListWidget,
+    QListWidgetItem,
+    QProgressBar,
+    QPushButton,
+    QSpinBox,
+    QVBoxLayout,
+    QWidget,
+)
 
 from imaging_server_kit.core.errors import (
     AlgorithmServerError,
+    AlgorithmTimeoutError,
     ServerRequestError,
 )
 
+from napari_serverkit.widgets.cancellation import CancelToken
+from napari_serverkit.widgets.live_slice import neighbor_steps, scrub_direction, slice_key, slice_layer_params
 from napari_serverkit.widgets.parameter_panel import ParameterPanel, NAPARI_LAYER_MAPPINGS
-from napari_serverkit.widgets.task_manager import TaskManager
+from napari_serverkit.widgets.task_manager import Job, TaskManager
 from napari_serverkit.widgets.napari_results import NapariResults
+from napari_serverkit.widgets.pipeline import PipelineStep, run_pipeline, viewer_input_names
 from napari_serverkit.widgets.runner_widget import RunnerWidget
-from imaging_server_kit.core.results import LayerStackBase
+from napari_serverkit.widgets.results_cache import ResultsCache
+from napari_serverkit.widgets.run_trace import RunTrace, to_chrome_trace, to_jsonl
+from napari_serverkit.widgets.tile_order import viewer_camera, viewport_box
+from imaging_server_kit.core.results import LayerStackBase, Results
 
 
 class ServerKitWidget(QWidget):
-    def __init__(self, viewer: napari.Viewer, runner_widget: RunnerWidget):
+    def __init__(self, viewer: "napari.Viewer", runner_widget: RunnerWidget):
         super().__init__()
         self.napari_results = NapariResults(viewer)
         self.runner_widget = runner_widget
@@ -33,16 +57,113 @@ class ServerKitWidget(QWidget):
         # Connect the ComboBox change from the runner to the UI update
         self.runner_widget.update_params_trigger.connect(self._algorithm_changed)
 
+        # Tiled outputs can be written to disk
+        self.runner_widget.cb_tiles_to_disk.toggled.connect(self._tiles_to_disk_toggled)
+
         # Connect the samples loading event
         self.runner_widget.samples_select_btn.clicked.connect(self._sample_triggered)
 
         # Algorithm parameters (dynamic UI)
         self.params_panel = ParameterPanel(
-            trigger=self._run,  # gets linked to auto_call
+            trigger=self._auto_run,  # gets linked to auto_call
             napari_results=self.napari_results,  # layer change events update the cbs
         )
         layout.addWidget(self.params_panel.widget)
 
+        # Settings
+        self.settings_gb = QCollapsibleGroupBox("Settings") # type: ignore
+        self.settings_gb.setChecked(False)
+        settings_layout = QGridLayout(self.settings_gb)
+        layout.addWidget(self.settings_gb)
+
+        # Results cache (plain runs only)
+        self.results_cache = ResultsCache()
+        settings_layout.addWidget(QLabel("Cache results"), 0, 0)
+        self.cb_cache = QCheckBox()
+        self.cb_cache.setChecked(False)
+        self.cb_cache.toggled.connect(self._cache_toggled)
+        settings_layout.addWidget(self.cb_cache, 0, 1)
+
+        # Debounce window of auto_call parameters
+        settings_layout.addWidget(QLabel("Auto-call delay [ms]"), 1, 0)
+        self.qds_auto_call_delay = QSpinBox()
+        self.qds_auto_call_delay.setMinimum(0)
+        self.qds_auto_call_delay.setMaximum(5000)
+        self.qds_auto_call_delay.setSingleStep(50)
+        self.qds_auto_call_delay.setValue(self.params_panel.auto_call_delay_ms)
+        self.qds_auto_call_delay.valueChanged.connect(self._auto_call_delay_changed)
+        settings_layout.addWidget(self.qds_auto_call_delay, 1, 1)
+
+        # Samples of algorithm servers are cached on disk (and prefetched when an algorithm is selected)
+        settings_layout.addWidget(QLabel("Sample cache [GB]"), 2, 0)
+        self.qds_sample_cache_size = QSpinBox()
+        self.qds_sample_cache_size.setMinimum(0)
+        self.qds_sample_cache_size.setMaximum(1000)
+        self.qds_sample_cache_size.setValue(round(self.runner_widget.sample_cache.max_bytes / 1024**3))
+        self.qds_sample_cache_size.setToolTip("Set to 0 to disable the cache.")
+        self.qds_sample_cache_size.valueChanged.connect(self._sample_cache_size_changed)
+        settings_layout.addWidget(self.qds_sample_cache_size, 2, 1)
+        settings_layout.addWidget(QLabel("Prefetch samples"), 3, 0)
+        self.cb_prefetch_samples = QCheckBox()
+        self.cb_prefetch_samples.setChecked(True)
+        settings_layout.addWidget(self.cb_prefetch_samples, 3, 1)
+        self._prefetch_job: Optional[Job] = None
+
+        # Number of planes next to the displayed one computed in the background (live slice mode)
+        settings_layout.addWidget(QLabel("Prefetched slices"), 4, 0)
+        self.qds_prefetch_slices = QSpinBox()
+        self.qds_prefetch_slices.setMinimum(0)
+        self.qds_prefetch_slices.setMaximum(20)
+        self.qds_prefetch_slices.setValue(2)
+        settings_layout.addWidget(self.qds_prefetch_slices, 4, 1)
+
+        # The latest auto_call run supersedes the previous one
+        self._auto_call_job: Optional[Job] = None
+
+        # Pipeline of algorithms, run as a single job
+        self.pipeline_gb = QCollapsibleGroupBox("Pipeline") # type: ignore
+        self.pipeline_gb.setChecked(False)
+        pipeline_layout = QGridLayout(self.pipeline_gb)
+        layout.addWidget(self.pipeline_gb)
+        self.pipeline_steps: List[PipelineStep] = []
+        self.pipeline_list = QListWidget()
+        self.pipeline_list.setToolTip(
+            "Steps are added with the current algorithm and parameters. Layers are passed to the next steps by name.\n"
+            "Only the outputs of the checked steps are added to the viewer."
+        )
+        self.pipeline_list.itemChanged.connect(self._pipeline_step_checked)
+        pipeline_layout.addWidget(self.pipeline_list, 0, 0, 1, 3)
+        add_step_btn = QPushButton("Add step")
+        add_step_btn.clicked.connect(self._add_pipeline_step)
+        pipeline_layout.addWidget(add_step_btn, 1, 0)
+        remove_step_btn = QPushButton("Remove step")
+        remove_step_btn.clicked.connect(self._remove_pipeline_step)
+        pipeline_layout.addWidget(remove_step_btn, 1, 1)
+        self.run_pipeline_btn = QPushButton("Run pipeline")
+        self.run_pipeline_btn.clicked.connect(self._run_pipeline)
+        pipeline_layout.addWidget(self.run_pipeline_btn, 1, 2)
+
+        # Live slice mode: runs process the displayed plane only, and results are cached per plane (and parameters)
+        self.cb_live_slice = QCheckBox("Current slice only")
+        self.cb_live_slice.setToolTip(
+            "Run on the displayed plane only, and again whenever the sliders move.\n"
+            "The planes next to it are computed in the background."
+        )
+        self.cb_live_slice.toggled.connect(self._live_slice_toggled)
+        layout.addWidget(self.cb_live_slice)
+        self.slice_cache = ResultsCache(max_disk_bytes=0)
+        self._slice_jobs: Dict[Hashable, Job] = {}  # Planes being computed
+        self._displayed_slice: Optional[Hashable] = None
+        self._previous_step: Optional[Tuple[int, ...]] = None
+        self.napari_results.viewer.dims.events.current_step.connect(self._current_step_changed)
+
+        # Tiled runs can process the tiles in the viewport first; it follows the camera (and the sliders)
+        self._viewport_layer: Optional[str] = None
+        camera = viewer_camera(self.napari_results.viewer)
+        camera.events.center.connect(self._update_viewport)
+        camera.events.zoom.connect(self._update_viewport)
+        self.napari_results.viewer.dims.events.current_step.connect(self._update_viewport)
+
         # Run button
         self.run_btn = QPushButton("Run", self)
         self.run_btn.clicked.connect(self._run)
@@ -52,11 +173,26 @@ class ServerKitWidget(QWidget):
         self.tasks = TaskManager(
             self._grayout_ui,  # called when worker starts
             self._ungrayout_ui,  # called when worker stops
-            self._update_pbar,  # called when worker yields
+            self._update_pbar,  # called when the jobs progress changes
             self.params_panel,  # linked to manage_cbs_events(worker)
         )
 
-        self.grayout_ui_list = [self.params_panel.widget, self.run_btn]
+        self.grayout_ui_list = [self.params_panel.widget, self.run_btn, self.run_pipeline_btn]
+
+        # Timing breakdown of the latest runs
+        self.run_traces: Deque[RunTrace] = deque(maxlen=100)
+        self._run_ids = itertools.count()
+        self.timings_gb = QCollapsibleGroupBox("Timings") # type: ignore
+        self.timings_gb.setChecked(False)
+        timings_layout = QGridLayout(self.timings_gb)
+        layout.addWidget(self.timings_gb)
+        self.timings_label = QLabel("No runs yet.")
+        self.timings_label.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.timings_label.setTextInteractionFlags(Qt.TextSelectableByMouse) # type: ignore
+        timings_layout.addWidget(self.timings_label, 0, 0)
+        export_timings_btn = QPushButton("Export...")
+        export_timings_btn.clicked.connect(self._export_timings)
+        timings_layout.addWidget(export_timings_btn, 1, 0)
 
         cancel_btn = QPushButton("❌ Cancel")
         cancel_btn.clicked.connect(self._cancel)
@@ -65,44 +201,442 @@ class ServerKitWidget(QWidget):
         self.pbar = QProgressBar(minimum=0, maximum=1) # type: ignore
         layout.addWidget(self.pbar)
 
+        # Throughput and ETA of the running jobs
+        self.progress_label = QLabel()
+        self.progress_label.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.progress_label.setVisible(False)
+        layout.addWidget(self.progress_label)
+        self._progress_timer = QTimer(self)
+        self._progress_timer.setInterval(500)
+        self._progress_timer.timeout.connect(self._update_progress_label)
+
     def _algorithm_changed(self, selected_algo):
         if selected_algo == "":
             return
+
+        algorithm_info = self.runner_widget.get_cached_algorithm_info(selected_algo)
+        if (algorithm_info is not None) or (not self.runner_widget.loads_remotely):
+            self._algorithm_info_loaded(selected_algo, self._load_algorithm_info(selected_algo))
+        else:
+            # Load the algorithm info from the server in a worker thread
+            self.params_panel.widget.setTitle("Parameters (loading...)")
+            self.tasks.add_active(
+                task=partial(self._load_algorithm_info, selected_algo),
+                return_func=partial(self._algorithm_info_loaded, selected_algo),
+            )
+
+    def _load_algorithm_info(self, algorithm: str):
         try:
-            # Update the parameters panel
-            schema = self.runner_widget.get_algorithm_parameters()
-            self.params_panel.update(schema)
-            # Update the number of samples available
-            self.runner_widget.update_n_samples()
-            # Check if tiled inference should be displayed or not
-            self.runner_widget.update_tiled_ui()
+            return self.runner_widget.load_algorithm_info(algorithm)
         except (AlgorithmServerError, ServerRequestError) as e:
-            show_warning(e.message)
+            return e
+
+    def _algorithm_info_loaded(self, algorithm: str, algorithm_info):
+        if algorithm != self.runner_widget.cb_algorithms.currentText():
+            return  # Another algorithm was selected in the meantime
+        self.params_panel.widget.setTitle("Parameters")
+        if isinstance(algorithm_info, (AlgorithmServerError, ServerRequestError)):
+            show_warning(algorithm_info.message)
+            return
+        # Update the parameters panel
+        self.params_panel.update(
+            algorithm_info["parameters"],
+            panel_key=(self.runner_widget.server_id, algorithm),
+        )
+        # Update the number of samples available
+        self.runner_widget.update_n_samples(algorithm_info["n_samples"])
+        self._prefetch_samples(algorithm, algorithm_info["n_samples"])
+        # Check if tiled inference should be displayed or not
+        self.runner_widget.update_tiled_ui(algorithm_info["tileable"])
 
-    def _run(self):
-        algo_params = self.params_panel.get_algo_params()
+    def _auto_run(self):
+        if (self._auto_call_job is not None) and self._auto_call_job.is_active:
+            # In live slice mode, planes are only cancelled once they are no longer next to the displayed one
+            if self._auto_call_job not in self._slice_jobs.values():
+                self._auto_call_job.cancel()
+        self._auto_call_job = self._run(auto_call=True)
 
+    def _run(self, *args, auto_call: bool = False) -> Optional[Job]:
+        trace = RunTrace(next(self._run_ids), self.runner_widget.cb_algorithms.currentText())
+        live_step = None
+        with trace.span("parameters"):
+            algo_params = self.params_panel.get_algo_params()
+            if self.cb_live_slice.isChecked():
+                live_step = tuple(self.napari_results.viewer.dims.current_step)
+                full_algo_params, algo_params = algo_params, self._slice_params(algo_params, live_step)
+
+        task = None
         try:
             task = self.runner_widget._get_run_func(algo_params)
         except (AlgorithmServerError, ServerRequestError) as e:
             show_warning(e.message)
 
         if task:
-            return_func = partial(
-                self.napari_results.merge,
-                tiles_callback=self._update_pbar_on_tiled,
+            if (live_step is not None) and (task.func == self.runner_widget.algorithm._run):
+                return self._run_slices(full_algo_params, algo_params, task, live_step, trace) # type: ignore
+
+            use_cache = self.cb_cache.isChecked() and (task.func == self.runner_widget.algorithm._run)
+
+            if self.runner_widget.cb_run_in_tiles.isChecked():
+                unit = "tiles"
+                self._track_viewport()
+            elif task.func != self.runner_widget.algorithm._run:
+                unit = "frames"
+            else:
+                unit = "runs"
+
+            cancel_token = CancelToken()
+            task = self.runner_widget.trace_task(task, trace, cancel_token)
+            if use_cache:
+                task = partial(
+                    self._run_cached,
+                    task,
+                    self.results_cache,
+                    getattr(self.runner_widget.algorithm, "server_url", None),
+                    self.runner_widget.cb_algorithms.currentText(),
+                    algo_params,
+                    trace,
+                )
+
+            # The job is bound once `add_active` returns (before any result is emitted)
+            job = self.tasks.add_active(
+                task,
+                return_func=lambda results: self._merge_job_results(job, trace, results),
+                grayout=not auto_call,  # Parameters remain editable during auto_call runs
+                finished_func=lambda job: self._job_finished(job, trace),
+                trace=trace,
+                unit=unit,
+                cancel_token=cancel_token,
             )
-            self.tasks.add_active(task, return_func)
+            self._progress_timer.start()
+            return job
+
+    def _track_viewport(self):
+        """Compute the viewport of tiled runs relative to the (first) image or mask they process."""
+        _, inputs = self.params_panel.get_param_values()
+        self._viewport_layer = next(
+            (
+                inputs[name]
+                for name, (kind, *_) in self.params_panel.ui_state.items()
+                if kind in ["image", "mask", "instance_mask"] and inputs.get(name)
+            ),
+            None,
+        )
+        self._update_viewport()
+
+    def _update_viewport(self, e=None):
+        viewer = self.napari_results.viewer
+        if (self._viewport_layer is None) or (self._viewport_layer not in viewer.layers):
+            return
+        self.runner_widget.viewport.set(viewport_box(viewer, viewer.layers[self._viewport_layer]))
+
+    def _slice_params(self, algo_params: Results, current_step: Tuple[int, ...]) -> Results:
+        viewer = self.napari_results.viewer
+        _, inputs = self.params_panel.get_param_values()
+        layers = {name: viewer.layers[layer_name] for name, layer_name in inputs.items() if layer_name in viewer.layers}
+        return slice_layer_params(algo_params, layers, viewer.dims, current_step)
+
+    def _slice_cache_key(self, sliced_params: Results, current_step: Tuple[int, ...]) -> Hashable:
+        return (
+            self.slice_cache.make_key(
+                getattr(self.runner_widget.algorithm, "server_url", None),
+                self.runner_widget.cb_algorithms.currentText(),
+                sliced_params,
+            ),
+            slice_key(self.napari_results.viewer.dims, current_step),
+        )
+
+    def _run_slices(
+        self,
+        algo_params: Results,
+        sliced_params: Results,
+        task: Callable,
+        current_step: Tuple[int, ...],
+        trace: RunTrace,
+    ) -> Optional[Job]:
+        """Show the displayed plane (from the cache, or once computed) and compute the planes next to it in the background,
+        nearest first (ahead of the scrubbing direction). Returns the job computing the displayed plane, if any.
+
+        Planes already being computed are not computed again; those no longer next to the displayed plane are cancelled.
+        """
+        direction = scrub_direction(self._previous_step, current_step)
+        self._previous_step = current_step
+        dims = self.napari_results.viewer.dims
+
+        self._displayed_slice = self._slice_cache_key(sliced_params, current_step)
+        keys = [self._displayed_slice]
+        with trace.span("cache"):
+            cached_results = self.slice_cache.get(self._displayed_slice)
+        job = None
+        if cached_results is not None:
+            with trace.span("merge"):
+                self.napari_results.merge(cached_results)
+            self._trace_finished(trace, "cached")
+        elif self._displayed_slice in self._slice_jobs:
+            job = self._slice_jobs[self._displayed_slice]  # Merged once computed
+        else:
+            job = self._start_slice_job(task, self._displayed_slice, trace)
+            self._progress_timer.start()
+
+        for step in neighbor_steps(dims, current_step, self.qds_prefetch_slices.value(), direction):
+            try:
+                neighbor_params = self._slice_params(algo_params, step)
+                key = self._slice_cache_key(neighbor_params, step)
+                keys.append(key)
+                if (key not in self.slice_cache) and (key not in self._slice_jobs):
+                    self._start_slice_job(self.runner_widget._get_run_func(neighbor_params), key) # type: ignore
+            except Exception as e:
+                # Prefetching is best effort: the displayed plane still runs
+                show_warning(f"Could not prefetch plane {step}: {e}")
+
+        for key in [key for key in self._slice_jobs if key not in keys]:
+            self._slice_jobs.pop(key).cancel()
+        return job
+
+    def _start_slice_job(self, task: Callable, key: Hashable, trace: Optional[RunTrace] = None) -> Job:
+        """Compute a plane. Prefetched planes (without `trace`) are computed last, and not recorded in the timings."""
+        cancel_token = CancelToken()
+        task = self.runner_widget.trace_task(
+            task,
+            trace if trace is not None else RunTrace(-1, self.runner_widget.cb_algorithms.currentText()),
+            cancel_token,
+        )
+        self._slice_jobs[key] = self.tasks.add_active(
+            partial(self._run_and_cache, task, self.slice_cache, key),
+            return_func=partial(self._slice_computed, key, trace),
+            priority=0 if trace is not None else -1,
+            grayout=False,
+            finished_func=partial(self._slice_job_finished, key, trace),
+            trace=trace,
+            unit="runs",
+            cancel_token=cancel_token,
+        )
+        return self._slice_jobs[key]
+
+    def _slice_computed(self, key: Hashable, trace: Optional[RunTrace], results: LayerStackBase):
+        if key != self._displayed_slice:
+            return
+        if trace is not None:
+            with trace.span("merge"):
+                self.napari_results.merge(results)
+        else:
+            self.napari_results.merge(results)
+
+    def _slice_job_finished(self, key: Hashable, trace: Optional[RunTrace], job: Job):
+        if self._slice_jobs.get(key) is job:
+            del self._slice_jobs[key]
+        if trace is not None:
+            self._job_finished(job, trace)
+
+    def _current_step_changed(self, e):
+        if self.cb_live_slice.isChecked() and self.runner_widget.cb_algorithms.currentText():
+            # Debounced like auto_call parameters, so that scrubbing through planes only runs the plane it stops at
+            self.params_panel.request_auto_call()
+
+    def _live_slice_toggled(self, live: bool):
+        if live:
+            self._current_step_changed(None)
+        else:
+            for job in list(self._slice_jobs.values()):
+                job.cancel()
+            self._slice_jobs.clear()
+            self.slice_cache.clear()
+            self._displayed_slice = None
+            self._previous_step = None
+
+    def _add_pipeline_step(self):
+        algorithm = self.runner_widget.cb_algorithms.currentText()
+        if algorithm == "":
+            return
+        try:
+            algorithm_info = self.runner_widget.load_algorithm_info(algorithm)
+        except (AlgorithmServerError, ServerRequestError) as e:
+            show_warning(e.message)
+            return
+        values, inputs = self.params_panel.get_param_values()
+        # By default, only the outputs of the last step are added to the viewer
+        for step in self.pipeline_steps:
+            step.materialize = False
+        self.pipeline_steps.append(
+            PipelineStep(algorithm, algorithm_info["parameters"]["properties"], values, inputs)
+        )
+        self._update_pipeline_list()
+
+    def _remove_pipeline_step(self):
+        row = self.pipeline_list.currentRow()
+        if row < 0:
+            row = len(self.pipeline_steps) - 1
+        if row >= 0:
+            self.pipeline_steps.pop(row)
+            self._update_pipeline_list()
+
+    def _update_pipeline_list(self):
+        self.pipeline_list.blockSignals(True)
+        self.pipeline_list.clear()
+        for idx, step in enumerate(self.pipeline_steps):
+            wiring = ", ".join(f"{name}: {layer_name}" for name, layer_name in step.inputs.items() if layer_name)
+            item = QListWidgetItem(f"{idx + 1}. {step.algorithm}" + (f" ({wiring})" if wiring else ""))
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable) # type: ignore
+            item.setCheckState(Qt.Checked if step.materialize else Qt.Unchecked) # type: ignore
+            self.pipeline_list.addItem(item)
+        self.pipeline_list.blockSignals(False)
+
+    def _pipeline_step_checked(self, item: QListWidgetItem):
+        step = self.pipeline_steps[self.pipeline_list.row(item)]
+        step.materialize = item.checkState() == Qt.Checked # type: ignore
+
+    def _run_pipeline(self) -> Optional[Job]:
+        if not self.pipeline_steps:
+            show_info("Add steps to the pipeline first.")
+            return
+        steps = list(self.pipeline_steps)
+        trace = RunTrace(next(self._run_ids), " > ".join(step.algorithm for step in steps))
+        with trace.span("parameters"):
+            viewer_inputs = {}
+            for layer_name in viewer_input_names(steps):
+                layer = self.napari_results.read_synced(layer_name)
+                if layer is not None:
+                    viewer_inputs[layer_name] = layer.data
+                elif layer_name in self.napari_results.viewer.layers:
+                    viewer_inputs[layer_name] = self.napari_results.viewer.layers[layer_name].data
+
+        cancel_token = CancelToken()
+        task = partial(run_pipeline, steps, self.runner_widget.step_func(trace, cancel_token), viewer_inputs, trace)
+        job = self.tasks.add_active(
+            task,
+            return_func=lambda results: self._merge_job_results(job, trace, results),
+            finished_func=lambda job: self._job_finished(job, trace),
+            trace=trace,
+            unit="steps",
+            cancel_token=cancel_token,
+            expected_items=len(steps),
+        )
+        self._progress_timer.start()
+        return job
+
+    def _update_progress_label(self):
+        jobs = [job for job in self.tasks.active_jobs.values() if job.trace is not None]
+        if not jobs:
+            self._progress_timer.stop()
+            self.progress_label.setVisible(False)
+            return
+        self.progress_label.setText("\n".join(_format_job_stats(job) for job in jobs))
+        self.progress_label.setVisible(True)
+
+    def _merge_job_results(self, job: Job, trace: RunTrace, results: LayerStackBase):
+        # Results of superseded (cancelled) runs are dropped
+        if job.status == "cancelled":
+            return
+        with trace.span("merge"):
+            self.napari_results.merge(results, tiles_callback=job.tiles_callback)
+
+    def _job_finished(self, job: Job, trace: RunTrace):
+        if job.started_at is not None:
+            trace.add_span("queued", job.created_at, job.started_at)
+        cached = (job.status == "finished") and (trace.status == "cached")
+        self._trace_finished(trace, "cached" if cached else job.status)
+
+    def _trace_finished(self, trace: RunTrace, status: str):
+        trace.finish(status)
+        self.run_traces.append(trace)
+        lines = [f"{trace.algorithm} #{trace.run_id} ({status}): {trace.duration * 1000:.1f} ms"] # type: ignore
+        for phase, (total, count) in trace.summary().items():
+            line = f"  {phase:<12}{total * 1000:>10.1f} ms"
+            if count > 1:
+                line += f" ({count}x)"
+            lines.append(line)
+        if trace.bytes_sent or trace.bytes_received:
+            lines.append(f"  sent {trace.bytes_sent / 1024:.1f} kB, received {trace.bytes_received / 1024:.1f} kB")
+        self.timings_label.setText("\n".join(lines))
+
+    def _export_timings(self):
+        if len(self.run_traces) == 0:
+            show_info("No timings to export.")
+            return
+        file_name, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Export timings",
+            "timings.jsonl",
+            "JSON lines (*.jsonl);;Chrome trace (*.json)",
+        )
+        if not file_name:
+            return
+        if selected_filter.startswith("Chrome") or file_name.endswith(".json"):
+            content = to_chrome_trace(self.run_traces)
+        else:
+            content = to_jsonl(self.run_traces)
+        with open(file_name, "w") as f:
+            f.write(content)
+        show_info(f"Exported the timings of {len(self.run_traces)} runs to {file_name}")
+
+    def _run_cached(self, task, cache: ResultsCache, server: Optional[str], algorithm: str, algo_params: Results, trace: RunTrace):
+        """Get the results from `cache`, or run the task and cache its results. Runs in the worker thread, since
+        the cache key hashes the whole input data (which takes time for large images)."""
+        with trace.span("cache"):
+            cache_key = cache.make_key(server, algorithm, algo_params)
+            results = cache.get(cache_key)
+        if results is not None:
+            trace.status = "cached"
+            return results
+        return self._run_and_cache(task, cache, cache_key)
+
+    def _run_and_cache(self, task, cache: ResultsCache, cache_key):
+        results = task()
+        if results is not None:
+            cache.put(cache_key, results)
+        return results
+
+    def _auto_call_delay_changed(self, delay_ms: int):
+        self.params_panel.auto_call_delay_ms = delay_ms
+
+    def _tiles_to_disk_toggled(self, to_disk: bool):
+        self.napari_results.memmap_tiled_outputs = to_disk
+
+    def _cache_toggled(self, use_cache: bool):
+        if not use_cache:
+            self.results_cache.clear()
+
+    def _sample_cache_size_changed(self, size_gb: int):
+        self.runner_widget.sample_cache.max_bytes = size_gb * 1024**3
+        if size_gb > 0:
+            self.tasks.add_active(task=self.runner_widget.sample_cache.evict, return_func=lambda _: None, grayout=False)
+
+    def _prefetch_samples(self, algorithm: str, n_samples: int):
+        if (self._prefetch_job is not None) and self._prefetch_job.is_active:
+            self._prefetch_job.cancel()
+        if (not self.cb_prefetch_samples.isChecked()) or (n_samples == 0) or (self.runner_widget.server_id is None):
+            return
+        cancel_token = CancelToken()
+        self._prefetch_job = self.tasks.add_active(
+            task=partial(self._prefetch_samples_task, algorithm, n_samples, cancel_token),
+            return_func=lambda _: None,
+            priority=-1,  # Runs and sample loads go first
+            grayout=False,
+            cancel_token=cancel_token,
+        )
+
+    def _prefetch_samples_task(self, algorithm: str, n_samples: int, cancel_token: CancelToken):
+        try:
+            self.runner_widget.prefetch_samples(algorithm, n_samples, cancel_token)
+        except (AlgorithmServerError, AlgorithmTimeoutError, ServerRequestError, ValueError):
+            pass  # Samples are downloaded again (with a warning) if they are loaded
 
     def _sample_triggered(self):
         idx = self.runner_widget.samples_select.currentText()
         if idx == "":
             return
         self.tasks.add_active(
-            task=partial(self.runner_widget._download_sample, idx=int(idx)),
+            task=partial(self._load_sample, int(idx)),
             return_func=self._sample_emitted,
         )
 
+    def _load_sample(self, idx: int) -> LayerStackBase:
+        try:
+            return self.runner_widget._download_sample(idx=idx)
+        except (AlgorithmServerError, AlgorithmTimeoutError, ServerRequestError, ValueError) as e:
+            show_warning(f"Failed to download sample: {getattr(e, 'message', e)}")
+            return Results()
+
     def _sample_emitted(self, sample: LayerStackBase):
         for sp in sample:
             if sp.kind in NAPARI_LAYER_MAPPINGS:
@@ -132,9 +666,33 @@ class ServerKitWidget(QWidget):
         for ui_element in self.grayout_ui_list:
             ui_element.setEnabled(True)
 
-    def _update_pbar(self, value: int):
+    def _update_pbar(self, value: int, maximum: int):
+        self.pbar.setMaximum(maximum)
         self.pbar.setValue(value)
 
-    def _update_pbar_on_tiled(self, tile_idx, n_tiles):
-        self.pbar.setMaximum(n_tiles)
-        self.pbar.setValue(tile_idx)
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def _format_job_stats(job: Job) -> str:
+    """Eg. `threshold: 3/16 tiles · 4.2 tiles/s · 1.3 MB/s · elapsed 0:12 · ETA 0:03`."""
+    stats = job.stats()
+    parts = []
+    if stats["progress"] is not None:
+        value, maximum = stats["progress"]
+        parts.append(f"{max(value, stats['n_items'])}/{maximum} {stats['unit']}")
+    elif stats["n_items"]:
+        parts.append(f"{stats['n_items']} {stats['unit']}")
+    if stats["items_per_sec"]:
+        parts.append(f"{stats['items_per_sec']:.1f} {stats['unit']}/s")
+    if stats["bytes_per_sec"]:
+        parts.append(f"{stats['bytes_per_sec'] / 1e6:.1f} MB/s")
+    parts.append(f"elapsed {_format_duration(stats['elapsed_sec'])}")
+    if stats["eta_sec"] is not None:
+        parts.append(f"ETA {_format_duration(stats['eta_sec'])}")
+    return f"{job.trace.algorithm}: " + " · ".join(parts) # type: ignore
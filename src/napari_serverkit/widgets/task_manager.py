@@ -1,54 +1,318 @@
-from typing import Callable
-from napari.qt.threading import thread_worker, GeneratorWorker
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from napari.qt.threading import thread_worker, GeneratorWorker, WorkerBase
 
+from napari_serverkit.widgets.cancellation import CancelToken, cancellable
 from napari_serverkit.widgets.parameter_panel import ParameterPanel
+from napari_serverkit.widgets.results_coalescer import ResultsCoalescer
+from napari_serverkit.widgets.run_trace import RunTrace
+
+RATE_WINDOW_SEC = 10.0  # Rates are measured over the latest items
+
+
+class Job:
+    """Handle on a single task scheduled by the TaskManager."""
+
+    def __init__(
+        self,
+        job_id: int,
+        task: Callable,
+        return_func: Callable,
+        max_iter: int = 0,
+        priority: int = 0,
+        grayout: bool = True,
+        finished_func: Optional[Callable] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ):
+        self.job_id = job_id
+        self.task = task
+        self.return_func = return_func
+        self.max_iter = max_iter
+        self.priority = priority
+        self.grayout = grayout
+        self.finished_func = finished_func
+        # Shared with the task, which stops cooperatively once it is cancelled
+        self.cancel_token = cancel_token if cancel_token is not None else CancelToken()
+        self.status = "queued"  # queued, running, finished, errored, cancelled
+        self.worker: Optional[WorkerBase] = None
+        self.coalescer: Optional[ResultsCoalescer] = None
+        self.progress: Optional[Tuple[int, int]] = None  # (value, maximum)
+        # `perf_counter` timestamps
+        self.created_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        # Throughput (items are the values yielded by generator tasks: tiles, frames...)
+        self.unit = "items"
+        self.n_items = 0
+        self.expected_items: Optional[int] = None  # Number of values the task yields, if known in advance
+        self.trace: Optional[RunTrace] = None  # Transferred bytes are read from the run trace, if any
+        self._item_times: Deque[Tuple[float, int]] = deque()  # (timestamp, n_items)
+        self.last_update_at: Optional[float] = None
+        self._manager: Optional["TaskManager"] = None
+
+    def __repr__(self):
+        return f"Job({self.job_id}, {self.status})"
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ["queued", "running"]
+
+    def cancel(self):
+        if self._manager is not None:
+            self._manager.cancel(self)
+
+    def update_progress(self, value: int, maximum: int):
+        self.progress = (value, maximum)
+        if self._manager is not None:
+            self._manager._progress_changed()
+
+    def tiles_callback(self, tile_idx: int, n_tiles: int):
+        """Compatible with the `tiles_callback` of `LayerStackBase.merge()`."""
+        self.update_progress(tile_idx + 1, n_tiles)
+
+    def item_done(self, *args):
+        now = time.perf_counter()
+        self.n_items += 1
+        self.last_update_at = now
+        self._item_times.append((now, self.n_items))
+        while (len(self._item_times) > 2) and (now - self._item_times[0][0] > RATE_WINDOW_SEC):
+            self._item_times.popleft()
+        if self.expected_items:
+            self.update_progress(self.n_items, self.expected_items)
+
+    def stats(self) -> Dict:
+        """Elapsed time, throughput (recent items per second, transferred bytes per second) and estimated time left."""
+        now = self.finished_at or time.perf_counter()
+        elapsed = (now - self.started_at) if self.started_at is not None else 0.0
+
+        items_per_sec = None
+        if len(self._item_times) >= 2:
+            (t_first, n_first), (t_last, n_last) = self._item_times[0], self._item_times[-1]
+            if t_last > t_first:
+                items_per_sec = (n_last - n_first) / (t_last - t_first)
+        elif self.n_items and elapsed > 0:
+            items_per_sec = self.n_items / elapsed
+
+        bytes_per_sec = None
+        if (self.trace is not None) and elapsed > 0:
+            bytes_per_sec = (self.trace.bytes_sent + self.trace.bytes_received) / elapsed
+
+        eta = None
+        if (self.progress is not None) and items_per_sec:
+            value, maximum = self.progress
+            eta = max(maximum - max(value, self.n_items), 0) / items_per_sec
+
+        return {
+            "elapsed_sec": elapsed,
+            "n_items": self.n_items,
+            "unit": self.unit,
+            "items_per_sec": items_per_sec,
+            "bytes_per_sec": bytes_per_sec,
+            "progress": self.progress,
+            "eta_sec": eta,
+            "since_last_update_sec": (now - self.last_update_at) if self.last_update_at is not None else None,
+        }
 
 
 class TaskManager:
+    """Schedules tasks on worker threads.
+
+    At most `max_concurrent` jobs run at the same time; other jobs wait in a priority queue
+    (higher priority first, FIFO among jobs of equal priority). Values yielded by generator
+    jobs are coalesced and passed to their `return_func` at most `max_update_rate_hz` times per second.
+    """
+
     def __init__(
         self,
         grayout_ui: Callable,
         ungrayout_ui: Callable,
         progress_update_func: Callable,
         parameters_panel: ParameterPanel,
+        max_concurrent: int = 4,
+        max_update_rate_hz: float = 30.0,
     ):
         self.progress_update_func = progress_update_func
         self.ungrayout_func = ungrayout_ui
         self.grayout_func = grayout_ui
-        self.active_workers = []
         self.parameters_panel = parameters_panel
+        self._max_concurrent = max(1, max_concurrent)
+        self.max_update_rate_hz = max_update_rate_hz
+        self.active_jobs: Dict[int, Job] = {}
+        self._queue: List[Tuple[int, int, Job]] = []  # heap of (-priority, job_id, job)
+        self._job_ids = itertools.count()
+        self._grayed_out = False
+
+    @property
+    def max_concurrent(self) -> int:
+        return self._max_concurrent
+
+    @max_concurrent.setter
+    def max_concurrent(self, max_concurrent: int):
+        self._max_concurrent = max(1, max_concurrent)
+        self._start_pending()
 
     @property
     def n_active(self):
-        return len(self.active_workers)
+        return len(self.active_jobs)
+
+    @property
+    def n_queued(self):
+        return len(self._queue)
+
+    @property
+    def active_workers(self) -> List[WorkerBase]:
+        return [job.worker for job in self.active_jobs.values()]  # type: ignore
+
+    @property
+    def jobs(self) -> List[Job]:
+        """Running jobs followed by queued jobs, in scheduling order."""
+        return list(self.active_jobs.values()) + [
+            job for (_, _, job) in sorted(self._queue)
+        ]
+
+    def add_active(
+        self,
+        task: Callable,
+        return_func: Callable,
+        max_iter: int = 0,
+        priority: int = 0,
+        grayout: bool = True,
+        finished_func: Optional[Callable] = None,
+        trace: Optional[RunTrace] = None,
+        unit: str = "items",
+        cancel_token: Optional[CancelToken] = None,
+        expected_items: Optional[int] = None,
+    ) -> Job:
+        """Schedule a task. `finished_func(job)` is called once the task has stopped and its results were merged.
 
-    def add_active(self, task: Callable, return_func: Callable, max_iter: int = 0):
-        worker = thread_worker(task)()
+        `unit` names the values yielded by generator tasks (tiles, frames...) in the throughput stats of the job.
+        If the number of values is known in advance (`expected_items`), it sets the progress of the job.
+        Tasks that block (eg. on a request) can pass a `cancel_token` to abort in-flight work when the job is cancelled.
+        """
+        job = Job(
+            job_id=next(self._job_ids),
+            task=task,
+            return_func=return_func,
+            max_iter=max_iter,
+            priority=priority,
+            grayout=grayout,
+            finished_func=finished_func,
+            cancel_token=cancel_token,
+        )
+        job.trace = trace
+        job.unit = unit
+        job.expected_items = expected_items
+        job._manager = self
+        heapq.heappush(self._queue, (-priority, job.job_id, job))
+        self._start_pending()
+        self._update_ui_state()
+        return job
 
-        worker.returned.connect(return_func)
-        worker.returned.connect(self._worker_stopped)
-        worker.errored.connect(self._worker_errored)
+    def cancel(self, job: Job):
+        if job.status == "queued":
+            self._queue = [item for item in self._queue if item[2] is not job]
+            heapq.heapify(self._queue)
+            job.status = "cancelled"
+            self._update_ui_state()
+        elif job.status == "running":
+            job.status = "cancelled"
+            job.cancel_token.cancel()
+            if not isinstance(job.worker, GeneratorWorker):
+                # The result of the function is not emitted once it returns
+                # (generator tasks stop by themselves at their next step, closing the generator)
+                job.worker.quit()  # type: ignore
+            if job.coalescer is not None:
+                job.coalescer.discard()
+            # Release the UI and the job slot right away, without waiting for the worker to wind down
+            self._job_stopped(job)
+
+    def cancel_all(self):
+        for job in self.jobs:
+            self.cancel(job)
+
+    def _start_pending(self):
+        while self._queue and (self.n_active < self._max_concurrent):
+            _, _, job = heapq.heappop(self._queue)
+            self._start(job)
+
+    def _start(self, job: Job):
+        worker = thread_worker(cancellable(job.task, job.cancel_token))()
+        job.worker = worker
 
         if isinstance(worker, GeneratorWorker):
-            worker.yielded.connect(return_func)
-            worker.aborted.connect(self._worker_stopped)
+            job.coalescer = ResultsCoalescer(job.return_func, self.max_update_rate_hz)
+            worker.yielded.connect(lambda value: self._job_yielded(job, value))
+        worker.returned.connect(lambda value: self._job_returned(job, value))
+        worker.errored.connect(lambda e: self._worker_errored(job, e))
+        worker.finished.connect(lambda: self._worker_stopped(job))
 
         self.parameters_panel.manage_cbs_events(worker)
 
-        if max_iter > 0:
-            worker.yielded.connect(lambda step: self.progress_update_func(step))
+        if job.max_iter > 0:
+            worker.yielded.connect(
+                lambda step: job.update_progress(step, job.max_iter)
+            )
 
-        self.active_workers.append(worker)
-        self.grayout_func()
+        job.status = "running"
+        job.started_at = time.perf_counter()
+        self.active_jobs[job.job_id] = job
         worker.start()
 
-    def cancel_all(self):
-        for worker in self.active_workers:
-            worker.quit()
-
-    def _worker_stopped(self):
-        self.ungrayout_func()
-        self.active_workers.clear()  # TODO: only stop the worker that finished?
-    
-    def _worker_errored(self, e: Exception):
-        self._worker_stopped()
\ No newline at end of file
+    def _job_yielded(self, job: Job, value):
+        if job.status != "cancelled":
+            job.item_done()
+        self._job_returned(job, value)
+
+    def _job_returned(self, job: Job, value):
+        # Late results of cancelled jobs are dropped
+        if job.status == "cancelled":
+            return
+        if job.coalescer is not None:
+            job.coalescer.push(value)
+        else:
+            job.return_func(value)
+
+    def _worker_stopped(self, job: Job):
+        if job.status == "cancelled":
+            return  # Already released when it was cancelled
+        if job.coalescer is not None:
+            # Flush the final state of the stream
+            job.coalescer.flush()
+        self._job_stopped(job)
+
+    def _job_stopped(self, job: Job):
+        self.active_jobs.pop(job.job_id, None)
+        if job.status == "running":
+            job.status = "finished"
+        job.finished_at = time.perf_counter()
+        if job.finished_func is not None:
+            job.finished_func(job)
+        self._start_pending()
+        self._update_ui_state()
+        self._progress_changed()
+
+    def _worker_errored(self, job: Job, e: Exception):
+        if job.status != "cancelled":
+            job.status = "errored"
+
+    def _update_ui_state(self):
+        grayout = any(job.grayout for job in self.jobs)
+        if grayout and not self._grayed_out:
+            self.grayout_func()
+        elif not grayout and self._grayed_out:
+            self.ungrayout_func()
+        self._grayed_out = grayout
+
+    def _progress_changed(self):
+        progresses = [
+            job.progress for job in self.active_jobs.values() if job.progress is not None
+        ]
+        if progresses:
+            self.progress_update_func(
+                sum(value for (value, _) in progresses),
+                sum(maximum for (_, maximum) in progresses),
+            )
@@ -0,0 +1,198 @@
+"""
+Tiles processed in the viewer's viewport first (nearest its center first), re-prioritized as the user pans and zooms.
+"""
+
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import imaging_server_kit.core._etc as etc
+from imaging_server_kit.core.algorithm import Algorithm
+from imaging_server_kit.core.results import Results
+from imaging_server_kit.core.tiling import generate_nd_tiles
+
+if TYPE_CHECKING:
+    import napari
+
+# Tile orders of the tiled inference UI
+RANDOM = "random"
+RASTER = "raster"
+VIEWPORT_FIRST = "viewport first"
+VISIBLE_ONLY = "visible only"
+TILE_ORDERS = [RANDOM, RASTER, VIEWPORT_FIRST, VISIBLE_ONLY]
+
+
+class Viewport:
+    """Region displayed in the viewer, as (start, stop) pixel indices along the axes of the tiled image.
+
+    Set from the main thread, read by the tiles generators in worker threads.
+    """
+
+    def __init__(self):
+        self._box: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def set(self, box: Optional[Tuple[np.ndarray, np.ndarray]]):
+        with self._lock:
+            self._box = box
+            self._version += 1
+
+    def get(self) -> Tuple[Optional[Tuple[np.ndarray, np.ndarray]], int]:
+        """The box, and a version number that changes whenever it is set."""
+        with self._lock:
+            return self._box, self._version
+
+
+def viewer_camera(viewer: "napari.Viewer"):
+    scene = getattr(viewer, "scene", None)
+    if scene is not None:
+        return scene.camera
+    return viewer.camera  # napari < 0.9
+
+
+def _canvas_size(viewer: "napari.Viewer") -> Tuple[int, int]:
+    canvas = getattr(viewer, "canvas", None)
+    if canvas is not None:
+        return canvas.size
+    return viewer._canvas_size  # napari < 0.6
+
+
+def viewport_box(viewer: "napari.Viewer", layer: "napari.layers.Layer") -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Pixels of `layer` displayed in the canvas, as (start, stop) indices along its axes.
+
+    Along the sliders, only the displayed plane is in the box. None in 3D display.
+    """
+    dims = viewer.dims
+    if dims.ndisplay != 2:
+        return None
+    displayed = list(dims.displayed)
+    camera = viewer_camera(viewer)
+    half_extent = np.array(_canvas_size(viewer), dtype=float) / (2 * camera.zoom)
+    center = np.array(camera.center[-2:], dtype=float)
+    world_start, world_stop = np.array(dims.point, dtype=float), np.array(dims.point, dtype=float)
+    world_start[displayed] = center - half_extent
+    world_stop[displayed] = center + half_extent
+    data_start, data_stop = layer.world_to_data(world_start), layer.world_to_data(world_stop)
+    # Pixel `i` spans [i - 0.5, i + 0.5[ in data coordinates
+    start = np.floor(np.minimum(data_start, data_stop) + 0.5).astype(int)
+    stop = np.floor(np.maximum(data_start, data_stop) + 0.5).astype(int) + 1
+    return start, stop
+
+
+def _tile_bounds(tile_params: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    ndim = tile_params["ndim"]
+    start = np.array([tile_params[f"pos_{axis}"] for axis in range(ndim)])
+    size = np.array([tile_params[f"tile_size_{axis}"] for axis in range(ndim)])
+    return start, start + size
+
+
+def _priority(tile_params: Dict, box: Optional[Tuple[np.ndarray, np.ndarray]]) -> Tuple[bool, float]:
+    """Sort key of a tile: tiles overlapping the box first, then by distance to its center."""
+    if box is None:
+        return (False, 0.0)
+    start, stop = _tile_bounds(tile_params)
+    box_start, box_stop = box[0][-len(start) :], box[1][-len(start) :]  # Eg. the box of a volume, for tiles of a plane
+    if len(box_start) < len(start):
+        return (False, 0.0)
+    overlaps = bool(np.all((start < box_stop) & (stop > box_start)))
+    distance = float(np.linalg.norm((start + stop) / 2 - (box_start + box_stop) / 2))
+    return (not overlaps, distance)
+
+
+def _cut_tile(param_results: Results, tile_info: Dict) -> Optional[Results]:
+    """The tile of each parameter, or None if the tile of any of them is empty (eg. beyond a smaller layer)."""
+    collected = []
+    for layer in param_results:
+        data, meta = layer.get_tile(tile_info)
+        if hasattr(data, "shape") and not all(data.shape):
+            return None
+        collected.append((layer, data, meta))
+    tile_results = Results()
+    for layer, data, meta in collected:
+        tile_results.create(kind=layer.kind, data=data, name=layer.name, meta=meta)
+    return tile_results
+
+
+def generate_tiles(
+    param_results: Results,
+    tile_size_px: int,
+    overlap_percent: float,
+    delay_sec: float,
+    viewport: Viewport,
+    visible_only: bool = False,
+):
+    """Same as `generate_tiles()` of Imaging Server Kit, but the tiles overlapping the `viewport` are yielded first,
+    nearest its center first. The remaining tiles are re-prioritized whenever the viewport changes.
+
+    If `visible_only`, only the tiles overlapping the viewport at the start are yielded. Tiles are numbered in the
+    order they are yielded (the first and last tiles are flagged as such).
+    """
+    pixel_domain = param_results.get_pixel_domain()
+    tiles: List[Dict] = []
+    for tile_meta in generate_nd_tiles(pixel_domain=pixel_domain, tile_size_px=tile_size_px, overlap_percent=overlap_percent):
+        tile_params = dict(tile_meta["tile_params"])
+        for key in ["tile_idx", "n_tiles", "first_tile"]:
+            tile_params.pop(key, None)
+        # Empty tiles are dropped before numbering the tiles, so that the last tile is flagged as such
+        if _cut_tile(param_results, {"tile_params": tile_params}) is not None:
+            tiles.append(tile_params)
+
+    box, version = viewport.get()
+    if visible_only and (box is not None):
+        tiles = [tile_params for tile_params in tiles if not _priority(tile_params, box)[0]]
+    n_tiles = len(tiles)
+    # Sorted by decreasing priority, so that the next tile is popped from the end
+    tiles.sort(key=lambda tile_params: _priority(tile_params, box), reverse=True)
+    tile_idx = 0
+    while tiles:
+        new_box, new_version = viewport.get()
+        if new_version != version:
+            box, version = new_box, new_version
+            tiles.sort(key=lambda tile_params: _priority(tile_params, box), reverse=True)
+        tile_params = tiles.pop()
+        tile_info = {"tile_params": tile_params | {"tile_idx": tile_idx, "n_tiles": n_tiles}}
+        if tile_idx == 0:
+            tile_info["tile_params"]["first_tile"] = True
+        yield _cut_tile(param_results, tile_info), tile_info
+        tile_idx += 1
+        time.sleep(delay_sec)
+
+
+def tiles_generator(
+    param_results: Results,
+    tile_size_px: int,
+    overlap_percent: float,
+    delay_sec: float,
+    randomize: bool,
+    viewport: Optional[Viewport] = None,
+    visible_only: bool = False,
+):
+    """Tiles in viewport order if a `viewport` is given, otherwise in raster (or random) order."""
+    if viewport is None:
+        return etc.generate_tiles(param_results, tile_size_px, overlap_percent, delay_sec, randomize)
+    return generate_tiles(param_results, tile_size_px, overlap_percent, delay_sec, viewport, visible_only)
+
+
+def tile_by_viewport(
+    runner: Algorithm,
+    algorithm: str,
+    tile_size_px: int,
+    overlap_percent: float,
+    delay_sec: float,
+    randomize: bool,
+    param_results: Results,
+    viewport: Optional[Viewport] = None,
+    visible_only: bool = False,
+):
+    """Same as `Algorithm._tile()`, with the tiles in viewport order."""
+    for tile_results, tile_info in tiles_generator(
+        param_results, tile_size_px, overlap_percent, delay_sec, randomize, viewport, visible_only
+    ):
+        results = runner._run(algorithm, tile_results)
+        if results is not None:
+            for layer in results:
+                layer.meta = layer.meta | tile_info
+            yield results
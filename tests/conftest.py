@@ -0,0 +1,4 @@
+import os
+
+# The Qt tests run without a display (set before Qt creates the application)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
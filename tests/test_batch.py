@@ -0,0 +1,61 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+tifffile = pytest.importorskip("tifffile")
+
+import imaging_server_kit as sk
+
+from napari_serverkit.batch import LOG_FILE_NAME, BatchRunner, input_root, main
+
+
+@sk.algorithm(name="threshold", parameters={"image": sk.Image(), "t": sk.Float(default=0.5)})
+def threshold(image: np.ndarray, t: float = 0.5):
+    return [sk.Mask((image > t).astype(np.uint16), name="Mask"), sk.Float(float((image > t).mean()), name="fraction")]
+
+
+@pytest.fixture
+def plates(tmp_path):
+    """Two plates with images of the same name."""
+    for plate, value in [("plate1", 0.2), ("plate2", 0.8)]:
+        os.makedirs(tmp_path / "plates" / plate)
+        tifffile.imwrite(tmp_path / "plates" / plate / "A01.tif", np.full((8, 8), value))
+    return tmp_path
+
+
+def test_input_root():
+    assert input_root(os.path.join("plates", "**", "*.tif")) == "plates"
+    assert input_root("*.tif") == "."
+    assert input_root(os.path.join("plates", "A01.tif")) == "plates"
+
+
+def test_outputs_mirror_the_input_folders(plates):
+    output_dir = str(plates / "results")
+    code = main([f"{__name__}:threshold", str(plates / "plates" / "**" / "*.tif"), "-o", output_dir, "-w", "2"])
+    assert code == 0
+    for plate, expected in [("plate1", 0), ("plate2", 1)]:
+        mask = tifffile.imread(os.path.join(output_dir, plate, "A01_Mask.tif"))
+        assert (mask == expected).all()
+    with open(os.path.join(output_dir, LOG_FILE_NAME)) as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(record["values"]["fraction"] for record in records) == [0.0, 1.0]
+
+
+def test_colliding_outputs_are_rejected(tmp_path):
+    runner = BatchRunner(threshold, "threshold", {}, str(tmp_path / "results"))  # No input root: file names only
+    with pytest.raises(ValueError):
+        runner.run([str(tmp_path / "plate1" / "A01.tif"), str(tmp_path / "plate2" / "A01.tif")])
+
+
+def test_resume_skips_completed_inputs(plates, capsys):
+    args = [f"{__name__}:threshold", str(plates / "plates"), "-o", str(plates / "results")]
+    os.rename(plates / "plates" / "plate1" / "A01.tif", plates / "plates" / "A01.tif")
+    assert main(args) == 0
+    tifffile.imwrite(plates / "plates" / "A02.tif", np.zeros((8, 8)))
+    assert main(args) == 0
+    assert "Skipping 1 inputs" in capsys.readouterr().err
+    with open(plates / "results" / LOG_FILE_NAME) as f:
+        inputs = [json.loads(line)["input"] for line in f]
+    assert sorted(os.path.basename(name) for name in inputs) == ["A01.tif", "A02.tif"]
@@ -0,0 +1,178 @@
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import msgpack
+import numpy as np
+import pytest
+
+import imaging_server_kit as sk
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.cancellation import CancelledError, CancelToken
+from napari_serverkit.widgets.http_transfer import (
+    IDENTITY,
+    negotiate_encodings,
+    parse_accept_encoding,
+    post_process,
+    post_stream,
+)
+from napari_serverkit.widgets.run_trace import RunTrace
+
+SLOW_SEC = 5.0
+
+
+def _serialized_frame(value: float):
+    results = Results()
+    results.create(kind="image", data=np.full((4, 4), value, dtype=np.float32), name="Frame")
+    return results.serialize("Python/Napari")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """/<algorithm>/process echoes the mean of the image; "slow" algorithms do not respond; "gzip_only" ones reject
+    uncompressed requests and "identity_only" ones compressed requests. /<algorithm>/stream sends a frame, then waits."""
+
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        encoding = self.headers.get("Content-Encoding", IDENTITY)
+        self.requests.append((self.path, encoding, len(body)))
+        algorithm, route = self.path.strip("/").split("/")
+        if (algorithm == "identity_only") and (encoding != IDENTITY):
+            return self._reply(415, b"")
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        if algorithm == "slow":
+            time.sleep(SLOW_SEC)
+            return
+        if route == "stream":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/msgpack")
+            self.end_headers()
+            for layer in _serialized_frame(1.0):
+                self.wfile.write(msgpack.packb(layer))
+            self.wfile.flush()
+            time.sleep(SLOW_SEC)
+            return
+        params = json.loads(body)
+        self._reply(201, json.dumps(_serialized_frame(float(len(params)))).encode())
+
+
+@pytest.fixture
+def client():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Handler.requests = []
+    client = sk.Client()
+    client.server_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield client
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def param_results() -> Results:
+    param_results = Results()
+    param_results.create(kind="image", data=np.zeros((64, 64), dtype=np.float32), name="image")
+    return param_results
+
+
+def _cancel_after(delay_sec: float) -> CancelToken:
+    cancel_token = CancelToken()
+    threading.Timer(delay_sec, cancel_token.cancel).start()
+    return cancel_token
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding(None) == []
+    assert parse_accept_encoding("gzip, deflate;q=0.5, br;q=0, ZSTD") == ["gzip", "deflate", "zstd"]
+
+
+def test_negotiate_encodings():
+    assert negotiate_encodings([]) == [IDENTITY]
+    assert negotiate_encodings(["gzip", "compress"]) == [IDENTITY, "gzip"]
+    assert negotiate_encodings(["*"])[:3] == [IDENTITY, "gzip", "deflate"]
+
+
+@pytest.mark.parametrize("encoding", [IDENTITY, "gzip"])
+def test_post_process(client, param_results, encoding):
+    results = post_process(client, "echo", param_results, RunTrace(0, "echo"), encoding)
+    np.testing.assert_array_equal(results.read("Frame").data, 1)
+    (path, sent_encoding, _), = _Handler.requests
+    assert (path, sent_encoding) == ("/echo/process", encoding)
+
+
+def test_compressed_requests_are_smaller(client, param_results):
+    for encoding in [IDENTITY, "gzip"]:
+        post_process(client, "echo", param_results, RunTrace(0, "echo"), encoding)
+    (_, _, identity_size), (_, _, gzip_size) = _Handler.requests
+    assert gzip_size < identity_size / 10
+
+
+def test_rejected_encodings_fall_back_to_identity(client, param_results):
+    results = post_process(client, "identity_only", param_results, RunTrace(0, "echo"), "gzip")
+    assert results.read("Frame") is not None
+    assert [encoding for (_, encoding, _) in _Handler.requests] == ["gzip", IDENTITY]
+
+
+@pytest.mark.parametrize("encoding", [IDENTITY, "gzip"])
+def test_requests_in_flight_are_aborted(client, param_results, encoding):
+    t_start = time.perf_counter()
+    with pytest.raises(CancelledError):
+        post_process(client, "slow", param_results, RunTrace(0, "slow"), encoding, _cancel_after(0.2))
+    assert time.perf_counter() - t_start < SLOW_SEC / 2
+
+
+def test_streams_in_flight_are_aborted(client, param_results):
+    cancel_token = CancelToken()
+    frames = post_stream(client, "echo", param_results, RunTrace(0, "echo"), cancel_token)
+    assert next(frames).read("Frame") is not None
+    threading.Timer(0.2, cancel_token.cancel).start()
+    t_start = time.perf_counter()
+    with pytest.raises(CancelledError):
+        next(frames)
+    assert time.perf_counter() - t_start < SLOW_SEC / 2
+
+
+def _phases(trace: RunTrace):
+    return list(trace.summary())
+
+
+@pytest.mark.parametrize("encoding", [IDENTITY, "gzip"])
+def test_requests_are_traced(client, param_results, encoding):
+    trace = RunTrace(0, "echo")
+    post_process(client, "echo", param_results, trace, encoding)
+    expected = ["serialize", "upload", "server", "download", "deserialize"]
+    if encoding != IDENTITY:
+        expected.insert(1, "compress")
+    assert _phases(trace) == expected
+    (_, _, request_size), = _Handler.requests
+    assert trace.bytes_sent == request_size
+    assert trace.bytes_received > 0
+
+
+def test_streams_are_traced(client, param_results):
+    trace = RunTrace(0, "echo")
+    cancel_token = _cancel_after(0.2)
+    frames = post_stream(client, "echo", param_results, trace, cancel_token)
+    next(frames)
+    assert _phases(trace) == ["serialize", "upload", "server", "download", "deserialize"]
+    (_, _, request_size), = _Handler.requests
+    assert trace.bytes_sent == request_size
+    assert trace.bytes_received > 0
+    frames.close()
@@ -0,0 +1,44 @@
+import json
+import subprocess
+import sys
+
+IMPORT_TIME_BUDGET_SEC = 0.2
+
+HEAVY_MODULES = ["napari", "qtpy", "imaging_server_kit"]
+
+
+def _import_in_subprocess(statement: str) -> dict:
+    code = (
+        "import json, sys, time\n"
+        "t_start = time.perf_counter()\n"
+        f"{statement}\n"
+        "elapsed = time.perf_counter() - t_start\n"
+        f"print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_package_import_is_lazy():
+    report = _import_in_subprocess("import napari_serverkit")
+    assert report["loaded"] == []
+    assert report["elapsed"] < IMPORT_TIME_BUDGET_SEC
+
+
+def test_version_import_is_lazy():
+    report = _import_in_subprocess("from napari_serverkit import __version__")
+    assert report["loaded"] == []
+    assert report["elapsed"] < IMPORT_TIME_BUDGET_SEC
+
+
+def test_widgets_are_loaded_on_access():
+    report = _import_in_subprocess("from napari_serverkit import NapariResults")
+    assert "imaging_server_kit" in report["loaded"]
+
+
+def test_batch_runner_is_headless():
+    report = _import_in_subprocess("import napari_serverkit.batch")
+    assert "napari" not in report["loaded"]
+    assert "qtpy" not in report["loaded"]
@@ -0,0 +1,175 @@
+import napari
+import numpy as np
+import pytest
+from napari.components import ViewerModel
+
+from imaging_server_kit.core.results import Results
+from imaging_server_kit.core.tiling import generate_nd_tiles
+
+from napari_serverkit.widgets import napari_results as napari_results_module
+from napari_serverkit.widgets.napari_results import NapariResults, _labels_data
+
+
+@pytest.fixture
+def napari_results() -> NapariResults:
+    viewer = ViewerModel()
+    viewer.add_image(np.zeros((8, 8)), name="image")
+    return NapariResults(viewer)
+
+
+def test_labels_data_keeps_integer_buffers():
+    data = np.arange(6, dtype=np.int64).reshape(2, 3)
+    assert _labels_data(data) is data
+    mask = np.array([[True, False]])
+    assert _labels_data(mask).dtype == np.uint8
+    assert np.shares_memory(_labels_data(mask), mask)
+
+
+def test_labels_data_of_float_masks():
+    labels = _labels_data(np.array([[0.0, 1.0], [2.0, 70000.0]]))
+    assert labels.dtype == np.uint32
+    np.testing.assert_array_equal(labels, [[0, 1], [2, 70000]])
+
+
+def test_labels_data_of_non_finite_masks():
+    labels = _labels_data(np.array([[np.nan, 1.0], [np.inf, -np.inf]], dtype=np.float32))
+    assert labels.dtype == np.uint8
+    np.testing.assert_array_equal(labels, [[0, 1], [0, 0]])
+    assert _labels_data(np.full((2, 2), np.nan)).dtype == np.uint8
+
+
+def test_kept_label_buffers():
+    napari_results = NapariResults(ViewerModel(), keep_label_buffers=True)
+    data = np.zeros((8, 8), dtype=np.int32)
+    napari_results.create("mask", data, "mask")
+    assert napari_results.viewer.layers["mask"].data is data
+    # Also on updates
+    data = np.ones((8, 8), dtype=np.int32)
+    napari_results.update("mask", data, {})
+    assert napari_results.viewer.layers["mask"].data is data
+    # Float masks are still converted, since napari Labels only support integers
+    with pytest.warns(UserWarning, match="float32"):
+        napari_results.update("mask", np.full((8, 8), 2, dtype=np.float32), {})
+    assert napari_results.viewer.layers["mask"].data.dtype == np.uint8
+    np.testing.assert_array_equal(napari_results.viewer.layers["mask"].data, 2)
+
+
+def test_layers_are_indexed_by_name(napari_results):
+    viewer = napari_results.viewer
+    assert napari_results.read("image").kind == "image"
+    mask = napari_results.create("mask", np.zeros((8, 8), dtype=np.uint8), "mask")
+    assert viewer.layers[-1].name == "mask"
+    assert len(napari_results) == 2
+
+    napari_results.update("mask", np.ones((8, 8), dtype=np.uint8), {})
+    np.testing.assert_array_equal(viewer.layers["mask"].data, 1)
+
+    viewer.layers["mask"].name = "renamed"
+    assert napari_results.read("mask") is None
+    assert napari_results.read("renamed") is mask
+    napari_results.update("renamed", np.full((8, 8), 2, dtype=np.uint8), {})
+    np.testing.assert_array_equal(viewer.layers["renamed"].data, 2)
+
+
+def test_deleted_layers(napari_results):
+    viewer = napari_results.viewer
+    napari_results.create("mask", np.zeros((8, 8), dtype=np.uint8), "mask")
+    napari_results.delete("mask")
+    assert "mask" not in viewer.layers
+    assert napari_results.read("mask") is None
+    # Removed from the viewer
+    viewer.layers.remove("image")
+    assert napari_results.read("image") is None
+    assert len(napari_results) == 0
+    assert not napari_results._napari_layers and not napari_results._napari_layer_names
+
+
+def test_layers_edited_in_the_viewer_are_synced(napari_results):
+    shapes = napari_results.viewer.add_shapes([np.array([[0, 0], [0, 4], [4, 4], [4, 0]])], shape_type="rectangle", name="boxes")
+    boxes = napari_results.read_synced("boxes").data
+    assert boxes.shape == (1, 4, 2)
+    # Only converted again once edited
+    assert napari_results.read_synced("boxes").data is boxes
+    shapes.add_rectangles(np.array([[1, 1], [1, 5], [5, 5], [5, 1]]))
+    assert napari_results.read_synced("boxes").data.shape == (2, 4, 2)
+
+
+def _tiles(kind: str, tile_indices):
+    """Layer stack of the given tiles of a 64 x 64 output (16 tiles of 16 x 16 pixels), as merged in one flush."""
+    dtype = np.float32 if kind == "image" else np.uint8
+    tiles = list(generate_nd_tiles(pixel_domain=np.array([64, 64]), tile_size_px=16))
+    layer_stack = Results()
+    for tile_idx in tile_indices:
+        # Appended rather than created, since all the tiles have the same name
+        layer_stack.layers.append(
+            Results().create(kind=kind, data=np.full((16, 16), tile_idx + 1, dtype=dtype), name="Output", meta=tiles[tile_idx])
+        )
+    return layer_stack
+
+
+@pytest.fixture
+def refresh_counts(monkeypatch):
+    """Full refreshes of each kind of napari layer."""
+    counts = {"image": 0, "mask": 0, "partial": 0}
+    for kind, layer_type in [("image", napari.layers.Image), ("mask", napari.layers.Labels)]:
+        def counted_refresh(self, *args, _kind=kind, _refresh=layer_type.refresh, **kwargs):
+            counts[_kind] += 1
+            return _refresh(self, *args, **kwargs)
+        monkeypatch.setattr(layer_type, "refresh", counted_refresh)
+    partial_labels_refresh = napari_results_module._partial_labels_refresh
+    def counted_partial_refresh(*args):
+        counts["partial"] += 1
+        return partial_labels_refresh(*args)
+    monkeypatch.setattr(napari_results_module, "_partial_labels_refresh", counted_partial_refresh)
+    return counts
+
+
+@pytest.mark.parametrize("kind", ["image", "mask"])
+def test_tiles_of_a_flush_are_refreshed_once(napari_results, refresh_counts, kind):
+    napari_results.merge(_tiles(kind, [0]))
+    output = napari_results.viewer.layers["Output"].data
+    refresh_counts.update(image=0, mask=0, partial=0)
+
+    napari_results.merge(_tiles(kind, [1, 2, 4, 5]))
+    if kind == "mask":
+        assert refresh_counts == {"image": 0, "mask": 0, "partial": 1}
+    else:
+        assert refresh_counts == {"image": 1, "mask": 0, "partial": 0}
+    np.testing.assert_array_equal(output[16:32, 16:32], 6)
+    np.testing.assert_array_equal(output[32:, :], 0)
+
+    # The last tile refreshes the whole layer
+    refresh_counts.update(image=0, mask=0, partial=0)
+    napari_results.merge(_tiles(kind, [14, 15]))
+    assert refresh_counts[kind] == 1 and refresh_counts["partial"] == 0
+
+
+def test_meta_events_are_emitted_once(napari_results):
+    layer = napari_results.viewer.layers["image"]
+    emitted = []
+    layer.events.connect(lambda event: emitted.append(event.type))
+    with pytest.warns(UserWarning, match="gamma"):
+        napari_results.update("image", np.ones((8, 8)), {"opacity": 0.5, "blending": "additive", "gamma": "invalid"})
+    assert emitted.count("opacity") == 1
+    assert emitted.count("blending") == 1
+    assert "gamma" not in emitted
+    assert (layer.opacity, layer.blending) == (0.5, "additive")
+
+    # Already applied
+    emitted.clear()
+    with pytest.warns(UserWarning, match="gamma"):
+        napari_results.update("image", np.ones((8, 8)), {"opacity": 0.5, "gamma": "invalid"})
+    assert "opacity" not in emitted
+
+
+def test_tiled_outputs_are_memory_mapped(tmp_path):
+    napari_results = NapariResults(ViewerModel(), memmap_tiled_outputs=True, scratch_dir=str(tmp_path))
+    napari_results.merge(_tiles("mask", [0, 5]))
+    output = napari_results.viewer.layers["Output"].data
+    assert isinstance(output, np.memmap)
+    assert len(list(tmp_path.iterdir())) == 1
+    np.testing.assert_array_equal(output[16:32, 16:32], 6)
+    np.testing.assert_array_equal(output[32:, :], 0)
+
+    napari_results.delete("Output")
+    assert not list(tmp_path.iterdir())
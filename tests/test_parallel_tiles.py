@@ -0,0 +1,92 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import imaging_server_kit as sk
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.cancellation import CancelToken
+from napari_serverkit.widgets.parallel_tiles import is_picklable, tile_in_parallel
+
+N_TILES = 16
+
+n_runs = 0
+n_runs_lock = threading.Lock()
+
+
+@sk.algorithm(name="threshold", parameters={"image": sk.Image(), "t": sk.Float(default=0.5)})
+def threshold(image: np.ndarray, t: float = 0.5):
+    global n_runs
+    with n_runs_lock:
+        n_runs += 1
+    # The first tiles (of higher values) take longer, so that tiles complete out of order
+    time.sleep(0.02 * float(image.mean()))
+    return [sk.Mask((image > t).astype(np.uint16), name="Mask")]
+
+
+@pytest.fixture
+def param_results() -> Results:
+    image = np.linspace(2, 0, 64 * 64).reshape(64, 64)
+    param_results = Results()
+    param_results.create(kind="image", data=image, name="image")
+    param_results.create(kind="float", data=0.5, name="t")
+    return param_results
+
+
+def _tiles(param_results: Results, **kwargs):
+    return list(tile_in_parallel(threshold, "threshold", 16, 0, 0, False, param_results, **kwargs))
+
+
+def _stitched(tiles, shape) -> np.ndarray:
+    output = np.zeros(shape, dtype=np.uint16)
+    for results in tiles:
+        layer = results.read("Mask")
+        tile_params = layer.meta["tile_params"]
+        output[
+            tile_params["pos_0"] : tile_params["pos_0"] + tile_params["tile_size_0"],
+            tile_params["pos_1"] : tile_params["pos_1"] + tile_params["tile_size_1"],
+        ] = layer.data
+    return output
+
+
+def _tile_params(tiles):
+    return [results.read("Mask").meta["tile_params"] for results in tiles]
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_all_tiles_are_processed(param_results, ordered):
+    tiles = _tiles(param_results, n_workers=4, ordered=ordered)
+    image = param_results.read("image").data
+    np.testing.assert_array_equal(_stitched(tiles, image.shape), image > 0.5)
+    tile_params = _tile_params(tiles)
+    # Numbered in the order they are yielded, so that the first and last tiles are flagged as such
+    assert [params["tile_idx"] for params in tile_params] == list(range(N_TILES))
+    assert all(params["n_tiles"] == N_TILES for params in tile_params)
+    assert [bool(params.get("first_tile")) for params in tile_params] == [True] + [False] * (N_TILES - 1)
+
+
+def test_ordered_tiles_are_yielded_in_raster_order(param_results):
+    tile_params = _tile_params(_tiles(param_results, n_workers=4, ordered=True))
+    positions = [(params["pos_0"], params["pos_1"]) for params in tile_params]
+    assert positions == sorted(positions)
+
+
+def test_cancelled_runs_stop_scheduling_tiles(param_results):
+    global n_runs
+    n_runs = 0
+    cancel_token = CancelToken()
+    tiles = tile_in_parallel(threshold, "threshold", 16, 0, 0, False, param_results, n_workers=2, cancel_token=cancel_token)
+    next(tiles)
+    cancel_token.cancel()
+    assert list(tiles) == []
+    time.sleep(0.1)  # Tiles in flight complete in the background
+    # At most two tiles per worker are in flight
+    assert n_runs <= 1 + 2 * 2
+    assert n_runs < N_TILES
+
+
+def test_is_picklable(param_results):
+    assert is_picklable(param_results)
+    assert not is_picklable(threading.Lock())
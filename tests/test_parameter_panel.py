@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from napari.components import ViewerModel
+
+from napari_serverkit.widgets.napari_results import NapariResults
+from napari_serverkit.widgets.parameter_panel import ParameterPanel
+
+DELAY_MS = 50
+
+SCHEMA = {
+    "properties": {
+        "image": {"param_type": "image", "title": "Image"},
+        "threshold": {
+            "param_type": "float",
+            "title": "Threshold",
+            "default": 0.5,
+            "minimum": 0.0,
+            "maximum": 1.0,
+            "auto_call": True,
+        },
+    }
+}
+
+
+@pytest.fixture
+def triggers():
+    return []
+
+
+@pytest.fixture
+def panel(qapp, triggers) -> ParameterPanel:
+    viewer = ViewerModel()
+    viewer.add_image(np.zeros((8, 8)), name="image")
+    viewer.add_labels(np.zeros((8, 8), dtype=np.uint8), name="mask")
+    panel = ParameterPanel(lambda: triggers.append(panel.get_param_values()[0]), NapariResults(viewer), DELAY_MS)
+    panel.update(SCHEMA, panel_key=("server", "threshold"))
+    return panel
+
+
+def _items(cb):
+    return [cb.itemText(idx) for idx in range(cb.count())]
+
+
+def test_auto_call_is_debounced(qtbot, panel, triggers):
+    spinbox = panel.ui_state["threshold"][1]
+    for value in [0.1, 0.2, 0.3]:
+        spinbox.setValue(value)
+    qtbot.waitUntil(lambda: len(triggers) > 0, timeout=1000)
+    qtbot.wait(2 * DELAY_MS)
+    # Once, with the settled value
+    assert triggers == [{"threshold": 0.3}]
+
+
+def test_panels_are_reused(panel):
+    page = panel.stack.currentWidget()
+    panel.ui_state["threshold"][1].setValue(0.8)
+
+    panel.update({"properties": {}}, panel_key=("server", "other"))
+    assert panel.stack.currentWidget() is not page
+    panel.update(SCHEMA, panel_key=("server", "threshold"))
+    assert panel.stack.currentWidget() is page
+    assert panel.get_param_values()[0] == {"threshold": 0.8}  # Kept
+
+    # Outdated schema of the same algorithm
+    schema = {"properties": dict(SCHEMA["properties"], extra={"param_type": "str", "title": "Extra", "default": ""})}
+    panel.update(schema, panel_key=("server", "threshold"))
+    assert panel.stack.currentWidget() is not page
+    assert len(panel._panels) == 2
+    assert "extra" in panel.ui_state
+
+
+def test_layer_comboboxes_follow_the_viewer(panel):
+    viewer = panel.napari_results.viewer
+    cb = panel.layer_comboboxes["image"][0]
+    assert _items(cb) == ["image"]
+    cb.setCurrentText("image")
+
+    viewer.add_image(np.zeros((8, 8)), name="other")
+    viewer.add_points(np.zeros((1, 2)), name="points")
+    assert _items(cb) == ["image", "other"]
+
+    viewer.layers["image"].name = "renamed"
+    assert _items(cb) == ["renamed", "other"]
+    assert cb.currentText() == "renamed"  # The selection is kept
+
+    viewer.layers.remove("other")
+    assert _items(cb) == ["renamed"]
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.pipeline import PipelineStep, run_pipeline
+
+IMAGE_PARAMS = {"image": {"param_type": "image"}}
+
+
+def _run_step(algorithm: str, param_results: Results) -> Results:
+    image = param_results.read("image").data
+    results = Results()
+    results.create(kind="image", data=image + 1, name=f"{algorithm} output")
+    return results
+
+
+def test_steps_are_wired_to_previous_outputs():
+    steps = [
+        PipelineStep("first", IMAGE_PARAMS, {}, {"image": "input"}, materialize=False),
+        PipelineStep("second", IMAGE_PARAMS, {}, {"image": "first output"}),
+    ]
+    outputs = list(run_pipeline(steps, _run_step, {"input": np.zeros((4, 4))}))
+    assert outputs[0] is None  # Not materialized
+    np.testing.assert_array_equal(outputs[1].read("second output").data, 2)
+
+
+def test_missing_inputs():
+    steps = [PipelineStep("first", IMAGE_PARAMS, {}, {"image": "missing"})]
+    with pytest.raises(ValueError, match="missing"):
+        list(run_pipeline(steps, _run_step, {}))
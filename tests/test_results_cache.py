@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.results_cache import ResultsCache, fingerprint
+
+
+def _params(image: np.ndarray, threshold: float = 0.5) -> Results:
+    algo_params = Results()
+    algo_params.create(kind="image", data=image, name="image")
+    algo_params.create(kind="float", data=threshold, name="threshold")
+    return algo_params
+
+
+def _results(nbytes: int, value: int = 0) -> Results:
+    results = Results()
+    results.create(kind="mask", data=np.full(nbytes, value, dtype=np.uint8), name="mask")
+    return results
+
+
+def test_key_depends_on_the_data_and_parameters():
+    image = np.zeros((64, 64), dtype=np.float32)
+    key = ResultsCache.make_key("server", "threshold", _params(image))
+    assert key == ResultsCache.make_key("server", "threshold", _params(image.copy()))
+    assert key != ResultsCache.make_key("server", "threshold", _params(image, threshold=0.6))
+    assert key != ResultsCache.make_key("server", "other", _params(image))
+    assert key != ResultsCache.make_key("other server", "threshold", _params(image))
+    assert key != ResultsCache.make_key("server", "threshold", _params(image.astype(np.float64)))
+    edited = image.copy()
+    edited[10, 20] = 1
+    assert key != ResultsCache.make_key("server", "threshold", _params(edited))
+
+
+def test_small_edits_of_large_arrays_change_the_fingerprint():
+    data = np.zeros((96, 1024, 1024), dtype=np.uint8)
+    before = fingerprint(data)
+    data[50, 123, 457] = 1
+    assert fingerprint(data) != before
+
+
+def test_fingerprint_of_non_contiguous_arrays():
+    data = np.arange(24, dtype=np.int32).reshape(2, 3, 4)
+    assert fingerprint(data.transpose()) == fingerprint(np.ascontiguousarray(data.transpose()))
+    assert fingerprint(data.transpose()) != fingerprint(data.reshape(4, 3, 2))
+
+
+def test_cached_results_are_copies():
+    cache = ResultsCache()
+    results = _results(16)
+    cache.put("key", results)
+    results.read("mask").data[:] = 1
+    cached = cache.get("key")
+    np.testing.assert_array_equal(cached.read("mask").data, 0)
+    cached.read("mask").data[:] = 2
+    np.testing.assert_array_equal(cache.get("key").read("mask").data, 0)
+    assert cache.get("missing") is None
+
+
+@pytest.fixture
+def cache(tmp_path) -> ResultsCache:
+    return ResultsCache(max_memory_bytes=2000, max_disk_bytes=2000, cache_dir=str(tmp_path / "cache"))
+
+
+def test_least_recently_used_results_spill_to_disk(cache):
+    for idx in range(3):
+        cache.put(idx, _results(1000, value=idx))
+    assert cache.get(0) is not None  # Most recently used
+    cache.put(3, _results(1000, value=3))
+    assert len(cache._memory) == 2 and len(cache._disk) == 2
+    assert set(cache._memory) == {0, 3}
+    # Reloaded from disk
+    np.testing.assert_array_equal(cache.get(1).read("mask").data, 1)
+    assert 1 in cache._memory
+
+
+def test_disk_eviction(cache):
+    for idx in range(6):
+        cache.put(idx, _results(1000, value=idx))
+    assert len(cache) == 4
+    assert all(idx not in cache for idx in range(2))
+    assert cache._disk_bytes <= cache.max_disk_bytes
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_no_spill_over():
+    cache = ResultsCache(max_memory_bytes=2000, max_disk_bytes=0)
+    for idx in range(3):
+        cache.put(idx, _results(1000, value=idx))
+    assert 0 not in cache
+    assert len(cache) == 2
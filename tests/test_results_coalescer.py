@@ -0,0 +1,75 @@
+import numpy as np
+
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.results_coalescer import ResultsCoalescer
+
+
+def _frame(value: int) -> Results:
+    results = Results()
+    results.create(kind="image", data=np.full((4, 4), value), name="Frame")
+    results.create(kind="int", data=value, name="Count")
+    return results
+
+
+def _tile(tile_idx: int) -> Results:
+    results = Results()
+    tile_params = {"tile_idx": tile_idx, "n_tiles": 4, "ndim": 2, "pos_0": 0, "pos_1": 2 * tile_idx, "tile_size_0": 2, "tile_size_1": 2}
+    results.create(kind="mask", data=np.full((2, 2), tile_idx, dtype=np.uint8), name="Mask", meta={"tile_params": tile_params})
+    return results
+
+
+def test_latest_state_of_each_layer_is_merged(qapp):
+    merged = []
+    coalescer = ResultsCoalescer(merged.append, max_rate_hz=30)
+    for value in range(5):
+        coalescer.push(_frame(value))
+    coalescer.push(None)
+    assert not merged
+    assert coalescer.n_pending == 2
+    coalescer.flush()
+    assert len(merged) == 1
+    assert [layer.name for layer in merged[0]] == ["Frame", "Count"]
+    assert merged[0].read("Count").data == 4
+    coalescer.flush()
+    assert len(merged) == 1
+
+
+def test_all_tiles_are_merged(qapp):
+    merged = []
+    coalescer = ResultsCoalescer(merged.append, max_rate_hz=30)
+    for tile_idx in range(4):
+        coalescer.push(_tile(tile_idx))
+    coalescer.flush()
+    assert [layer.meta["tile_params"]["tile_idx"] for layer in merged[0]] == [0, 1, 2, 3]
+
+
+def test_merges_are_rate_limited(qtbot):
+    merged = []
+    coalescer = ResultsCoalescer(merged.append, max_rate_hz=5)
+    coalescer.push(_frame(0))
+    qtbot.waitUntil(lambda: len(merged) == 1, timeout=1000)
+    coalescer.push(_frame(1))
+    coalescer.push(_frame(2))
+    qtbot.wait(10)
+    assert len(merged) == 1  # Within 200 ms of the previous merge
+    qtbot.waitUntil(lambda: len(merged) == 2, timeout=1000)
+    assert merged[1].read("Count").data == 2
+
+
+def test_unlimited_rate(qapp):
+    merged = []
+    coalescer = ResultsCoalescer(merged.append, max_rate_hz=0)
+    for value in range(3):
+        coalescer.push(_frame(value))
+    assert [results.read("Count").data for results in merged] == [0, 1, 2]
+
+
+def test_discarded_layers_are_not_merged(qtbot):
+    merged = []
+    coalescer = ResultsCoalescer(merged.append, max_rate_hz=20)
+    coalescer.push(_frame(0))
+    coalescer.discard()
+    assert coalescer.n_pending == 0
+    qtbot.wait(100)
+    assert not merged
@@ -0,0 +1,91 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.sample_cache import SampleCache
+
+
+def _sample(value: float = 1.0, shape=(64, 64)) -> Results:
+    sample = Results()
+    sample.create(kind="image", data=np.full(shape, value, dtype=np.float32), name="image", meta={"contrast_limits": [0, 1]})
+    sample.create(kind="float", data=0.5, name="threshold")
+    return sample
+
+
+@pytest.fixture
+def cache(tmp_path) -> SampleCache:
+    return SampleCache(cache_dir=str(tmp_path / "samples"))
+
+
+def test_key_depends_on_the_server_state():
+    key = SampleCache.make_key("http://localhost:8000", "threshold", 0, "digest")
+    assert key == SampleCache.make_key("http://localhost:8000", "threshold", 0, "digest")
+    assert key != SampleCache.make_key("http://localhost:8000", "threshold", 1, "digest")
+    assert key != SampleCache.make_key("http://localhost:8000", "threshold", 0, "other digest")
+
+
+def test_samples_are_loaded_memory_mapped(cache):
+    key = SampleCache.make_key("server", "threshold", 0, "digest")
+    assert cache.get(key) is None
+    cache.put(key, _sample(0.2))
+    assert key in cache
+    sample = cache.get(key)
+    image, threshold = sample.read("image"), sample.read("threshold")
+    assert isinstance(image.data, np.memmap)
+    np.testing.assert_array_equal(image.data, np.full((64, 64), 0.2, dtype=np.float32))
+    assert image.meta["contrast_limits"] == [0, 1]
+    assert threshold.data == 0.5
+    # Copy-on-write: edits in the viewer do not change the cached sample
+    image.data[:] = 0
+    np.testing.assert_array_equal(cache.get(key).read("image").data, np.full((64, 64), 0.2, dtype=np.float32))
+
+
+def test_least_recently_used_samples_are_evicted(cache):
+    keys = [SampleCache.make_key("server", "threshold", idx, "digest") for idx in range(3)]
+    for t, key in enumerate(keys):
+        cache.put(key, _sample(shape=(256, 256)))
+        os.utime(os.path.join(cache.cache_dir, key), (t, t))
+    sample_bytes = cache.size_bytes // 3
+    cache.max_bytes = 2 * sample_bytes
+    cache.evict()
+    assert [key in cache for key in keys] == [False, True, True]
+    cache.clear()
+    assert cache.size_bytes == 0
+
+
+def test_disabled_cache(tmp_path):
+    cache = SampleCache(cache_dir=str(tmp_path / "samples"), max_bytes=0)
+    assert not cache.enabled
+    key = SampleCache.make_key("server", "threshold", 0, "digest")
+    cache.put(key, _sample())
+    assert key not in cache
+
+
+def test_concurrent_fetches_share_a_download(cache):
+    key = SampleCache.make_key("server", "threshold", 0, "digest")
+    started, release = threading.Event(), threading.Event()
+    downloads = []
+
+    def download():
+        downloads.append(key)
+        started.set()
+        release.wait(5)
+        return _sample(0.7)
+
+    fetched = []
+    threads = [threading.Thread(target=lambda: fetched.append(cache.fetch(key, download))) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(downloads) == 1
+    assert len(fetched) == 3
+    for sample in fetched:
+        np.testing.assert_array_equal(sample.read("image").data, np.full((64, 64), 0.7, dtype=np.float32))
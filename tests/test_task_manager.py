@@ -0,0 +1,144 @@
+import threading
+
+import pytest
+from qtpy.QtCore import QThreadPool
+
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.task_manager import TaskManager
+
+TIMEOUT_MS = 5000
+
+
+class _ParametersPanel:
+    def manage_cbs_events(self, worker):
+        pass
+
+
+@pytest.fixture
+def release(qapp):
+    """Set it to let the blocking tasks return."""
+    event = threading.Event()
+    yield event
+    event.set()
+    QThreadPool.globalInstance().waitForDone(TIMEOUT_MS)
+
+
+@pytest.fixture
+def ui_state():
+    return {"grayed_out": False, "progress": None}
+
+
+def _task_manager(ui_state, max_concurrent: int) -> TaskManager:
+    return TaskManager(
+        grayout_ui=lambda: ui_state.update(grayed_out=True),
+        ungrayout_ui=lambda: ui_state.update(grayed_out=False),
+        progress_update_func=lambda value, maximum: ui_state.update(progress=(value, maximum)),
+        parameters_panel=_ParametersPanel(),
+        max_concurrent=max_concurrent,
+        max_update_rate_hz=0,
+    )
+
+
+def _blocking_task(release: threading.Event, value):
+    def task():
+        release.wait(TIMEOUT_MS / 1000)
+        return value
+    return task
+
+
+def test_jobs_start_by_priority(qtbot, release, ui_state):
+    task_manager = _task_manager(ui_state, max_concurrent=1)
+    returned = []
+    first = task_manager.add_active(_blocking_task(release, "first"), returned.append)
+    jobs = [
+        task_manager.add_active(_blocking_task(release, name), returned.append, priority=priority)
+        for name, priority in [("low", 0), ("high", 2), ("medium", 1), ("low again", 0)]
+    ]
+    assert first.status == "running"
+    assert [job.status for job in jobs] == ["queued"] * 4
+    assert task_manager.jobs == [first, jobs[1], jobs[2], jobs[0], jobs[3]]
+    assert ui_state["grayed_out"]
+    release.set()
+    qtbot.waitUntil(lambda: len(returned) == 5, timeout=TIMEOUT_MS)
+    assert returned == ["first", "high", "medium", "low", "low again"]
+    qtbot.waitUntil(lambda: task_manager.n_active == 0, timeout=TIMEOUT_MS)
+    assert all(job.status == "finished" for job in [first] + jobs)
+    assert not ui_state["grayed_out"]
+
+
+def test_concurrency_cap(qtbot, release, ui_state):
+    task_manager = _task_manager(ui_state, max_concurrent=2)
+    jobs = [task_manager.add_active(_blocking_task(release, idx), lambda _: None) for idx in range(5)]
+    assert (task_manager.n_active, task_manager.n_queued) == (2, 3)
+    task_manager.max_concurrent = 3
+    assert (task_manager.n_active, task_manager.n_queued) == (3, 2)
+    release.set()
+    qtbot.waitUntil(lambda: all(job.status == "finished" for job in jobs), timeout=TIMEOUT_MS)
+    assert (task_manager.n_active, task_manager.n_queued) == (0, 0)
+
+
+def test_cancelled_jobs_free_their_slot(qtbot, release, ui_state):
+    task_manager = _task_manager(ui_state, max_concurrent=1)
+    returned, finished = [], []
+    running = task_manager.add_active(_blocking_task(release, "stale"), returned.append, finished_func=finished.append)
+    queued = task_manager.add_active(_blocking_task(release, "fresh"), returned.append, finished_func=finished.append)
+    assert queued.status == "queued"
+
+    running.cancel()
+    # The slot is released right away, before the cancelled task returns
+    assert running.status == "cancelled"
+    assert finished == [running]
+    assert queued.status == "running"
+    assert task_manager.active_jobs == {queued.job_id: queued}
+
+    release.set()
+    qtbot.waitUntil(lambda: queued.status == "finished", timeout=TIMEOUT_MS)
+    QThreadPool.globalInstance().waitForDone(TIMEOUT_MS)
+    qtbot.wait(50)
+    # The result of the cancelled job is never merged
+    assert returned == ["fresh"]
+    assert finished == [running, queued]
+    assert running.status == "cancelled"
+
+
+def test_cancelled_queued_jobs_never_start(qtbot, release, ui_state):
+    task_manager = _task_manager(ui_state, max_concurrent=1)
+    started = []
+
+    def task():
+        started.append(True)
+        release.wait(TIMEOUT_MS / 1000)
+
+    running = task_manager.add_active(task, lambda _: None)
+    queued = task_manager.add_active(task, lambda _: None)
+    queued.cancel()
+    assert queued.status == "cancelled"
+    assert task_manager.n_queued == 0
+    release.set()
+    qtbot.waitUntil(lambda: running.status == "finished", timeout=TIMEOUT_MS)
+    assert len(started) == 1
+
+
+def test_cancelled_generators_stop_yielding(qtbot, release, ui_state):
+    task_manager = _task_manager(ui_state, max_concurrent=1)
+    yielded, steps = [], []
+
+    def task():
+        for step in range(100):
+            steps.append(step)
+            if step == 3:
+                release.wait(TIMEOUT_MS / 1000)
+            results = Results()
+            results.create(kind="int", data=step, name="step")
+            yield results
+
+    job = task_manager.add_active(task, lambda results: yielded.append(results.read("step").data), expected_items=100)
+    qtbot.waitUntil(lambda: len(steps) == 4, timeout=TIMEOUT_MS)
+    job.cancel()
+    release.set()
+    QThreadPool.globalInstance().waitForDone(TIMEOUT_MS)
+    qtbot.wait(50)
+    assert job.status == "cancelled"
+    assert 3 not in yielded
+    assert len(steps) == 4
@@ -0,0 +1,69 @@
+import numpy as np
+
+from imaging_server_kit.core.results import Results
+
+from napari_serverkit.widgets.tile_order import Viewport, generate_tiles
+
+
+def _param_results(*shapes) -> Results:
+    param_results = Results()
+    param_results.create(kind="image", data=np.zeros(shapes[0]), name="image")
+    for idx, shape in enumerate(shapes[1:]):
+        param_results.create(kind="mask", data=np.zeros(shape, dtype=np.uint16), name=f"mask_{idx}")
+    return param_results
+
+
+def _tile_params(tiles):
+    return [tile_info["tile_params"] for _, tile_info in tiles]
+
+
+def _box(start, stop):
+    return np.array(start), np.array(stop)
+
+
+def test_tiles_are_numbered_in_order():
+    viewport = Viewport()
+    viewport.set(_box([200, 200], [256, 256]))
+    tile_params = _tile_params(generate_tiles(_param_results((256, 256)), 64, 0, 0, viewport))
+    assert [params["tile_idx"] for params in tile_params] == list(range(16))
+    assert all(params["n_tiles"] == 16 for params in tile_params)
+    assert tile_params[0]["first_tile"]
+    assert not any(params.get("first_tile") for params in tile_params[1:])
+
+
+def test_tiles_in_the_viewport_come_first():
+    viewport = Viewport()
+    viewport.set(_box([150, 150], [250, 250]))
+    tile_params = _tile_params(generate_tiles(_param_results((256, 256)), 64, 0, 0, viewport))
+    # The 4 tiles of the bottom-right corner, nearest the center of the viewport (200, 200) first
+    assert {(params["pos_0"], params["pos_1"]) for params in tile_params[:4]} == {(128, 128), (128, 192), (192, 128), (192, 192)}
+    assert (tile_params[0]["pos_0"], tile_params[0]["pos_1"]) == (192, 192)
+
+
+def test_visible_only():
+    viewport = Viewport()
+    viewport.set(_box([0, 0], [100, 60]))
+    tile_params = _tile_params(generate_tiles(_param_results((256, 256)), 64, 0, 0, viewport, visible_only=True))
+    assert len(tile_params) == 2
+    assert tile_params[-1]["tile_idx"] == tile_params[-1]["n_tiles"] - 1
+
+
+def test_tiles_are_reprioritized_when_the_viewport_changes():
+    viewport = Viewport()
+    viewport.set(_box([0, 0], [10, 10]))
+    tiles = generate_tiles(_param_results((256, 256)), 64, 0, 0, viewport)
+    _, first_tile_info = next(tiles)
+    assert (first_tile_info["tile_params"]["pos_0"], first_tile_info["tile_params"]["pos_1"]) == (0, 0)
+    viewport.set(_box([250, 250], [256, 256]))
+    _, next_tile_info = next(tiles)
+    assert (next_tile_info["tile_params"]["pos_0"], next_tile_info["tile_params"]["pos_1"]) == (192, 192)
+    assert len(list(tiles)) == 14
+
+
+def test_empty_tiles_are_not_counted():
+    # Tiles beyond the smaller mask are empty (skipped)
+    tiles = list(generate_tiles(_param_results((100, 100), (50, 50)), 32, 0, 0, Viewport()))
+    tile_params = _tile_params(tiles)
+    assert len(tile_params) == tile_params[0]["n_tiles"]
+    assert tile_params[-1]["tile_idx"] == tile_params[-1]["n_tiles"] - 1
+    assert all(tile_results is not None for tile_results, _ in tiles)